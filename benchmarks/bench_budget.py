@@ -0,0 +1,70 @@
+"""Micro-benchmark for building LLM context from long thread histories.
+
+Fills a thread with synthetic chat messages and compares rendering the whole
+history with rendering it trimmed to a token budget, plus the raw throughput
+of the local token estimator.
+
+Usage:
+    python benchmarks/bench_budget.py [--messages 20000] [--budget 100000] [--rounds 20]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from botlab.budget import estimate_tokens, trim_history  # noqa: E402
+from botlab.history import MessageHistory  # noqa: E402
+from botlab.message import Message  # noqa: E402
+
+WORDS = ["the", "momentum", "thread", "context", "naïve", "résumé", "→", "日本語", "🙂", "protocol",
+         "analysis", "reply", "why", "does", "it", "work", "like", "that", "<tag>", "&"]
+
+def build_history(messages: int, seed: int = 0) -> MessageHistory:
+    """A single thread of chat messages of varying length"""
+    rng = random.Random(seed)
+    history = MessageHistory()
+    for i in range(messages):
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 120)))
+        history.add_message(Message(content=content, role="user" if i % 3 else "assistant",
+                                    agent=f"user{i % 7}", chat_id=1, thread_id=None))
+    return history
+
+def timed(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--budget", type=int, default=100000, help="history token budget")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    history = build_history(args.messages)
+    messages = history.messages[1][None]
+    full = history.get_thread_history(1)
+    trimmed = history.get_thread_history(1, max_tokens=args.budget)
+    kept, dropped = trim_history(messages, args.budget)
+    print(f"history: {args.messages:,} messages, ~{estimate_tokens(full):,} tokens; "
+          f"budget {args.budget:,} keeps {len(kept):,} (~{estimate_tokens(trimmed):,} tokens)")
+
+    for name, fn in (
+        ("full", lambda: history.get_thread_history(1)),
+        ("budget", lambda: history.get_thread_history(1, max_tokens=args.budget)),
+        ("trim", lambda: trim_history(messages, args.budget)),
+    ):
+        elapsed = timed(fn, args.rounds)
+        print(f"{name:8s} {elapsed * 1000:8.2f} ms/call")
+
+    text = full
+    elapsed = timed(lambda: estimate_tokens(text), args.rounds)
+    print(f"estimate {elapsed * 1000:8.2f} ms for {len(text) / 1e6:.1f}M chars "
+          f"({len(text) / elapsed / 1e6:,.0f}M chars/s)")
+
+if __name__ == "__main__":
+    main()
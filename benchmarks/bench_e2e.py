@@ -0,0 +1,124 @@
+"""End-to-end load benchmark: Telegram updates in, streamed LLM replies out.
+
+Starts botlab.fakes.telegram with a seeded workload of --messages messages over
+--chats forum chats and botlab.fakes.anthropic in-process, then runs
+TelegramService (long polling, per-thread supersession, outbound pacing) with
+a handler that streams each reply from AnthropicService. Reports reply
+latency percentiles from each message's arrival to its first reply, throughput,
+and what both fakes saw. A newer message in a thread supersedes a reply that
+hasn't started, so the run ends once every message is answered or nothing has
+been sent for --settle seconds. Runs fully offline and is reproducible for a seed.
+
+Usage:
+    python benchmarks/bench_e2e.py [--messages 300] [--chats 20] [--rate 30] [--ttft 0.3] [--tps 80]
+                                   [--rate-limit-rate 0.02] [--settle 3] [--seed 1]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from botlab.fakes.anthropic import FakeAnthropicConfig, FakeAnthropicServer  # noqa: E402
+from botlab.fakes.telegram import FakeTelegramConfig, FakeTelegramServer  # noqa: E402
+from botlab.services.anthropic import AnthropicService  # noqa: E402
+from botlab.services.outbound import OutboundScheduler  # noqa: E402
+from botlab.services.retry import RetryPolicy  # noqa: E402
+from botlab.services.telegram import TelegramService  # noqa: E402
+from botlab.services.updates import UpdateStore  # noqa: E402
+
+async def settle(fake, service, messages, quiet, timeout):
+    """Wait until every message is replied to, or sending has stopped for quiet seconds"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    last, last_change = None, loop.time()
+    while fake.stats["replied"] < messages and loop.time() < deadline:
+        calls = len(fake.calls), service.outbound.metrics()["queued"]
+        if calls != last:
+            last, last_change = calls, loop.time()
+        elif fake.stats["updates"] >= messages and loop.time() - last_change >= quiet:
+            break
+        await asyncio.sleep(0.1)
+    return fake.stats["replied"] >= messages
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+async def run(args):
+    telegram_fake = FakeTelegramServer(FakeTelegramConfig(
+        chats=args.chats,
+        topics_per_chat=args.topics,
+        messages=args.messages,
+        message_rate=args.rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    ))
+    llm_fake = FakeAnthropicServer(FakeAnthropicConfig(
+        ttft=args.ttft,
+        ttft_jitter=args.ttft / 2,
+        tokens_per_second=args.tps,
+        mode="canned",
+        canned_text=" ".join(["Here is a reasonably sized answer to your question."] * 6),
+        seed=args.seed
+    ))
+    base_url = await telegram_fake.start()
+    llm_url = await llm_fake.start()
+    llm = AnthropicService("bench", "2023-06-01", "claude-bench", api_base=llm_url,
+                           retry_policy=RetryPolicy(base_delay=0.05))
+
+    async def deltas(message):
+        async for event in llm.stream("You are a benchmark.", [{"role": "user", "content": message.content}]):
+            if event.type == "text":
+                yield event.text
+
+    async def handle(message):
+        return deltas(message)
+
+    service = TelegramService("123:bench", handle, AsyncMock(), base_url=base_url, edit_interval=args.edit_interval,
+                              outbound=OutboundScheduler(), updates=UpdateStore())
+    start = time.perf_counter()
+    runner = asyncio.create_task(service.run())
+    try:
+        await settle(telegram_fake, service, args.messages, args.settle, args.timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        service.stop()
+        await runner
+        await llm.close()
+        await llm_fake.stop()
+        await telegram_fake.stop()
+
+    latencies = telegram_fake.reply_latencies
+    print(f"{args.messages} messages over {args.chats} chats, {elapsed:.2f}s, {len(latencies)} replied "
+          f"({len(latencies) / elapsed:.1f} replies/s), {args.messages - len(latencies)} superseded or unanswered")
+    print(f"reply    p50 {percentile(latencies, .5) * 1000:7.0f} ms  p95 {percentile(latencies, .95) * 1000:7.0f} ms  "
+          f"p99 {percentile(latencies, .99) * 1000:7.0f} ms")
+    print(f"telegram: {telegram_fake.stats}")
+    print(f"outbound: {service.outbound.metrics()}")
+    print(f"llm: {llm_fake.stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=3, help="topics per chat")
+    parser.add_argument("--rate", type=float, default=30.0, help="incoming messages per second")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=80.0)
+    parser.add_argument("--edit-interval", type=float, default=1.5)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds without sends that end the run")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Load benchmark for the LLM client against the fake Messages API.
+
+Starts botlab.fakes.anthropic in-process (or targets --url), fires --requests
+streaming calls through AnthropicService with at most --concurrency in flight,
+and reports time-to-first-token and end-to-end latency percentiles, throughput
+and what the fake server saw. Runs fully offline.
+
+Usage:
+    python benchmarks/bench_llm.py [--requests 200] [--concurrency 32] [--ttft 0.3] [--tps 80]
+                                   [--error-rate 0.02] [--rate-limit-rate 0.05] [--max-concurrency 8]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from botlab.fakes.anthropic import FakeAnthropicConfig, FakeAnthropicServer  # noqa: E402
+from botlab.services.admission import AdmissionController  # noqa: E402
+from botlab.services.anthropic import AnthropicService, LLMServiceError  # noqa: E402
+from botlab.services.retry import RetryPolicy  # noqa: E402
+
+PROMPT = " ".join(["the momentum of the thread carries the context forward"] * 8)
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+async def one_request(service, index, ttfts, latencies, failures):
+    start = time.perf_counter()
+    first = None
+    try:
+        async for event in service.stream("You are a benchmark.", [{"role": "user", "content": f"{index} {PROMPT}"}]):
+            if event.type == "text" and first is None:
+                first = time.perf_counter() - start
+    except LLMServiceError as e:
+        failures.append(e.status)
+        return
+    ttfts.append(first or 0.0)
+    latencies.append(time.perf_counter() - start)
+
+async def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        server = FakeAnthropicServer(FakeAnthropicConfig(
+            ttft=args.ttft,
+            ttft_jitter=args.ttft_jitter,
+            tokens_per_second=args.tps,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=0.1,
+            seed=0
+        ))
+        url = await server.start()
+
+    admission = AdmissionController(max_concurrency=args.max_concurrency) if args.max_concurrency else None
+    service = AnthropicService("bench", "2023-06-01", "claude-bench", api_base=url, admission=admission,
+                               retry_policy=RetryPolicy(base_delay=0.05))
+    gate = asyncio.Semaphore(args.concurrency)
+    ttfts, latencies, failures = [], [], []
+
+    async def limited(i):
+        async with gate:
+            await one_request(service, i, ttfts, latencies, failures)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(limited(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await service.close()
+        if server is not None:
+            await server.stop()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f} req/s, {service.usage['output_tokens'] / elapsed:,.0f} tokens/s)")
+    for name, values in (("ttft", ttfts), ("latency", latencies)):
+        print(f"{name:8s} p50 {percentile(values, .5) * 1000:7.0f} ms  p95 {percentile(values, .95) * 1000:7.0f} ms  "
+              f"p99 {percentile(values, .99) * 1000:7.0f} ms")
+    print(f"failed: {len(failures)}  usage: {service.usage}")
+    if server is not None:
+        print(f"server: {server.stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="messages endpoint to target instead of an in-process fake")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-concurrency", type=int, default=8, help="admission cap (0: none)")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--ttft-jitter", type=float, default=0.2)
+    parser.add_argument("--tps", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Micro-benchmark for parsing streamed Claude responses.
+
+Replays a recorded SSE stream through the incremental decoder in randomly sized
+byte chunks, the way it arrives off the socket, and compares it with the old
+line-at-a-time parser.
+
+Usage:
+    python benchmarks/bench_sse.py [--stream recorded.sse] [--events 5000] [--rounds 20]
+
+Without --stream a representative stream is synthesized: message_start,
+content_block_start, periodic pings, text deltas with multi-byte characters,
+then message_delta/message_stop.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from aiohttp import StreamReader  # noqa: E402
+from aiohttp.base_protocol import BaseProtocol  # noqa: E402
+from botlab.services.anthropic import AnthropicService  # noqa: E402
+
+WORDS = ["the", "momentum", "thread", "context", "naïve", "résumé", "→", "日本語", "🙂", "protocol"]
+
+def synthesize_stream(events: int, seed: int = 0) -> bytes:
+    """Build an SSE body shaped like a real Messages API stream"""
+    rng = random.Random(seed)
+
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    parts = [
+        event("message_start", {"type": "message_start", "message": {
+            "id": "msg_bench", "type": "message", "role": "assistant", "content": [],
+            "model": "claude-bench", "stop_reason": None,
+            "usage": {"input_tokens": 1200, "output_tokens": 1}}}),
+        event("content_block_start", {"type": "content_block_start", "index": 0,
+                                      "content_block": {"type": "text", "text": ""}}),
+    ]
+    for i in range(events):
+        if i % 50 == 0:
+            parts.append(event("ping", {"type": "ping"}))
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + " "
+        parts.append(event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                   "delta": {"type": "text_delta", "text": text}}))
+    parts.append(event("content_block_stop", {"type": "content_block_stop", "index": 0}))
+    parts.append(event("message_delta", {"type": "message_delta",
+                                         "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                         "usage": {"output_tokens": events}}))
+    parts.append(event("message_stop", {"type": "message_stop"}))
+    return "".join(parts).encode("utf-8")
+
+def chunk(body: bytes, seed: int = 0, min_size: int = 16, max_size: int = 1400):
+    """Split a body into socket-sized chunks at arbitrary byte offsets"""
+    rng = random.Random(seed)
+    chunks, pos = [], 0
+    while pos < len(body):
+        size = rng.randint(min_size, max_size)
+        chunks.append(body[pos:pos + size])
+        pos += size
+    return chunks
+
+class _Response:
+    """Response stand-in whose body is a real aiohttp StreamReader"""
+
+    def __init__(self, chunks):
+        loop = asyncio.get_running_loop()
+        self.content = StreamReader(BaseProtocol(loop), 2 ** 30, loop=loop)
+        for c in chunks:
+            self.content.feed_data(c)
+        self.content.feed_eof()
+
+async def legacy_handle_stream(response) -> str:
+    """The original line-based parser, kept for comparison"""
+    full_response = []
+    async for line in response.content:
+        if line:
+            line = line.decode('utf-8').strip()
+            if line.startswith('data: '):
+                try:
+                    data = json.loads(line[6:])
+                    if data.get('type') == 'content_block_delta':
+                        text = data.get('delta', {}).get('text', '')
+                        if text:
+                            full_response.append(text)
+                except json.JSONDecodeError:
+                    continue
+    return ''.join(full_response)
+
+async def decoder_handle_stream(response) -> str:
+    """Collect text through the service's incremental stream decoder"""
+    service = AnthropicService("bench", "2023-06-01", "claude-bench")
+    return ''.join([event.text async for event in service._iter_stream(response) if event.type == 'text'])
+
+async def run(body: bytes, rounds: int):
+    chunks = chunk(body)
+    expected = await legacy_handle_stream(_Response(chunks))
+    assert await decoder_handle_stream(_Response(chunks)) == expected, "parsers disagree"
+
+    events = body.count(b"\n\n")
+    for name, parse in (("legacy", legacy_handle_stream), ("decoder", decoder_handle_stream)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await parse(_Response(chunks))
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:8s} {elapsed * 1000:8.2f} ms/stream  "
+              f"{events / elapsed:12,.0f} events/s  {len(body) / elapsed / 1e6:7.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stream", type=Path, help="recorded raw SSE body to replay")
+    parser.add_argument("--events", type=int, default=5000, help="deltas to synthesize")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    body = args.stream.read_bytes() if args.stream else synthesize_stream(args.events)
+    print(f"stream: {len(body):,} bytes, {body.count(b'event:'):,} events")
+    asyncio.run(run(body, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Optional
 import logging
+import os
 from ..xml_handler import AgentConfig
+from ..message import Message
+from ..services.anthropic import (
+    AnthropicService, ServiceUnavailableError, CACHE_ALWAYS, CACHE_DETERMINISTIC, CACHE_OFF
+)
+from ..services.admission import PRIORITY_INTERACTIVE
+from ..services.cache import ResponseCache
+from ..services.http import HTTPPool
+from ..services.retry import RetryPolicy
+from ..services.router import ModelRouter
 import xml.etree.ElementTree as ET
 
 logger = logging.getLogger(__name__)
@@ -9,7 +19,17 @@ logger = logging.getLogger(__name__)
 class Agent(ABC):
     """Base class for all agents"""
     
-    def __init__(self, config: AgentConfig):
+    # Admission priority for this agent's LLM calls (lower is served first)
+    llm_priority = PRIORITY_INTERACTIVE
+    # Stop condition for LLM responses (see AnthropicService.stream); None reads the full completion
+    llm_stop = None
+    
+    def __init__(
+        self,
+        config: AgentConfig,
+        http_pool: Optional[HTTPPool] = None,
+        llm_service: Optional[AnthropicService] = None
+    ):
         logger.info(f"Initializing agent: {config.name}")
         self.config = config
         if not config:
@@ -21,6 +41,64 @@ class Agent(ABC):
         self.model = config.service.model
         self.api_version = config.service.api_version
         
+        # Agents given the same pool share keepalive connections to the API;
+        # agents given a shared service also share its admission control
+        self.http_pool = http_pool
+        self.shared_llm_service = llm_service
+        self._llm_service: Optional[AnthropicService] = None
+        
+    def _get_llm_service(self) -> AnthropicService:
+        """Get LLM service for this agent, creating it on first use"""
+        if self._llm_service is None:
+            service_config = self.config.service
+            retry_policy = RetryPolicy(**service_config.retry)
+            if service_config.cache is None:
+                cache_mode = CACHE_DETERMINISTIC
+            else:
+                cache_mode = CACHE_ALWAYS if service_config.cache else CACHE_OFF
+            router = None
+            if service_config.fallback:
+                router = ModelRouter([self.model] + service_config.fallback, **service_config.slo)
+            if self.shared_llm_service is not None:
+                self._llm_service = self.shared_llm_service.derive(
+                    model=self.model,
+                    api_version=self.api_version,
+                    retry_policy=retry_policy,
+                    cache_mode=cache_mode,
+                    cache_ttl=service_config.cache_ttl,
+                    agent=self.config.name,
+                    router=router
+                )
+            else:
+                self._llm_service = AnthropicService(
+                    api_key=self._get_api_key(),
+                    api_version=self.api_version,
+                    model=self.model,
+                    pool=self.http_pool,
+                    retry_policy=retry_policy,
+                    cache=ResponseCache() if service_config.cache else None,
+                    cache_mode=cache_mode,
+                    cache_ttl=service_config.cache_ttl,
+                    agent=self.config.name,
+                    router=router,
+                    api_base=os.getenv('ANTHROPIC_API_BASE') or None
+                )
+        return self._llm_service
+        
+    async def _make_api_call(self, system_prompt: str, user_message: str) -> Optional[str]:
+        """Make a single-turn API call through the agent's LLM service"""
+        return await self._get_llm_service().complete(
+            system_msg=system_prompt,
+            messages=[Message(
+                content=user_message,
+                role="user",
+                agent=self.config.name,
+                chat_id=0
+            )],
+            priority=self.llm_priority,
+            stop=self.llm_stop
+        )
+        
     async def _call_llm(self, system_prompt: str, user_message: str) -> Optional[str]:
         """Call LLM API directly"""
         try:
@@ -31,6 +109,9 @@ class Agent(ABC):
                 return None
             return response
             
+        except ServiceUnavailableError:
+            # Let callers short-circuit with a 503 instead of treating this as no response
+            raise
         except Exception as e:
             logger.error(f"LLM call failed: {str(e)}")
             return None
@@ -45,6 +126,18 @@ class Agent(ABC):
         logger.debug("Successfully retrieved API key")
         return key
 
+    def _unavailable_response(self, message) -> Dict:
+        """Pipeline response used when the LLM backend is unavailable"""
+        logger.warning(f"LLM backend unavailable, short-circuiting agent {self.config.name}")
+        return {
+            'agent': self.config.name.lower(),
+            'timestamp': message.get('timestamp') if isinstance(message, dict) else None,
+            'mode': 'thought',
+            'code': ServiceUnavailableError.code,
+            'thread': message.get('thread_id') if isinstance(message, dict) else None,
+            'content': 'LLM service unavailable'
+        }
+
     def _extract_code(self, analysis: str, default: str = '310') -> str:
         """Extract status code from XML context response"""
         try:
@@ -3,6 +3,8 @@ import logging
 from datetime import datetime
 from .observer import Observer
 from ..xml_handler import AgentConfig
+from ..services.http import HTTPPool
+from ..services.anthropic import AnthropicService, ServiceUnavailableError
 import xml.etree.ElementTree as ET
 import re
 
@@ -23,9 +25,14 @@ class Contextualizer(Observer):
     in time but threads can be concurrent.
     """
     
-    def __init__(self, config: AgentConfig):
+    def __init__(
+        self,
+        config: AgentConfig,
+        http_pool: Optional[HTTPPool] = None,
+        llm_service: Optional[AnthropicService] = None
+    ):
         logger.info(f"Initializing contextualizer agent: {config.name}")
-        super().__init__(config)
+        super().__init__(config, http_pool, llm_service)
         self.boundaries: List[Dict] = []
         # Maps thread IDs to sets of concurrent threads with their start times
         self.concurrent_threads: Dict[str, Dict[str, str]] = {}
@@ -162,13 +169,18 @@ class Contextualizer(Observer):
                 'content': analysis
             }
             
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error in message analysis: {str(e)}")
             return None
             
     async def process_message(self, message) -> Optional[Dict]:
         """Process incoming message and return context management response"""
-        return await self._analyze_message(message)
+        try:
+            return await self._analyze_message(message)
+        except ServiceUnavailableError:
+            return self._unavailable_response(message)
         
     def get_context_boundaries(self) -> List[Dict]:
         """Get list of detected context boundaries"""
@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import Dict, Optional
 import logging
 from .base import Agent
+from ..services.anthropic import ServiceUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,8 @@ class Filter(Agent):
                 'content': decision.get('reason', 'No reason provided')
             }
             
+        except ServiceUnavailableError:
+            return self._unavailable_response(message)
         except Exception as e:
             logger.error(f"Error in filter {self.config.name}: {str(e)}")
             return None
@@ -3,6 +3,9 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 from ..xml_handler import AgentConfig
+from ..services.http import HTTPPool
+from ..services.anthropic import AnthropicService, ServiceUnavailableError
+from ..services.admission import PRIORITY_BACKGROUND
 from .base import Agent
 import re
 
@@ -15,8 +18,18 @@ class Observer(Agent):
     define their own analysis and response logic.
     """
     
-    def __init__(self, config: AgentConfig):
-        super().__init__(config)
+    # Background analysis yields to user-facing calls
+    llm_priority = PRIORITY_BACKGROUND
+    # Analyses are a single <context> document; stop reading once it closes
+    llm_stop = '</context>'
+    
+    def __init__(
+        self,
+        config: AgentConfig,
+        http_pool: Optional[HTTPPool] = None,
+        llm_service: Optional[AnthropicService] = None
+    ):
+        super().__init__(config, http_pool, llm_service)
         
         logger.debug(f"Initializing Observer with config: {config}")
         
@@ -57,6 +70,8 @@ class Observer(Agent):
                 'analysis': analysis
             }
             
+        except ServiceUnavailableError:
+            return self._unavailable_response(message)
         except Exception as e:
             logger.error(f"Error in observer {self.config.name}: {str(e)}")
             return None
@@ -179,8 +194,13 @@ class Contextualizer(Observer):
     - Context boundary detection
     """
     
-    def __init__(self, config: AgentConfig):
-        super().__init__(config)
+    def __init__(
+        self,
+        config: AgentConfig,
+        http_pool: Optional[HTTPPool] = None,
+        llm_service: Optional[AnthropicService] = None
+    ):
+        super().__init__(config, http_pool, llm_service)
         
         # Initialize emotional context tracking
         self.emotional_baseline = {
@@ -221,6 +241,8 @@ class Contextualizer(Observer):
             
             return self._format_response(code, thread_id, analysis)
             
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error in message analysis: {str(e)}")
             return None
@@ -1,13 +1,29 @@
 import os
+import asyncio
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ContextTypes
 from .xml_handler import load_agent_config
 from .services.telegram import TelegramService
+from .services.webhook import WebhookConfig
+from .services.outbound import OutboundScheduler, PRIORITY_REPLY
+from .services.updates import UpdateStore
 from .services.anthropic import AnthropicService
+from .services.http import HTTPPool
+from .services.admission import AdmissionController
+from .services.breaker import CircuitBreaker
+from .services.cache import ResponseCache
+from .services.usage import UsageTracker
+from .services.hedging import HedgePolicy
+from .services.router import ModelRouter
+from .generations import GenerationRegistry
+from .dispatch import ChatDispatcher, DispatchError
+from .coalesce import BurstCoalescer, RAPID_SEQUENCE_CODE
 from .momentum import MomentumManager
 from .history import MessageHistory
+from .budget import available_tokens
 from .handlers import MessageHandler
 from .timing import ResponseTimer
 from .filters import FilterChain, FilterSet, MentionFilter, TopicFilter, RateLimitFilter
@@ -15,6 +31,9 @@ from .agents.inhibitor import InhibitorFilter
 
 logger = logging.getLogger(__name__)
 
+# max_tokens of a reply, kept free in the context budget
+RESPONSE_TOKENS = 1000
+
 class Bot:
     def __init__(self, config_path: str, username: str = None, allowed_topic: str = None):
         """Initialize bot with configuration"""
@@ -41,6 +60,63 @@ class Bot:
         self.history = None
         self.telegram = None
         self.inhibitor = None
+        self.llm_service = None
+        self.shutdown_task: Optional[asyncio.Task] = None
+        # Token budget per LLM call from the agent's <budget>; history is trimmed to fit
+        service = getattr(self.config, 'service', None)
+        self.context_budget = service.context_tokens if service else None
+        
+        # Newest reply generation per chat thread; older ones are cancelled
+        self.generations = GenerationRegistry()
+        # Messages are handled in order per chat thread, different threads concurrently
+        self.dispatcher = ChatDispatcher(
+            workers=int(os.getenv('CHAT_WORKERS', '16')),
+            max_queue=int(os.getenv('CHAT_QUEUE_SIZE', '32'))
+        )
+        # A sender's rapid consecutive messages are answered once; a window of 0 turns this off
+        burst_window = float(os.getenv('CHAT_BURST_WINDOW', '0'))
+        self.coalescer = BurstCoalescer(window=burst_window) if burst_window > 0 else None
+        
+        # Connection pool, admission control and circuit breaker shared by every LLM client the bot creates
+        self.http_pool = HTTPPool()
+        # e.g. LLM_MODEL_LIMITS=claude-3-opus-latest=2,claude-3-5-sonnet-latest=6
+        model_limits = {}
+        for limit in os.getenv('LLM_MODEL_LIMITS', '').split(','):
+            if limit.strip():
+                model, _, count = limit.rpartition('=')
+                model_limits[model.strip()] = int(count)
+        self.admission = AdmissionController(
+            max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+            model_limits=model_limits
+        )
+        self.breaker = CircuitBreaker(
+            failure_rate=float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5')),
+            # Time to first token past which a call counts as slow; 0 disables
+            slow_call_latency=float(os.getenv('LLM_BREAKER_SLOW_SECONDS', '10')) or None,
+            slow_call_rate=float(os.getenv('LLM_BREAKER_SLOW_RATE', '0.8')),
+            open_duration=float(os.getenv('LLM_BREAKER_OPEN_SECONDS', '30'))
+        )
+        self.usage = UsageTracker(
+            flush_interval=float(os.getenv('LLM_USAGE_FLUSH_SECONDS', '300')),
+            path=os.getenv('LLM_USAGE_PATH') or None
+        )
+        # Opt-in hedging of speaker requests whose first token is late
+        self.hedging = None
+        if os.getenv('LLM_HEDGING', '').lower() in ('1', 'true', 'yes'):
+            hedge_delay = os.getenv('LLM_HEDGE_DELAY')
+            self.hedging = HedgePolicy(
+                delay=float(hedge_delay) if hedge_delay else None,
+                budget=float(os.getenv('LLM_HEDGE_BUDGET', '0.05'))
+            )
+        self.response_cache = None
+        try:
+            self.response_cache = ResponseCache(
+                max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024')),
+                ttl=float(os.getenv('LLM_CACHE_TTL', '3600')),
+                path=os.getenv('LLM_CACHE_PATH') or None
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize response cache: {str(e)}")
         
         try:
             # Set up rate limiting if configured
@@ -58,16 +134,77 @@ class Bot:
         except Exception as e:
             logger.error(f"Failed to initialize message history: {str(e)}")
             
+        # Webhook ingestion when a secret is configured; long polling otherwise (development)
+        webhook = None
+        if os.getenv('TELEGRAM_WEBHOOK_SECRET'):
+            webhook = WebhookConfig(
+                secret_token=os.getenv('TELEGRAM_WEBHOOK_SECRET'),
+                url=os.getenv('TELEGRAM_WEBHOOK_URL') or None,
+                host=os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0'),
+                port=int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443')),
+                path=os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram')
+            )
         try:
-            self.telegram = TelegramService()
+            outbound = OutboundScheduler(
+                global_rate=float(os.getenv('TELEGRAM_SEND_RATE', '30')),
+                group_rate=float(os.getenv('TELEGRAM_GROUP_SENDS_PER_MINUTE', '20')) / 60
+            )
+            token = os.getenv('TELEGRAM_TOKEN')
+            if not token:
+                raise ValueError("TELEGRAM_TOKEN is not set")
+            updates = UpdateStore(path=os.getenv('TELEGRAM_UPDATE_STORE') or None)
+            self.telegram = TelegramService(
+                token=token,
+                message_handler=None,
+                start_handler=self.handle_start,
+                update_handler=self.handle_telegram_message,
+                generations=self.generations,
+                webhook=webhook,
+                outbound=outbound,
+                updates=updates,
+                drain_timeout=float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '30')),
+                base_url=os.getenv('TELEGRAM_API_BASE') or None
+            )
         except Exception as e:
             logger.error(f"Failed to initialize telegram service: {str(e)}")
             
+        try:
+            speaker_model = os.getenv('SPEAKER_MODEL')
+            fallback_models = [m.strip() for m in os.getenv('SPEAKER_FALLBACK_MODELS', '').split(',') if m.strip()]
+            router = None
+            if fallback_models:
+                latency_slo = os.getenv('SPEAKER_LATENCY_SLO')
+                router = ModelRouter(
+                    [speaker_model] + fallback_models,
+                    latency_slo=float(latency_slo) if latency_slo else None
+                )
+            self.llm_service = AnthropicService(
+                api_key=os.getenv('ANTHROPIC_API_KEY'),
+                api_version=os.getenv('ANTHROPIC_API_VERSION', '2023-06-01'),
+                model=speaker_model,
+                pool=self.http_pool,
+                admission=self.admission,
+                breaker=self.breaker,
+                cache=self.response_cache,
+                usage_tracker=self.usage,
+                hedging=self.hedging,
+                router=router,
+                api_base=os.getenv('ANTHROPIC_API_BASE') or None
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM service: {str(e)}")
+            
         try:
             self.inhibitor = InhibitorFilter(self.config)
         except Exception as e:
             logger.error(f"Failed to initialize inhibitor: {str(e)}")
 
+    def _history_budget(self) -> Optional[int]:
+        """Tokens available for history within the context budget, or None if unbounded"""
+        if self.context_budget is None:
+            return None
+        return available_tokens(self.context_budget, reserve=RESPONSE_TOKENS)
+
     def _should_respond(self, message) -> bool:
         """Determine if bot should respond to message"""
         if message is None or not hasattr(message, 'content'):
@@ -97,20 +234,69 @@ class Bot:
             return None
 
     def run(self):
-        """Run the bot"""
+        """Run the bot until stopped or signalled, then drain and shut down"""
         logger.info("Starting bot")
         if self.telegram:
-            self.telegram.start()
+            asyncio.run(self.serve())
         else:
             logger.warning("Cannot start bot - TelegramService not initialized")
 
+    async def serve(self):
+        """Receive updates until stopped; in-flight replies drain before everything is closed"""
+        try:
+            await self.telegram.run()
+        finally:
+            await self.shutdown()
+
     def stop(self):
-        """Stop the bot"""
+        """Stop the bot, letting in-flight replies finish if it's running"""
         logger.info("Stopping bot")
-        if self.telegram:
+        if self.telegram and self.telegram.running:
+            # serve() shuts everything down once Telegram has drained
             self.telegram.stop()
-        else:
+            return
+        if not self.telegram:
             logger.warning("Cannot stop bot - TelegramService not initialized")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        try:
+            if loop:
+                # Keep a reference so the task isn't garbage collected before it finishes
+                self.shutdown_task = loop.create_task(self.shutdown())
+            else:
+                asyncio.run(self.shutdown())
+        except Exception as e:
+            logger.error(f"Failed to shut down: {str(e)}")
+
+    async def shutdown(self, timeout: float = 0.0) -> bool:
+        """Stop dispatching, wait up to timeout for queued replies, flush usage and persistence, then close pooled HTTP connections.
+
+        Returns True if no queued work had to be cancelled.
+        """
+        drained = await self.dispatcher.drain(timeout)
+        await self.dispatcher.close()
+        if self.telegram:
+            await self.telegram.outbound.close()
+        await self.usage.close()
+        if self.response_cache:
+            self.response_cache.close()
+        if self.telegram:
+            self.telegram.updates.close()
+        await self.http_pool.close()
+        logger.info("Bot shut down" if drained else "Bot shut down with unfinished replies")
+        return drained
+
+    async def handle_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Greet whoever sent /start"""
+        if update.message and self.telegram:
+            await self.telegram.send_message(
+                chat_id=update.message.chat_id,
+                text=f"Hi, I'm {self.config.name}.",
+                message_thread_id=update.message.message_thread_id,
+                reply_to_message_id=update.message.message_id
+            )
 
     async def handle_telegram_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle incoming Telegram message asynchronously"""
@@ -120,39 +306,93 @@ class Bot:
                 return
                 
             # Check if we should respond
-            if not self._should_respond(update.message):
+            message = TelegramService.to_message(update)
+            if not self._should_respond(message):
                 logger.debug("Message filtered out")
                 return
 
-            # Get conversation history if available
-            history_xml = None
-            if self.history:
-                history_xml = await self.history.get_thread_history(
-                    chat_id=update.message.chat_id,
-                    message_id=update.message.message_id
+            burst = [update]
+            if self.coalescer is not None:
+                burst = await self.coalescer.add((message.chat_id, message.thread_id, message.agent), update)
+                if burst is None:
+                    logger.info(f"Message {message.message_id} in chat {message.chat_id} is part of a rapid sequence ({RAPID_SEQUENCE_CODE})")
+                    return
+
+            async with self.generations.track(update.message.chat_id, update.message.message_thread_id) as generation:
+                await self.dispatcher.submit(
+                    (update.message.chat_id, update.message.message_thread_id),
+                    lambda: self._reply(update, generation, burst)
                 )
+            
+        except DispatchError as e:
+            logger.warning(f"Dropping message: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error handling message: {str(e)}")
 
-            # Process through inhibitor
-            response = None
-            if self.inhibitor:
-                response = self.inhibitor.process({
-                    'content': update.message.text,
-                    'chat_id': update.message.chat_id,
-                    'thread_id': update.message.message_thread_id,
-                    'history_xml': history_xml
-                })
-
-            # Send response
-            if response and self.telegram:
+    async def _reply(self, update: Update, generation, burst: Optional[List[Update]] = None) -> None:
+        """Generate and send the reply to one message, or a burst ending with it, in its thread's turn"""
+        # Get conversation history if available
+        history_xml = None
+        if self.history:
+            history_xml = self.history.get_thread_history(
+                chat_id=update.message.chat_id,
+                thread_id=update.message.message_thread_id,
+                max_tokens=self._history_budget()
+            )
+
+        # Process through inhibitor
+        response = None
+        if self.inhibitor:
+            message = {
+                'content': update.message.text,
+                'chat_id': update.message.chat_id,
+                'thread_id': update.message.message_thread_id,
+                'history_xml': history_xml
+            }
+            if burst and len(burst) > 1:
+                # One turn for the whole rapid sequence
+                message['content'] = '\n'.join(u.message.text for u in burst if u.message.text)
+                message['burst'] = {'code': RAPID_SEQUENCE_CODE, 'messages': len(burst)}
+            response = self.inhibitor.process(message)
+
+        # A newer message in this thread supersedes this reply
+        if generation.stale:
+            return
+
+        # Send response, streaming it progressively if it arrives as deltas
+        if response and self.telegram:
+            if hasattr(response, '__aiter__'):
+                await self.telegram.send_progressive(
+                    chat_id=update.message.chat_id,
+                    deltas=response,
+                    message_thread_id=update.message.message_thread_id,
+                    reply_to_message_id=update.message.message_id,
+                    on_send=generation.commit
+                )
+            else:
+                generation.commit()
                 await self.telegram.send_message(
                     chat_id=update.message.chat_id,
                     message_thread_id=update.message.message_thread_id,
-                    text=response
+                    text=response,
+                    priority=PRIORITY_REPLY
                 )
-                
-                # Record response for rate limiting
-                if self.timer:
-                    self.timer.record_response(update.message.chat_id)
-            
-        except Exception as e:
-            logger.error(f"Error handling message: {str(e)}") 
+
+            # Record response for rate limiting
+            if self.timer:
+                self.timer.record_response(update.message.chat_id)
+
+
+def main():
+    """Run the bot configured by the environment (and .env) until interrupted"""
+    load_dotenv()
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+    bot = Bot(
+        config_path=os.getenv('SPEAKER_PROMPT_FILE', 'config/agents/odv.xml'),
+        username=os.getenv('AGENT_USERNAME'),
+        allowed_topic=os.getenv('ALLOWED_TOPIC_NAME')
+    )
+    bot.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+from typing import List, Optional, Sequence, Tuple
+import logging
+import xml.sax.saxutils as saxutils
+from .message import Message
+
+logger = logging.getLogger(__name__)
+
+# Rough averages for Claude's tokenizer: English prose runs about 4 characters
+# per token, while non-ASCII characters (accents, CJK, emoji) are closer to 3
+# UTF-8 bytes per token. Each character is weighted on its own, so estimates of
+# parts add up to at least the estimate of the whole.
+CHARS_PER_TOKEN = 4
+BYTES_PER_TOKEN = 3
+
+# A history message as rendered by MessageHistory, with role, agent and content
+# filled in XML-escaped
+MESSAGE_XML = '  <message role="{role}" agent="{agent}">\n    <content>{content}</content>\n  </message>'
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimate the token count of text locally, without calling the API"""
+    if not text:
+        return 0
+    if text.isascii():
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    other_bytes = len(text.encode('utf-8')) - ascii_chars
+    scale = CHARS_PER_TOKEN * BYTES_PER_TOKEN
+    return (ascii_chars * BYTES_PER_TOKEN + other_bytes * CHARS_PER_TOKEN + scale - 1) // scale
+
+def format_message(message: Message) -> str:
+    """A message as an element of the history XML"""
+    return MESSAGE_XML.format(
+        role=saxutils.escape(message.role),
+        agent=saxutils.escape(message.agent),
+        content=saxutils.escape(message.content)
+    )
+
+# Tokens for the XML wrapper and attributes around each history message, plus its line break
+MESSAGE_OVERHEAD = estimate_tokens(MESSAGE_XML.format(role='', agent='', content='') + '\n')
+
+def message_tokens(message: Message) -> int:
+    """Estimated tokens a message takes up in the history XML"""
+    return (
+        estimate_tokens(saxutils.escape(message.role))
+        + estimate_tokens(saxutils.escape(message.agent))
+        + estimate_tokens(saxutils.escape(message.content))
+        + MESSAGE_OVERHEAD
+    )
+
+def available_tokens(budget: int, *fixed: str, reserve: int = 0) -> int:
+    """Tokens left in budget after fixed prompt parts and a reserve (e.g. for the reply)"""
+    return max(0, budget - reserve - sum(estimate_tokens(part) for part in fixed))
+
+def trim_history(messages: Sequence[Message], max_tokens: int) -> Tuple[List[Message], int]:
+    """Keep the newest messages that fit in max_tokens.
+
+    Returns the kept messages in their original order and the number of older
+    messages dropped. Only the kept messages are measured, so the cost depends
+    on the budget rather than on the length of the history.
+    """
+    total = 0
+    start = len(messages)
+    while start > 0:
+        cost = message_tokens(messages[start - 1])
+        if total + cost > max_tokens:
+            break
+        total += cost
+        start -= 1
+    if start:
+        logger.debug(f"Trimmed {start} of {len(messages)} history messages to fit {max_tokens} tokens")
+    return list(messages[start:]), start
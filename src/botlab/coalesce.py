@@ -0,0 +1,85 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Message code for a message that is part of a rapid sequence (see config/dtd/messages.dtd)
+RAPID_SEQUENCE_CODE = '502'
+
+@dataclass
+class _Burst:
+    started: float
+    items: List[Any] = field(default_factory=list)
+    waiter: Optional[asyncio.Future] = None  # the call for the latest message
+
+class BurstCoalescer:
+    """Merges rapid consecutive messages from one sender into a single turn.
+
+    Messages are grouped per key, typically (chat_id, thread_id, user). Each
+    call to ``add`` waits until ``window`` seconds pass without another
+    message for its key; the call for the last message of the burst returns
+    every message in it, while the calls for earlier ones return None as soon
+    as a later message arrives. A burst is cut off once it has lasted
+    ``max_wait`` seconds or holds ``max_messages`` messages, so a steady
+    stream still gets answers.
+    """
+
+    def __init__(
+        self,
+        window: float = 2.0,
+        max_wait: float = 8.0,
+        max_messages: int = 10,
+        clock=time.monotonic
+    ):
+        self.window = window
+        self.max_wait = max_wait
+        self.max_messages = max_messages
+        self.clock = clock
+        self._bursts: Dict[Hashable, _Burst] = {}
+        self.turns = 0
+        self.merged = 0
+
+    async def add(self, key: Hashable, item: Any) -> Optional[List[Any]]:
+        """Add a message; returns the whole burst if this message ends it, else None"""
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst(self.clock())
+        burst.items.append(item)
+        count = len(burst.items)
+        if burst.waiter is not None and not burst.waiter.done():
+            # This message takes the burst over from the previous one
+            burst.waiter.set_result(None)
+        burst.waiter = waiter = asyncio.get_running_loop().create_future()
+        if count < self.max_messages:
+            delay = min(self.window, burst.started + self.max_wait - self.clock())
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(waiter, delay)
+                    return None
+                except asyncio.TimeoutError:
+                    if burst.waiter is not waiter:
+                        # A message arrived just as the window closed
+                        return None
+                except asyncio.CancelledError:
+                    # Nobody is left to flush the burst if its last message is abandoned
+                    if self._bursts.get(key) is burst and burst.waiter is waiter:
+                        del self._bursts[key]
+                    raise
+        if self._bursts.get(key) is burst:
+            del self._bursts[key]
+        self.turns += 1
+        self.merged += count - 1
+        if count > 1:
+            logger.info(f"Merged {count} rapid messages for {key} into one turn")
+        return burst.items
+
+    def metrics(self) -> Dict:
+        """Bursts waiting and messages merged so far"""
+        return {
+            'waiting': len(self._bursts),
+            'turns': self.turns,
+            'merged': self.merged,
+        }
@@ -0,0 +1,172 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DispatchError(Exception):
+    """Work couldn't be accepted"""
+
+class QueueFullError(DispatchError):
+    """A key already has the maximum number of items waiting"""
+
+class DispatcherClosedError(DispatchError):
+    """The dispatcher is draining or closed and accepts no new work"""
+
+@dataclass
+class _Item:
+    fn: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    context: contextvars.Context
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+class ChatDispatcher:
+    """Runs work strictly in order per key while running different keys concurrently.
+
+    Keys are typically (chat_id, thread_id). Each key has a FIFO queue of at
+    most ``max_queue`` waiting items; ``workers`` tasks take turns across keys
+    that have work, one item at a time, so a busy chat can't starve others.
+    Each item runs in its own task with the submitter's context variables.
+    Cancelling a submitter drops its item if it hasn't started, or cancels
+    it if it's running. ``drain`` stops new work from being accepted and
+    waits for what's already there.
+    """
+
+    def __init__(self, workers: int = 16, max_queue: int = 32):
+        self.workers = workers
+        self.max_queue = max_queue
+        # Keys with queued or running work; a key is in _ready at most once and never while running
+        self._queues: Dict[Hashable, Deque[_Item]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.accepting = True
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    async def submit(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn after all earlier work for key and return its result"""
+        return await self.submit_nowait(key, fn)
+
+    def submit_nowait(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Queue fn behind earlier work for key; raises QueueFullError if the key's queue is full"""
+        if not self.accepting:
+            self.rejected += 1
+            raise DispatcherClosedError("Dispatcher is shutting down")
+        self._ensure_workers()
+        queue = self._queues.get(key)
+        if queue is not None and len(queue) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"Queue for {key} is full ({self.max_queue} waiting)")
+        item = _Item(fn, asyncio.get_running_loop().create_future(), contextvars.copy_context())
+        item.future.add_done_callback(lambda future: self._on_done(item))
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+            self._idle.clear()
+        queue.append(item)
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, len(queue))
+        return item.future
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting work and wait up to timeout for queued and running work; True if it all finished"""
+        self.accepting = False
+        if self._idle.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Gave up draining with {self.metrics()['queued']} queued and {self.running} running")
+            return False
+        return True
+
+    async def close(self) -> None:
+        """Stop the workers and cancel all queued and running work"""
+        self.accepting = False
+        for queue in self._queues.values():
+            for item in queue:
+                item.future.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues.clear()
+        self._ready = None
+        self._idle.set()
+
+    def metrics(self) -> Dict:
+        """Queue depths and work counts"""
+        return {
+            'keys': len(self._queues),
+            'queued': sum(len(q) for q in self._queues.values()),
+            'running': self.running,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+        }
+
+    def _ensure_workers(self) -> None:
+        if self._ready is None:
+            self._ready = asyncio.Queue()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    @staticmethod
+    def _on_done(item: _Item) -> None:
+        # A cancelled submitter takes its running work down with it
+        if item.future.cancelled() and item.task is not None:
+            item.task.cancel()
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            item = queue.popleft()
+            if item.future.done():
+                # Its submitter gave up while it was waiting
+                self.dropped += 1
+            else:
+                await self._run(key, item)
+            if queue:
+                # Back of the line, so other keys get a turn
+                self._ready.put_nowait(key)
+            else:
+                del self._queues[key]
+                if not self._queues:
+                    self._idle.set()
+
+    async def _run(self, key: Hashable, item: _Item) -> None:
+        self.running += 1
+        item.task = item.context.run(asyncio.create_task, item.fn())
+        try:
+            await asyncio.wait({item.task})
+        except asyncio.CancelledError:
+            item.task.cancel()
+            item.future.cancel()
+            raise
+        finally:
+            self.running -= 1
+        task = item.task
+        if task.cancelled():
+            item.future.cancel()
+        elif task.exception() is not None:
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(task.exception())
+        else:
+            self.completed += 1
+            if not item.future.done():
+                item.future.set_result(task.result())
@@ -0,0 +1,228 @@
+"""Fake Anthropic Messages API for offline load and latency testing.
+
+Serves ``POST /v1/messages`` with the same SSE event sequence as the real API
+(message_start, content_block_*, ping, message_delta, message_stop), with
+configurable time to first token, streaming rate, error and rate-limit
+injection, and echo or canned replies.
+
+Run standalone and point the bot at it with ANTHROPIC_API_BASE:
+    python -m botlab.fakes.anthropic --port 8765 --ttft 0.4 --tps 60
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import uuid
+from aiohttp import web
+from ..budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r'\s*\S+|\s+')
+
+@dataclass
+class FakeAnthropicConfig:
+    """Behaviour of the fake API"""
+    ttft: float = 0.2                # seconds before the first text delta
+    ttft_jitter: float = 0.0         # extra uniform random delay on top of ttft
+    tokens_per_second: float = 50.0  # streaming rate after the first token (0: no delay)
+    error_rate: float = 0.0          # share of requests answered with error_status
+    error_status: int = 529
+    rate_limit_rate: float = 0.0     # share of requests answered with 429
+    retry_after: float = 1.0
+    stream_error_rate: float = 0.0   # share of streams that fail midway with an error event
+    mode: str = 'echo'               # 'echo' the last user message or reply with canned_text
+    canned_text: str = "This is a canned response from the fake Anthropic API."
+    seed: Optional[int] = None
+
+class FakeAnthropicServer:
+    """aiohttp server standing in for the Messages API"""
+
+    def __init__(self, config: Optional[FakeAnthropicConfig] = None):
+        self.config = config or FakeAnthropicConfig()
+        self.rng = random.Random(self.config.seed)
+        self.requests: List[Dict] = []
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'stream_errors': 0,
+                      'in_flight': 0, 'max_in_flight': 0}
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def make_app(self) -> web.Application:
+        """Application serving /v1/messages"""
+        app = web.Application()
+        app.router.add_post('/v1/messages', self.handle_messages)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start serving and return the messages endpoint URL"""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}/v1/messages"
+        logger.info(f"Fake Anthropic API listening on {self.url}")
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop serving"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_messages(self, request: web.Request) -> web.StreamResponse:
+        """Answer a Messages API request"""
+        body = await request.json()
+        self.requests.append(body)
+        self.stats['requests'] += 1
+        config = self.config
+
+        if self.rng.random() < config.rate_limit_rate:
+            self.stats['rate_limited'] += 1
+            return self._error(429, 'rate_limit_error', "Rate limited",
+                               headers={'retry-after': f"{config.retry_after:g}"})
+        if self.rng.random() < config.error_rate:
+            self.stats['errors'] += 1
+            return self._error(config.error_status, 'overloaded_error', "Overloaded")
+
+        self.stats['in_flight'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        try:
+            if body.get('stream'):
+                return await self._stream(request, body)
+            return await self._message(body)
+        finally:
+            self.stats['in_flight'] -= 1
+
+    def reply_text(self, body: Dict) -> str:
+        """Text the fake model answers with"""
+        if self.config.mode == 'canned':
+            return self.config.canned_text
+        for message in reversed(body.get('messages', [])):
+            if message.get('role') == 'user':
+                content = message.get('content')
+                if isinstance(content, list):
+                    content = ''.join(block.get('text', '') for block in content)
+                return content or self.config.canned_text
+        return self.config.canned_text
+
+    def _reply_tokens(self, body: Dict):
+        """Reply split into token-sized pieces, truncated to max_tokens"""
+        tokens = TOKEN.findall(self.reply_text(body))
+        max_tokens = body.get('max_tokens') or len(tokens)
+        stop_reason = 'max_tokens' if len(tokens) > max_tokens else 'end_turn'
+        return tokens[:max_tokens], stop_reason
+
+    def _input_tokens(self, body: Dict) -> int:
+        return estimate_tokens(json.dumps(body.get('system', ''))) + estimate_tokens(json.dumps(body.get('messages', [])))
+
+    async def _first_token_delay(self) -> None:
+        delay = self.config.ttft + self.rng.uniform(0, self.config.ttft_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _message(self, body: Dict) -> web.Response:
+        tokens, stop_reason = self._reply_tokens(body)
+        await self._first_token_delay()
+        if self.config.tokens_per_second:
+            await asyncio.sleep(len(tokens) / self.config.tokens_per_second)
+        return web.json_response({
+            'id': f"msg_fake_{uuid.uuid4().hex[:12]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model'),
+            'content': [{'type': 'text', 'text': ''.join(tokens)}],
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': {'input_tokens': self._input_tokens(body), 'output_tokens': len(tokens)},
+        })
+
+    async def _stream(self, request: web.Request, body: Dict) -> web.StreamResponse:
+        tokens, stop_reason = self._reply_tokens(body)
+        response = web.StreamResponse(headers={'content-type': 'text/event-stream', 'cache-control': 'no-cache'})
+        await response.prepare(request)
+
+        async def send(event: str, data: Dict) -> None:
+            await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+
+        try:
+            await send('message_start', {'type': 'message_start', 'message': {
+                'id': f"msg_fake_{uuid.uuid4().hex[:12]}", 'type': 'message', 'role': 'assistant',
+                'model': body.get('model'), 'content': [], 'stop_reason': None, 'stop_sequence': None,
+                'usage': {'input_tokens': self._input_tokens(body), 'output_tokens': 1},
+            }})
+            await send('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                               'content_block': {'type': 'text', 'text': ''}})
+            await send('ping', {'type': 'ping'})
+            await self._first_token_delay()
+
+            fail_at = None
+            if tokens and self.rng.random() < self.config.stream_error_rate:
+                fail_at = self.rng.randrange(len(tokens))
+            interval = 1 / self.config.tokens_per_second if self.config.tokens_per_second else 0
+            for i, token in enumerate(tokens):
+                if i == fail_at:
+                    self.stats['stream_errors'] += 1
+                    await send('error', {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}})
+                    await response.write_eof()
+                    return response
+                if i and interval:
+                    await asyncio.sleep(interval)
+                await send('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                                   'delta': {'type': 'text_delta', 'text': token}})
+
+            await send('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+            await send('message_delta', {'type': 'message_delta',
+                                         'delta': {'stop_reason': stop_reason, 'stop_sequence': None},
+                                         'usage': {'output_tokens': len(tokens)}})
+            await send('message_stop', {'type': 'message_stop'})
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client gave up on the stream, e.g. a superseded reply
+            logger.debug("Client disconnected mid-stream")
+        return response
+
+    @staticmethod
+    def _error(status: int, error_type: str, message: str, headers: Optional[Dict] = None) -> web.Response:
+        return web.json_response(
+            {'type': 'error', 'error': {'type': error_type, 'message': message}},
+            status=status,
+            headers=headers
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttft', type=float, default=0.2, help="seconds to first token")
+    parser.add_argument('--ttft-jitter', type=float, default=0.0)
+    parser.add_argument('--tps', type=float, default=50.0, help="tokens per second")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=529)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--stream-error-rate', type=float, default=0.0)
+    parser.add_argument('--canned', help="reply with this text instead of echoing")
+    args = parser.parse_args()
+
+    config = FakeAnthropicConfig(
+        ttft=args.ttft,
+        ttft_jitter=args.ttft_jitter,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        stream_error_rate=args.stream_error_rate,
+        mode='canned' if args.canned else 'echo',
+        canned_text=args.canned or FakeAnthropicConfig.canned_text
+    )
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(FakeAnthropicServer(config).make_app(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
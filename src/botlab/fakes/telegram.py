@@ -0,0 +1,371 @@
+"""Fake Telegram Bot API for offline end-to-end load testing.
+
+Serves ``/bot<token>/<method>`` like the real Bot API. ``getUpdates`` long-polls
+for messages from a seeded random workload spread over many forum chats and
+topics, or from messages pushed with ``push_message``. ``sendMessage`` and
+``editMessageText`` are held to Telegram's flood limits and answered with 429
+and retry_after when a bot goes over them; extra 429s can be injected at
+random. Replies are matched to the messages they answer to measure latency.
+
+Run standalone and point the bot at it with TELEGRAM_API_BASE:
+    python -m botlab.fakes.telegram --port 8081 --chats 20 --messages 1000 --rate 20
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from aiohttp import web
+from ..services.outbound import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "the bot thread topic reply message context model stream token latency queue "
+    "chat user question answer momentum history summary test load fast slow"
+).split()
+
+@dataclass
+class FakeTelegramConfig:
+    """Behaviour of the fake API and its workload"""
+    chats: int = 10                  # forum supergroups the workload writes in
+    topics_per_chat: int = 3
+    users_per_chat: int = 5
+    messages: int = 0                # random messages to generate (0: only pushed ones)
+    message_rate: float = 20.0       # average generated messages per second, across chats
+    min_words: int = 3
+    max_words: int = 30
+    global_rate: float = 30.0        # sends and edits per second before 429s, across chats
+    group_rate: float = 20 / 60      # per group chat
+    private_rate: float = 1.0        # per private chat
+    chat_burst: float = 3.0
+    enforce_limits: bool = True
+    rate_limit_rate: float = 0.0     # share of sends and edits answered with 429 regardless
+    retry_after: int = 1
+    api_latency: float = 0.0         # seconds added to every call
+    max_poll_timeout: float = 10.0
+    seed: Optional[int] = None
+
+class FakeTelegramServer:
+    """aiohttp server standing in for the Bot API"""
+
+    def __init__(self, config: Optional[FakeTelegramConfig] = None):
+        self.config = config or FakeTelegramConfig()
+        self.rng = random.Random(self.config.seed)
+        self.bot_user = {'id': 1, 'is_bot': True, 'first_name': 'Fake Bot', 'username': 'fake_bot'}
+        self.stats = {'get_updates': 0, 'updates': 0, 'sent': 0, 'edited': 0, 'replied': 0,
+                      'rate_limited': 0, 'not_modified': 0, 'errors': 0}
+        self.reply_latencies: List[float] = []
+        self.calls: List[Tuple[str, Dict]] = []
+        self.base_url: Optional[str] = None
+        self._update_ids = itertools.count(1)
+        self._pending: List[Dict] = []
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._messages: Dict[Tuple[int, int], Dict] = {}
+        self._arrived: Dict[Tuple[int, int], float] = {}
+        self._global_bucket = TokenBucket(self.config.global_rate, self.config.global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._new_updates: Optional[asyncio.Event] = None
+        self._replied: Optional[asyncio.Event] = None
+        self._generator: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._closing = False
+
+    def make_app(self) -> web.Application:
+        """Application serving /bot<token>/<method>"""
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_call)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start serving and the workload; returns the base URL to give the bot"""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}/bot"
+        logger.info(f"Fake Telegram Bot API listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Stop the workload and serving"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def chat_ids(self) -> List[int]:
+        """Ids of the workload's chats"""
+        return [-1001000000000 - i for i in range(self.config.chats)]
+
+    def push_message(
+        self,
+        chat_id: int,
+        text: str,
+        message_thread_id: Optional[int] = None,
+        user_id: int = 1000,
+        username: Optional[str] = None
+    ) -> Dict:
+        """Queue an incoming message for getUpdates and return the update"""
+        message_id = self._next_message_id(chat_id)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}",
+                     'username': username or f"user{user_id}"},
+            'text': text,
+        }
+        if message_thread_id is not None:
+            message['message_thread_id'] = message_thread_id
+            message['is_topic_message'] = True
+        update = {'update_id': next(self._update_ids), 'message': message}
+        self._messages[(chat_id, message_id)] = message
+        self._arrived[(chat_id, message_id)] = time.monotonic()
+        self._pending.append(update)
+        if self._new_updates is not None:
+            self._new_updates.set()
+        return update
+
+    async def wait_for_replies(self, count: int, timeout: Optional[float] = None) -> bool:
+        """Wait until count messages have been replied to; False on timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while self.stats['replied'] < count:
+            self._replied = self._replied or asyncio.Event()
+            self._replied.clear()
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._replied.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def handle_call(self, request: web.Request) -> web.Response:
+        """Answer a Bot API method call"""
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls.append((method, params))
+        if self.config.api_latency:
+            await asyncio.sleep(self.config.api_latency)
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            # setWebhook, deleteWebhook, setMyCommands and the like
+            return self._ok(True)
+        try:
+            return await handler(params)
+        except (KeyError, TypeError, ValueError) as e:
+            self.stats['errors'] += 1
+            return self._error(400, f"Bad Request: {str(e)}")
+
+    async def _api_getMe(self, params: Dict) -> web.Response:
+        return self._ok(self.bot_user)
+
+    async def _api_getUpdates(self, params: Dict) -> web.Response:
+        self.stats['get_updates'] += 1
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = min(float(params.get('timeout') or 0), self.config.max_poll_timeout)
+        if offset:
+            # Updates below the offset are confirmed and never sent again
+            self._pending = [u for u in self._pending if u['update_id'] >= offset]
+        if not self._pending and timeout > 0 and not self._closing:
+            self._new_updates = self._new_updates or asyncio.Event()
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = self._pending[:limit]
+        self.stats['updates'] += sum(1 for u in batch if not u.get('_delivered'))
+        for update in batch:
+            update['_delivered'] = True
+        return self._ok([{k: v for k, v in u.items() if not k.startswith('_')} for u in batch])
+
+    async def _api_sendMessage(self, params: Dict) -> web.Response:
+        chat_id = int(params['chat_id'])
+        limited = self._flood_check(chat_id)
+        if limited is not None:
+            return limited
+        message_id = self._next_message_id(chat_id)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': self.bot_user,
+            'text': str(params['text']),
+        }
+        if params.get('message_thread_id') is not None:
+            message['message_thread_id'] = int(params['message_thread_id'])
+        self._messages[(chat_id, message_id)] = message
+        self.stats['sent'] += 1
+        reply_to = params.get('reply_to_message_id') or (params.get('reply_parameters') or {}).get('message_id')
+        arrived = self._arrived.pop((chat_id, int(reply_to)), None) if reply_to else None
+        if arrived is not None:
+            self.reply_latencies.append(time.monotonic() - arrived)
+            self.stats['replied'] += 1
+            if self._replied is not None:
+                self._replied.set()
+        return self._ok(message)
+
+    async def _api_editMessageText(self, params: Dict) -> web.Response:
+        chat_id = int(params['chat_id'])
+        limited = self._flood_check(chat_id)
+        if limited is not None:
+            return limited
+        message = self._messages.get((chat_id, int(params['message_id'])))
+        if message is None:
+            return self._error(400, "Bad Request: message to edit not found")
+        text = str(params['text'])
+        if message['text'] == text:
+            self.stats['not_modified'] += 1
+            return self._error(400, "Bad Request: message is not modified: specified new message content "
+                                    "and reply markup are exactly the same as a current content and reply "
+                                    "markup of the message")
+        message['text'] = text
+        message['edit_date'] = int(time.time())
+        self.stats['edited'] += 1
+        return self._ok(message)
+
+    def _flood_check(self, chat_id: int) -> Optional[web.Response]:
+        """A 429 response if this call goes over the flood limits, else None"""
+        retry_after = None
+        if self.rng.random() < self.config.rate_limit_rate:
+            retry_after = self.config.retry_after
+        elif self.config.enforce_limits:
+            bucket = self._chat_bucket(chat_id)
+            wait = max(self._global_bucket.wait_time(), bucket.wait_time())
+            if wait > 0:
+                retry_after = max(1, math.ceil(wait))
+            else:
+                self._global_bucket.take()
+                bucket.take()
+        if retry_after is None:
+            return None
+        self.stats['rate_limited'] += 1
+        return self._error(429, f"Too Many Requests: retry after {retry_after}",
+                           parameters={'retry_after': retry_after})
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.config.group_rate if chat_id < 0 else self.config.private_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, self.config.chat_burst)
+        return bucket
+
+    def _next_message_id(self, chat_id: int) -> int:
+        if chat_id not in self._message_ids:
+            self._message_ids[chat_id] = itertools.count(1)
+        return next(self._message_ids[chat_id])
+
+    @staticmethod
+    def _chat(chat_id: int) -> Dict:
+        if chat_id > 0:
+            return {'id': chat_id, 'type': 'private', 'first_name': f"User {chat_id}"}
+        return {'id': chat_id, 'type': 'supergroup', 'title': f"Chat {chat_id}", 'is_forum': True}
+
+    async def _generate(self) -> None:
+        """Push the random workload at message_rate"""
+        config = self.config
+        chats = self.chat_ids()
+        for _ in range(config.messages):
+            chat_id = self.rng.choice(chats)
+            user = self.rng.randrange(config.users_per_chat)
+            # Topic ids are the ids of the messages that created them; 1 is General
+            topic = self.rng.randrange(config.topics_per_chat) * 100 + 1 if config.topics_per_chat else None
+            words = self.rng.randint(config.min_words, config.max_words)
+            self.push_message(
+                chat_id,
+                ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize() + '?',
+                message_thread_id=topic,
+                user_id=1000 + user,
+            )
+            if config.message_rate:
+                await asyncio.sleep(self.rng.expovariate(config.message_rate))
+        logger.info(f"Fake Telegram workload pushed {config.messages} messages")
+
+    async def _on_startup(self, app: web.Application) -> None:
+        self._closing = False
+        if self.config.messages:
+            self._generator = asyncio.create_task(self._generate())
+
+    async def _on_shutdown(self, app: web.Application) -> None:
+        if self._generator is not None:
+            self._generator.cancel()
+            await asyncio.gather(self._generator, return_exceptions=True)
+            self._generator = None
+        self._closing = True
+        if self._new_updates is not None:
+            # Let long polls return
+            self._new_updates.set()
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, Any]:
+        """Call parameters from the query string and a JSON, urlencoded or multipart body"""
+        params: Dict[str, Any] = dict(request.query)
+        if request.content_type == 'application/json':
+            params.update(await request.json())
+            return params
+        if request.can_read_body:
+            params.update(await request.post())
+        # Form values are JSON encoded except for plain strings
+        for name, value in params.items():
+            if isinstance(value, str):
+                try:
+                    decoded = json.loads(value)
+                except ValueError:
+                    continue
+                params[name] = value if name == 'text' else decoded
+        return params
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def _error(status: int, description: str, parameters: Optional[Dict] = None) -> web.Response:
+        body = {'ok': False, 'error_code': status, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=status)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--chats', type=int, default=10)
+    parser.add_argument('--topics', type=int, default=3, help="topics per chat")
+    parser.add_argument('--users', type=int, default=5, help="users per chat")
+    parser.add_argument('--messages', type=int, default=1000, help="random messages to generate")
+    parser.add_argument('--rate', type=float, default=20.0, help="generated messages per second")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument('--no-limits', action='store_true', help="don't enforce flood limits")
+    parser.add_argument('--api-latency', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    config = FakeTelegramConfig(
+        chats=args.chats,
+        topics_per_chat=args.topics,
+        users_per_chat=args.users,
+        messages=args.messages,
+        message_rate=args.rate,
+        rate_limit_rate=args.rate_limit_rate,
+        enforce_limits=not args.no_limits,
+        api_latency=args.api_latency,
+        seed=args.seed
+    )
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(FakeTelegramServer(config).make_app(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
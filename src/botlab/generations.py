@@ -0,0 +1,93 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+GenerationKey = Tuple[int, Optional[int]]
+
+@dataclass
+class Generation:
+    """One message's reply being generated for a chat thread"""
+    key: GenerationKey
+    number: int
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    committed: bool = False  # delivery has started; no longer cancelled
+    stale: bool = False      # a newer message arrived for the same thread
+    cancelled: bool = False  # its task was cancelled for being stale
+
+    def commit(self) -> None:
+        """Mark the reply as being delivered so newer messages don't cancel it"""
+        self.committed = True
+
+class GenerationRegistry:
+    """Tracks the newest reply generation per (chat_id, thread_id).
+
+    Starting a generation supersedes the previous one for the same thread:
+    if it hasn't started delivering its reply, its task is cancelled, which
+    also aborts any LLM stream it is reading. Otherwise it is only marked
+    stale. Only the newest message in a thread gets an undelivered reply.
+    """
+
+    def __init__(self):
+        self._current: Dict[GenerationKey, Generation] = {}
+        self._counter = 0
+        self.superseded = 0
+        self.cancelled = 0
+
+    def begin(self, chat_id: int, thread_id: Optional[int] = None) -> Generation:
+        """Start a generation in the current task, superseding the thread's previous one"""
+        key = (chat_id, thread_id)
+        self._counter += 1
+        generation = Generation(key, self._counter, asyncio.current_task())
+        previous = self._current.get(key)
+        self._current[key] = generation
+        if previous is not None:
+            self._supersede(previous)
+        return generation
+
+    def end(self, generation: Generation) -> None:
+        """Forget a finished generation"""
+        if self._current.get(generation.key) is generation:
+            del self._current[generation.key]
+
+    @asynccontextmanager
+    async def track(self, chat_id: int, thread_id: Optional[int] = None) -> AsyncIterator[Generation]:
+        """Run a block as the thread's newest generation.
+
+        If the block is cancelled because a newer message superseded it, the
+        cancellation is absorbed so the caller simply returns.
+        """
+        generation = self.begin(chat_id, thread_id)
+        try:
+            yield generation
+        except asyncio.CancelledError:
+            if not generation.cancelled:
+                raise
+            if generation.task is not None and hasattr(generation.task, 'uncancel'):
+                generation.task.uncancel()
+            logger.info(f"Dropped superseded reply for chat {chat_id}, thread {thread_id}")
+        finally:
+            self.end(generation)
+
+    def metrics(self) -> Dict:
+        """Counts of generations in flight, superseded and cancelled"""
+        return {
+            'in_flight': len(self._current),
+            'superseded': self.superseded,
+            'cancelled': self.cancelled,
+        }
+
+    def _supersede(self, generation: Generation) -> None:
+        generation.stale = True
+        self.superseded += 1
+        if generation.committed or generation.task is None or generation.task.done():
+            return
+        if generation.task is asyncio.current_task():
+            return
+        logger.debug(f"Cancelling superseded generation {generation.number} for {generation.key}")
+        generation.cancelled = True
+        generation.task.cancel()
+        self.cancelled += 1
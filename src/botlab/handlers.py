@@ -1,11 +1,18 @@
-from typing import Optional, Dict
+from typing import AsyncIterator, Optional, Dict, List, Union
+import asyncio
+import inspect
 import logging
+import weakref
 from telegram import Update
 from datetime import datetime
 from .message import Message
 from .history import MessageHistory
 from .momentum import MomentumManager
-from .services.anthropic import AnthropicService
+from .budget import available_tokens
+from .dispatch import ChatDispatcher, DispatchError
+from .coalesce import BurstCoalescer, RAPID_SEQUENCE_CODE
+from .services.anthropic import AnthropicService, ServiceUnavailableError
+from .services.usage import usage_context
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +25,11 @@ class MessageHandler:
         momentum: MomentumManager,
         llm_service: AnthropicService,
         agent_username: str,
-        allowed_topic: Optional[str] = None
+        allowed_topic: Optional[str] = None,
+        context_budget: Optional[int] = None,
+        response_tokens: int = 1000,
+        dispatcher: Optional[ChatDispatcher] = None,
+        coalescer: Optional[BurstCoalescer] = None
     ):
         logger.info("Initializing MessageHandler")
         self.history = history
@@ -26,6 +37,14 @@ class MessageHandler:
         self.llm_service = llm_service
         self.agent_username = agent_username
         self.allowed_topic = allowed_topic
+        # Token budget for each LLM call; history is trimmed to what's left after
+        # the protocol content, prompt wrapper and the reply
+        self.context_budget = context_budget
+        self.response_tokens = response_tokens
+        # Serializes processing per chat thread so overlapping updates can't interleave history
+        self.dispatcher = dispatcher
+        # Merges a sender's rapid consecutive messages into one turn
+        self.coalescer = coalescer
         logger.debug(f"Configured with agent: {agent_username}, topic: {allowed_topic}")
         
     def _extract_message_data(self, update: Update) -> Message:
@@ -42,16 +61,102 @@ class MessageHandler:
             reply_to_message_id=update.message.reply_to_message.message_id if update.message.reply_to_message else None
         )
         
-    async def process_message(self, update: Update, pipeline: list) -> Optional[str]:
-        """Process message and generate response"""
+    async def process_message(
+        self,
+        update: Update,
+        pipeline: list,
+        stream: bool = False
+    ) -> Optional[Union[str, AsyncIterator[str]]]:
+        """Process message and generate response.
+
+        With ``stream=True`` the response is returned as an async iterator of
+        text deltas as soon as the pipeline has run, so callers can start
+        sending at time-to-first-token; it is added to history once complete.
+
+        With a dispatcher, messages in the same chat thread are processed one
+        at a time in arrival order and each is added to history in its turn; a
+        streamed response holds its thread's turn until it has been consumed or
+        closed. With a coalescer, a sender's messages that arrive in quick
+        succession are answered once, by the call for the last of them; the
+        others return None. Each of them is added to history as it arrives.
+        """
+        if self.dispatcher is None and self.coalescer is None:
+            return await self._process_message(update, pipeline, stream)
+        msg = self._extract_message_data(update)
+        recorded = self.coalescer is not None
+        if recorded:
+            self._add_to_history(msg)
+
+        burst = [msg]
+        if self.coalescer is not None:
+            burst = await self.coalescer.add((msg.chat_id, msg.thread_id, msg.agent), msg)
+            if burst is None:
+                logger.info(f"Message {msg.message_id} in chat {msg.chat_id} is part of a rapid sequence ({RAPID_SEQUENCE_CODE})")
+                return None
+
+        def process(released=None):
+            return self._process_message(update, pipeline, stream, recorded=recorded, burst=burst, released=released)
+
+        if self.dispatcher is None:
+            return await process()
+        handoff = asyncio.get_running_loop().create_future()
+        try:
+            turn = asyncio.ensure_future(
+                self.dispatcher.submit((msg.chat_id, msg.thread_id), lambda: self._hold_turn(process, handoff))
+            )
+            try:
+                await asyncio.wait({turn, handoff}, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                turn.cancel()
+                raise
+            # The turn holds on to handoff, so take the result out rather than leave it there
+            return handoff.result().pop() if handoff.done() else turn.result()
+        except DispatchError as e:
+            logger.warning(f"Not responding in chat {msg.chat_id}: {str(e)}")
+            if not recorded:
+                self._add_to_history(msg)
+            return None
+
+    def _add_to_history(self, msg: Message) -> None:
+        """Add a user message to history, logging rather than raising on failure"""
+        try:
+            self.history.add_message(msg)
+        except Exception as e:
+            logger.error(f"Failed to add message to history: {str(e)}")
+
+    @staticmethod
+    async def _hold_turn(process, handoff: asyncio.Future) -> None:
+        """Hand process's result over and keep the dispatcher turn until a streamed result is done with"""
+        released = asyncio.Event()
+        result = await process(released)
+        streaming = inspect.isasyncgen(result)
+        if streaming:
+            # A stream dropped without being started never runs its finally
+            weakref.finalize(result, released.set)
+        handoff.set_result([result])
+        del result
+        if streaming:
+            await released.wait()
+
+    async def _process_message(
+        self,
+        update: Update,
+        pipeline: list,
+        stream: bool = False,
+        recorded: bool = False,
+        burst: Optional[List[Message]] = None,
+        released: Optional[asyncio.Event] = None
+    ) -> Optional[Union[str, AsyncIterator[str]]]:
+        """Run the pipeline and generate the response for one message, or a burst ending with it"""
         try:
             chat_id = update.message.chat_id
             logger.info(f"Processing message for chat {chat_id}")
             msg = self._extract_message_data(update)
             
             # Add user message to history
-            logger.debug("Adding user message to history")
-            self.history.add_message(msg)
+            if not recorded:
+                logger.debug("Adding user message to history")
+                self.history.add_message(msg)
             
             # Initialize momentum if needed
             if chat_id not in self.momentum.initialized_chats:
@@ -63,44 +168,53 @@ class MessageHandler:
             # Create pipeline message
             logger.debug("Creating pipeline message")
             message = {
-                'history_xml': self.history.get_thread_history(chat_id, msg.thread_id),
+                'history_xml': self.history.get_thread_history(
+                    chat_id, msg.thread_id, max_tokens=self._history_budget()
+                ),
                 'chat_id': chat_id,
                 'update': update,
                 'text': msg.content,
                 'thread_id': msg.thread_id,
                 'timestamp': datetime.now().isoformat()
             }
+            if burst and len(burst) > 1:
+                # One turn for the whole rapid sequence
+                message['text'] = '\n'.join(m.content for m in burst if m.content)
+                message['burst'] = {'code': RAPID_SEQUENCE_CODE, 'messages': len(burst)}
             
             # Process through pipeline
             logger.info("Running message through pipeline")
-            result = await self._run_pipeline(message, pipeline)
+            with usage_context(chat_id, msg.thread_id):
+                result = await self._run_pipeline(message, pipeline)
             if not result:
                 logger.error("Pipeline processing failed")
                 raise Exception("Pipeline processing failed")
+            if result.get('code') == ServiceUnavailableError.code:
+                logger.warning(f"LLM service unavailable, not responding in chat {chat_id}")
+                return None
             
+            if stream:
+                logger.debug("Streaming LLM response")
+                return self._stream_and_record(result, msg, released)
+                
             # Get response from LLM
             logger.debug("Generating LLM response")
-            response = await self._generate_response(result)
+            with usage_context(chat_id, msg.thread_id):
+                response = await self._generate_response(result)
             if not response:
                 logger.error("Failed to generate LLM response")
                 raise Exception("Failed to generate response")
                 
             # Add response to history
             logger.debug("Adding bot response to history")
-            self.history.add_message(Message(
-                content=response,
-                role="assistant",
-                agent=self.agent_username,
-                chat_id=chat_id,
-                thread_id=msg.thread_id,
-                message_id=None,  # Will be set when sent
-                reply_to_thread_id=msg.thread_id,
-                reply_to_message_id=msg.message_id
-            ))
+            self._record_response(response, msg)
             
             logger.info(f"Successfully processed message for chat {chat_id}")
             return response
             
+        except ServiceUnavailableError:
+            logger.warning(f"LLM service unavailable, not responding in chat {chat_id}")
+            return None
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             if await self.momentum.recover(chat_id):
@@ -125,26 +239,95 @@ class MessageHandler:
             
         return current_message 
 
+    def _history_budget(self) -> Optional[int]:
+        """Tokens available for history within the context budget, or None if unbounded"""
+        if self.context_budget is None:
+            return None
+        protocols = getattr(self.momentum, 'protocols', None) or {}
+        fixed = [self._response_messages({})[0]['content']]
+        for protocol in protocols.values():
+            fixed.extend(protocol.get_content())
+        return available_tokens(self.context_budget, *fixed, reserve=self.response_tokens)
+
+    def _response_messages(self, pipeline_result: Dict) -> List[Dict]:
+        """Build the LLM request messages for a pipeline result"""
+        latest = "the latest message"
+        if pipeline_result.get('burst'):
+            latest = f"the latest {pipeline_result['burst']['messages']} messages, sent in quick succession"
+        return [{
+            'role': 'user',
+            'content': f"""
+            Here is the conversation history in XML format:
+            {pipeline_result.get('history_xml', '')}
+            
+            Based on this history and {latest}, please provide a response.
+            """
+        }]
+
+    def _record_response(self, response: str, msg: Message) -> None:
+        """Add a bot response to history as a reply to msg"""
+        self.history.add_message(Message(
+            content=response,
+            role="assistant",
+            agent=self.agent_username,
+            chat_id=msg.chat_id,
+            thread_id=msg.thread_id,
+            message_id=None,  # Will be set when sent
+            reply_to_thread_id=msg.thread_id,
+            reply_to_message_id=msg.message_id
+        ))
+
     async def _generate_response(self, pipeline_result: Dict) -> Optional[str]:
         """Generate response using LLM"""
         try:
             return await self.llm_service.call_api(
                 system_msg="",  # System message handled by momentum
-                messages=[{
-                    'role': 'user',
-                    'content': f"""
-                    Here is the conversation history in XML format:
-                    {pipeline_result.get('history_xml', '')}
-                    
-                    Based on this history and the latest message, please provide a response.
-                    """
-                }]
+                messages=self._response_messages(pipeline_result)
             )
             
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             return None
 
+    async def stream_response(self, pipeline_result: Dict) -> AsyncIterator[str]:
+        """Stream response text deltas from the LLM as they are generated"""
+        async for event in self.llm_service.stream(
+            system_msg="",  # System message handled by momentum
+            messages=self._response_messages(pipeline_result)
+        ):
+            if event.type == 'text':
+                yield event.text
+
+    async def _stream_and_record(
+        self,
+        pipeline_result: Dict,
+        msg: Message,
+        released: Optional[asyncio.Event] = None
+    ) -> AsyncIterator[str]:
+        """Stream a response and add it to history once complete; sets released when finished or closed"""
+        parts = []
+        try:
+            with usage_context(msg.chat_id, msg.thread_id):
+                async for text in self.stream_response(pipeline_result):
+                    parts.append(text)
+                    yield text
+        except ServiceUnavailableError:
+            logger.warning(f"LLM service unavailable, not responding in chat {msg.chat_id}")
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            await self.momentum.recover(msg.chat_id)
+            raise
+        else:
+            if parts:
+                logger.debug("Adding streamed bot response to history")
+                self._record_response(''.join(parts), msg)
+        finally:
+            if released is not None:
+                released.set()
+
     async def handle_message(self, message: Message, history_xml: str = None) -> Optional[str]:
         """Handle message and generate response"""
         try:
@@ -152,14 +335,16 @@ class MessageHandler:
             if history_xml is None:
                 history_xml = self.history.get_thread_history(
                     chat_id=message.chat_id,
-                    thread_id=message.thread_id
+                    thread_id=message.thread_id,
+                    max_tokens=self._history_budget()
                 )
             
             logger.info(f"Processing message with history context")
             logger.debug(f"History: {history_xml}")
             
             # Generate response using full history context
-            response = await self.momentum.get_response(history_xml)
+            with usage_context(message.chat_id, message.thread_id):
+                response = await self.momentum.get_response(history_xml)
             
             if response:
                 # Add response to history
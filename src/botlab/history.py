@@ -2,7 +2,7 @@ from typing import List, Dict, Optional
 import logging
 from datetime import datetime
 from .message import Message
-import xml.sax.saxutils as saxutils
+from .budget import estimate_tokens, format_message, trim_history
 
 logger = logging.getLogger(__name__)
 
@@ -24,24 +24,37 @@ class MessageHistory:
         self.messages[message.chat_id][message.thread_id].append(message)
         logger.debug(f"Added message to history for chat {message.chat_id}, thread {message.thread_id}")
         
-    def get_thread_history(self, chat_id: int, thread_id: Optional[int] = None) -> str:
-        """Get conversation history for a thread in XML format"""
+    def get_thread_history(
+        self,
+        chat_id: int,
+        thread_id: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Get conversation history for a thread in XML format.
+
+        With max_tokens, only the newest messages fitting the (estimated) token
+        budget are included, preceded by an <omitted> element counting the
+        older messages left out.
+        """
         if chat_id not in self.messages or thread_id not in self.messages[chat_id]:
             logger.debug(f"No history found for chat {chat_id}, thread {thread_id}")
             return "<history></history>"
             
         messages = self.messages[chat_id][thread_id]
+        omitted = 0
+        if max_tokens is not None:
+            wrapper = estimate_tokens(f'<history>\n  <omitted messages="{len(messages)}"/>\n</history>')
+            messages, omitted = trim_history(messages, max(0, max_tokens - wrapper))
         
         # Convert to XML format
         xml = ["<history>"]
-        for msg in messages:
-            xml.append(f'  <message role="{saxutils.escape(msg.role)}" agent="{saxutils.escape(msg.agent)}">')
-            xml.append(f'    <content>{saxutils.escape(msg.content)}</content>')
-            xml.append('  </message>')
+        if omitted:
+            xml.append(f'  <omitted messages="{omitted}"/>')
+        xml.extend(format_message(msg) for msg in messages)
         xml.append("</history>")
         
         history_xml = "\n".join(xml)
-        logger.debug(f"Retrieved history for chat {chat_id}, thread {thread_id}: {history_xml}")
+        logger.debug(f"Retrieved {len(messages)} history messages for chat {chat_id}, thread {thread_id}")
         return history_xml
         
     def clear_history(self, chat_id: int, thread_id: Optional[int] = None) -> None:
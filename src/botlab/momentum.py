@@ -1,3 +1,4 @@
+from dataclasses import replace
 from typing import Optional, List, Set
 import logging
 from .message import Message
@@ -35,6 +36,21 @@ class MomentumManager:
                 return sequence.messages
         return None
         
+    def _build_prompt(self, protocol_content: List[str], messages: List[Message]) -> List[Message]:
+        """Order prompt messages so the stable prefix comes first.
+
+        Protocol content leads the first system message (or a new one), so the
+        prefix stays byte-identical across calls and can be served from the
+        API's prompt cache. Sequence messages are copied, never modified.
+        """
+        if not protocol_content:
+            return list(messages)
+        protocol_text = "\n".join(protocol_content)
+        if messages and messages[0].role == "system":
+            first_msg = replace(messages[0], content=protocol_text + "\n\n" + messages[0].content)
+            return [first_msg] + list(messages[1:])
+        return [Message(content=protocol_text, role="system", agent="system", chat_id=0)] + list(messages)
+
     async def initialize(self, chat_id: int) -> bool:
         """Initialize momentum for a chat"""
         try:
@@ -119,15 +135,9 @@ class MomentumManager:
                 else:
                     messages = []
             
-            # Add protocol content to first system message
-            if protocol_content and messages:
-                first_msg = messages[0]
-                if first_msg.role == "system":
-                    first_msg.content = "\n".join(protocol_content) + "\n\n" + first_msg.content
-            
             # Call LLM service with protocol content and messages
             response = await self.llm_service.call_api(
-                messages=messages,
+                messages=self._build_prompt(protocol_content, messages),
                 temperature=temperature
             )
             
@@ -0,0 +1,135 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0   # user-facing speaker replies
+PRIORITY_BACKGROUND = 10   # observer/contextualizer analysis
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    model: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+class AdmissionController:
+    """Bounds concurrent LLM calls globally and per model, admitting queued calls by priority.
+
+    Calls beyond the caps wait in a priority queue; within a priority they are
+    admitted FIFO. A waiter whose model is at its cap doesn't block waiters for
+    other models behind it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        model_limits: Optional[Dict[str, int]] = None,
+        clock=time.monotonic
+    ):
+        self.max_concurrency = max_concurrency
+        self.model_limits = dict(model_limits or {})
+        self.clock = clock
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._in_flight_by_model: Dict[str, int] = {}
+        # Wait-time metrics
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        logger.info(f"Initialized admission controller (max_concurrency={max_concurrency}, model_limits={self.model_limits})")
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """Hold a call slot for model for the duration of the block"""
+        await self.acquire(model, priority)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    async def acquire(self, model: str, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """Wait until a call for model may start"""
+        if not self._waiters and self._has_capacity(model):
+            self._admit(model, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, _Waiter(priority, next(self._seq), model, future, self.clock()))
+        # Admit now if only stale (cancelled) waiters were ahead of us
+        self._dispatch()
+        if future.done():
+            return
+        logger.debug(f"Queued LLM call for {model} (priority={priority}, depth={self.queue_depth})")
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled; hand the slot back
+                self.release(model)
+            raise
+
+    def release(self, model: str) -> None:
+        """Release a slot and admit waiters that now fit"""
+        self._in_flight -= 1
+        self._in_flight_by_model[model] -= 1
+        self._dispatch()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a slot"""
+        return sum(1 for w in self._waiters if not w.future.done())
+
+    def metrics(self) -> Dict:
+        """Snapshot of queue depth, in-flight calls and wait times"""
+        depth_by_priority: Dict[int, int] = {}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                depth_by_priority[waiter.priority] = depth_by_priority.get(waiter.priority, 0) + 1
+        return {
+            'in_flight': self._in_flight,
+            'in_flight_by_model': {m: n for m, n in self._in_flight_by_model.items() if n},
+            'queue_depth': sum(depth_by_priority.values()),
+            'queue_depth_by_priority': depth_by_priority,
+            'admitted': self.admitted,
+            'avg_wait': self.total_wait / self.admitted if self.admitted else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+    def _has_capacity(self, model: str) -> bool:
+        if self._in_flight >= self.max_concurrency:
+            return False
+        limit = self.model_limits.get(model)
+        return limit is None or self._in_flight_by_model.get(model, 0) < limit
+
+    def _admit(self, model: str, waited: float) -> None:
+        self._in_flight += 1
+        self._in_flight_by_model[model] = self._in_flight_by_model.get(model, 0) + 1
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _dispatch(self) -> None:
+        """Admit the highest-priority waiters that have capacity"""
+        blocked = []
+        now = self.clock()
+        while self._waiters and self._in_flight < self.max_concurrency:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue  # cancelled while queued
+            if not self._has_capacity(waiter.model):
+                blocked.append(waiter)
+                continue
+            self._admit(waiter.model, now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+        for waiter in blocked:
+            heapq.heappush(self._waiters, waiter)
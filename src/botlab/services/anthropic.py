@@ -1,88 +1,623 @@
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Pattern, Tuple, Union
+import asyncio
 import logging
-import aiohttp
 import json
+import re
+import aiohttp
 from ..message import Message
+from .admission import AdmissionController, PRIORITY_INTERACTIVE
+from .breaker import CircuitBreaker
+from .cache import ResponseCache
+from .hedging import HedgePolicy
+from .router import ModelRouter
+from .http import HTTPPool
+from .retry import RetryPolicy, parse_retry_after
+from .singleflight import SingleFlight, request_key
+from .usage import USAGE_FIELDS, UsageTracker
+from .sse import SSEDecoder, SSEEvent
 
 logger = logging.getLogger(__name__)
 
+# Stream events we act on; everything else (ping, content_block_start, ...) is skipped undecoded
+STREAM_EVENT_TYPES = frozenset({
+    'message_start', 'content_block_delta', 'message_delta', 'message_stop', 'error'
+})
+
+DEFAULT_API_BASE = 'https://api.anthropic.com/v1/messages'
+
+# HTTP status equivalents for errors reported inside a stream
+STREAM_ERROR_STATUSES = {
+    'invalid_request_error': 400,
+    'authentication_error': 401,
+    'permission_error': 403,
+    'not_found_error': 404,
+    'rate_limit_error': 429,
+    'api_error': 500,
+    'overloaded_error': 529,
+}
+
+# Response cache modes: never cache, cache temperature 0 calls only, or cache everything
+CACHE_OFF = 'off'
+CACHE_DETERMINISTIC = 'deterministic'
+CACHE_ALWAYS = 'always'
+
+# Ends a stream early: a closing string (e.g. '</context>'), a compiled regex,
+# or a callable over the accumulated text
+StopCondition = Union[str, Pattern[str], Callable[[str], bool]]
+
+def stop_matcher(stop: StopCondition) -> Callable[[str], Optional[int]]:
+    """Build a function returning where the wanted text ends in a buffer, or None"""
+    if isinstance(stop, str):
+        def match(buffer: str, start: int = 0) -> Optional[int]:
+            index = buffer.find(stop, max(0, start - len(stop) + 1))
+            return None if index == -1 else index + len(stop)
+    elif isinstance(stop, re.Pattern):
+        def match(buffer: str, start: int = 0) -> Optional[int]:
+            found = stop.search(buffer)
+            return found.end() if found else None
+    elif callable(stop):
+        def match(buffer: str, start: int = 0) -> Optional[int]:
+            return len(buffer) if stop(buffer) else None
+    else:
+        raise TypeError(f"Unsupported stop condition: {stop!r}")
+    return match
+
+def stop_key(stop: Optional[StopCondition]):
+    """Part of a request key identifying a stop condition; callables have no stable key"""
+    if stop is None or isinstance(stop, str):
+        return stop
+    if isinstance(stop, re.Pattern):
+        return ['re', stop.pattern, stop.flags]
+    raise TypeError(f"No request key for stop condition {stop!r}")
+
+class LLMServiceError(Exception):
+    """Raised when the LLM backend rejects or fails a request"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class ServiceUnavailableError(LLMServiceError):
+    """Raised without calling the API while the circuit breaker is open"""
+    code = '503'  # service unavailable, see messages.dtd
+
+@dataclass
+class StreamEvent:
+    """A unit of output from a streamed completion.
+
+    ``type`` is one of ``text`` (a text delta), ``usage`` (token counts as
+    reported so far) or ``stop`` (the completion finished).
+    """
+    type: str
+    text: str = ''
+    usage: Dict[str, int] = field(default_factory=dict)
+    stop_reason: Optional[str] = None
+
 class AnthropicService:
     """Service for interacting with Anthropic's Claude API"""
-    
-    def __init__(self, api_key: str, api_version: str, model: str):
+
+    def __init__(
+        self,
+        api_key: str,
+        api_version: str,
+        model: str,
+        pool: Optional[HTTPPool] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        admission: Optional[AdmissionController] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        inflight: Optional[SingleFlight] = None,
+        cache: Optional[ResponseCache] = None,
+        cache_mode: str = CACHE_DETERMINISTIC,
+        cache_ttl: Optional[float] = None,
+        prompt_cache: bool = True,
+        usage_tracker: Optional[UsageTracker] = None,
+        agent: Optional[str] = None,
+        hedging: Optional[HedgePolicy] = None,
+        router: Optional[ModelRouter] = None,
+        api_base: Optional[str] = None
+    ):
         logger.info(f"Initializing Anthropic service with model: {model}")
         self.api_key = api_key
         self.api_version = api_version
         self.model = model
-        self.api_base = 'https://api.anthropic.com/v1/messages'
-        
+        # Overridable to point at a local stand-in (see botlab.fakes.anthropic)
+        self.api_base = api_base or DEFAULT_API_BASE
+        # Share the caller's connection pool when given one, otherwise own a private pool
+        self._owns_pool = pool is None
+        self.pool = pool or HTTPPool()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Shared across services so caps apply to all calls leaving the process
+        self.admission = admission
+        self.breaker = breaker
+        # Identical concurrent completions share one upstream request
+        self.inflight = inflight or SingleFlight()
+        self.cache = cache
+        self.cache_mode = cache_mode
+        self.cache_ttl = cache_ttl
+        # Mark the stable system prefix for server-side prompt caching
+        self.prompt_cache = prompt_cache
+        self.usage: Dict[str, int] = dict.fromkeys(USAGE_FIELDS, 0)
+        # Per chat/agent accounting; agent names the caller this service is derived for
+        self.usage_tracker = usage_tracker
+        self.agent = agent
+        # Opt-in: race a second request when the first token is late
+        self.hedging = hedging
+        # Optional SLO-driven fallback from model to the router's fallback models
+        self.router = router
+
+    async def close(self) -> None:
+        """Close the connection pool if this service owns it"""
+        if self._owns_pool:
+            await self.pool.close()
+
+    def derive(self, **overrides) -> 'AnthropicService':
+        """Create a service (e.g. for another model) sharing this one's pool and admission control.
+
+        Hedging and routing aren't inherited since their latency samples are
+        specific to this service's model.
+        """
+        params = dict(
+            api_key=self.api_key,
+            api_version=self.api_version,
+            model=self.model,
+            pool=self.pool,
+            retry_policy=self.retry_policy,
+            admission=self.admission,
+            breaker=self.breaker,
+            inflight=self.inflight,
+            cache=self.cache,
+            cache_mode=self.cache_mode,
+            cache_ttl=self.cache_ttl,
+            prompt_cache=self.prompt_cache,
+            usage_tracker=self.usage_tracker,
+            agent=self.agent,
+            api_base=self.api_base
+        )
+        params.update(overrides)
+        return AnthropicService(**params)
+
     async def call_api(
-        self, 
-        system_msg: str, 
-        messages: List[Message], 
+        self,
+        system_msg: str = "",
+        messages: Optional[List[Union[Message, Dict]]] = None,
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        priority: int = PRIORITY_INTERACTIVE
     ) -> Optional[str]:
-        """Call Claude API with streaming response handling"""
+        """Call Claude API and return the complete response text.
+
+        Returns None on failure, except that ServiceUnavailableError is raised
+        while the circuit breaker is open so callers can short-circuit.
+        """
         try:
-            logger.info(f"Calling Claude API: {len(messages)} messages")
-            
-            headers = {
-                'anthropic-version': self.api_version,
-                'anthropic-beta': 'max-tokens-3-5-sonnet-2024-07-15',
-                'x-api-key': self.api_key,
-                'content-type': 'application/json'
-            }
-            
-            # Convert Message objects to Anthropic format
-            anthropic_messages = [
-                {
-                    'role': msg.role,
-                    'content': msg.content
-                }
-                for msg in messages
-            ]
-            
-            payload = {
-                'model': self.model,
-                'max_tokens': max_tokens,
-                'temperature': temperature,
-                'system': system_msg,
-                'messages': anthropic_messages,
-                'stream': True
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_base, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        logger.info("Claude API call successful")
-                        return await self._handle_stream(response)
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Claude API error: {error_text}")
-                        return None
-                        
+            return await self.complete(system_msg, messages or [], temperature, max_tokens, priority=priority)
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"API call failed: {str(e)}")
             return None
-            
-    async def _handle_stream(self, response) -> str:
-        """Handle streaming response from Claude API"""
-        logger.debug("Starting to process streaming response")
+
+    async def complete(
+        self,
+        system_msg: str,
+        messages: List[Union[Message, Dict]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        priority: int = PRIORITY_INTERACTIVE,
+        stop: Optional[StopCondition] = None
+    ) -> str:
+        """Call Claude API and return the complete response text, raising on failure.
+
+        Concurrent calls with an identical request share a single upstream call.
+        With a response cache, temperature 0 calls (or all calls, depending on
+        the cache mode) are answered from the cache when possible. With stop,
+        the text ends where the stop condition is first met; calls with a
+        callable stop condition are neither shared nor cached.
+        """
+        logger.info(f"Calling Claude API: {len(messages)} messages")
+        payload = self._build_payload(system_msg, messages, temperature, max_tokens)
+        if callable(stop):
+            return await self._collect(payload, priority, stop)
+        key = request_key(self.api_base, payload, stop_key(stop))
+        cacheable = self._is_cacheable(temperature)
+        if cacheable:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logger.info("Claude API response served from cache")
+                return cached
+        response = await self.inflight.do(key, lambda: self._collect(payload, priority, stop))
+        if cacheable and response:
+            await self.cache.set(key, response, ttl=self.cache_ttl)
+        return response
+
+    def _is_cacheable(self, temperature: float) -> bool:
+        """Whether a completion with this temperature may be served from the cache"""
+        if self.cache is None or self.cache_mode == CACHE_OFF:
+            return False
+        return self.cache_mode == CACHE_ALWAYS or temperature == 0
+
+    async def _collect(self, payload: Dict, priority: int, stop: Optional[StopCondition] = None) -> str:
+        """Stream a request to completion (or its stop condition) and join its text"""
         full_response = []
-        async for line in response.content:
-            if line:
-                line = line.decode('utf-8').strip()
-                if line.startswith('data: '):
-                    try:
-                        data = json.loads(line[6:])
-                        if data.get('type') == 'content_block_delta':
-                            text = data.get('delta', {}).get('text', '')
-                            if text:
-                                full_response.append(text)
-                                logger.debug(f"Received chunk: {text[:50]}...")
-                    except json.JSONDecodeError:
-                        logger.warning("Failed to parse streaming response chunk")
+        async for event in self._until(self._stream_payload(payload, priority), stop):
+            if event.type == 'text':
+                full_response.append(event.text)
+        logger.info("Claude API call successful")
+        return ''.join(full_response)
+
+    async def stream(
+        self,
+        system_msg: str,
+        messages: List[Union[Message, Dict]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        priority: int = PRIORITY_INTERACTIVE,
+        stop: Optional[StopCondition] = None
+    ) -> AsyncIterator[StreamEvent]:
+        """Stream a completion, yielding text deltas, usage and stop reason as they arrive.
+
+        Transient failures (rate limits, overload, 5xx, connection errors) are
+        retried according to the retry policy as long as no text has been
+        yielded yet. With an admission controller each attempt first waits for
+        a slot; lower priority values are admitted first. Raises LLMServiceError
+        if the API rejects the request or reports an error mid-stream. Closing
+        the generator early releases the connection and the slot.
+
+        With stop, the stream is aborted as soon as the accumulated text meets
+        the stop condition; text past the match is dropped and a final stop
+        event with stop_reason 'stop_condition' is yielded.
+        """
+        payload = self._build_payload(system_msg, messages, temperature, max_tokens)
+        async for event in self._until(self._stream_payload(payload, priority), stop):
+            yield event
+
+    async def _until(
+        self,
+        events: AsyncIterator[StreamEvent],
+        stop: Optional[StopCondition]
+    ) -> AsyncIterator[StreamEvent]:
+        """Pass events through until the text meets the stop condition, then abort the request"""
+        if stop is None:
+            async for event in events:
+                yield event
+            return
+        match = stop_matcher(stop)
+        text = ''
+        try:
+            async for event in events:
+                if event.type != 'text':
+                    yield event
+                    continue
+                start = len(text)
+                text += event.text
+                end = match(text, start)
+                if end is None:
+                    yield event
+                    continue
+                if end > start:
+                    yield StreamEvent('text', text=text[start:end])
+                logger.debug(f"Stop condition met after {end} characters, closing stream")
+                yield StreamEvent('stop', stop_reason='stop_condition')
+                return
+        finally:
+            await events.aclose()
+
+    async def _stream_payload(self, payload: Dict, priority: int) -> AsyncIterator[StreamEvent]:
+        """Stream a built request, retrying transient failures before the first token"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        attempt = 0
+        while True:
+            yielded = False
+            if self.router is not None:
+                # Re-route every attempt so retries can move to a fallback model
+                payload = dict(payload, model=self.router.select())
+            try:
+                attempt_stream = (
+                    self._hedged_stream(payload, priority) if self.hedging is not None
+                    else self._stream_once(payload, priority)
+                )
+                # Events ahead of the first text delta are held back, so an error before the
+                # first token (e.g. overloaded right after message_start) can still be retried
+                held = []
+                try:
+                    async for event in attempt_stream:
+                        if not yielded and event.type != 'text':
+                            held.append(event)
+                            continue
+                        yielded = True
+                        for early in held:
+                            yield early
+                        held = []
+                        yield event
+                finally:
+                    # Release the connection now if we're closed early, rather than on GC
+                    await attempt_stream.aclose()
+                for early in held:
+                    yield early
+                return
+            except Exception as e:
+                if yielded:
+                    raise
+                delay = self.retry_policy.next_delay(e, attempt, loop.time() - started)
+                if delay is None:
+                    raise
+                logger.warning(f"Claude API attempt {attempt + 1} failed ({str(e)}), retrying in {delay:.2f}s")
+            # The response is released before sleeping so retries don't hold a pooled connection
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _stream_once(self, payload: Dict, priority: int) -> AsyncIterator[StreamEvent]:
+        """Make a single streaming request"""
+        if self.breaker is not None and not self.breaker.allow():
+            raise ServiceUnavailableError("LLM backend circuit is open, not calling API", status=None)
+        loop = asyncio.get_running_loop()
+        model = payload['model']
+        latency = None
+        responded = False
+        success = None
+        rate_limited = False
+        usage = {}
+        try:
+            async with self._slot(model, priority):
+                started = loop.time()
+                session = await self.pool.get_session()
+                async with session.post(self.api_base, json=payload, headers=self._headers()) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        logger.error(f"Claude API error: {error_text}")
+                        raise LLMServiceError(
+                            f"Claude API returned {response.status}: {error_text}",
+                            status=response.status,
+                            retry_after=parse_retry_after(response.headers.get('retry-after'))
+                        )
+                    responded = True
+                    async for event in self._iter_stream(response):
+                        if latency is None and event.type == 'text':
+                            # Time to first token; message_start arrives before the model has produced anything
+                            latency = loop.time() - started
+                        if event.type == 'usage':
+                            usage.update(event.usage)
+                        yield event
+            if latency is None:
+                # No text at all; the whole response is the best measure
+                latency = loop.time() - started
+            success = True
+        except GeneratorExit:
+            # Closed by the consumer, e.g. on a stop condition: the call itself went fine
+            if responded:
+                success = True
+                if latency is None:
+                    latency = loop.time() - started
+            raise
+        except Exception as e:
+            success = not self._is_backend_failure(e)
+            rate_limited = getattr(e, 'status', None) == 429
+            raise
+        finally:
+            # Also covers streams closed early, e.g. by a stop condition
+            if usage:
+                self._record_usage(usage, model)
+            if self.breaker is not None:
+                if success is None:
+                    self.breaker.abandon()
+                else:
+                    self.breaker.record(success, latency)
+            if self.router is not None and success is not None:
+                self.router.record(model, success and not rate_limited, latency)
+
+    async def _hedged_stream(self, payload: Dict, priority: int) -> AsyncIterator[StreamEvent]:
+        """Make a request, racing a backup copy if the first token is late.
+
+        Whichever request produces its first text delta first is streamed; the
+        other is cancelled. Events ahead of that delta (message_start usage)
+        arrive before the model has produced anything, so they don't count. A request that fails only loses the race, so the request
+        as a whole fails only if every copy does.
+        """
+        policy = self.hedging
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        delay = policy.start()
+        # first-token task -> (launch index, stream); index 0 is the original request
+        streams: Dict[asyncio.Task, Tuple[int, AsyncIterator[StreamEvent]]] = {}
+
+        async def first_token(stream) -> List[StreamEvent]:
+            """Events up to and including the first text delta (all of them if there's none)"""
+            events = []
+            while True:
+                try:
+                    event = await stream.__anext__()
+                except StopAsyncIteration:
+                    return events
+                events.append(event)
+                if event.type == 'text':
+                    return events
+
+        def launch():
+            stream = self._stream_once(payload, priority)
+            streams[asyncio.ensure_future(first_token(stream))] = (len(streams), stream)
+
+        launch()
+        hedged = False
+        winner = None
+        leading = []
+        error = None
+        try:
+            while streams and winner is None:
+                timeout = None
+                if not hedged and delay is not None:
+                    timeout = max(0.0, started + delay - loop.time())
+                done, _ = await asyncio.wait(streams, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if policy.try_hedge():
+                        logger.info(f"No first token after {delay:.2f}s, hedging request to {payload['model']}")
+                        launch()
+                    continue
+                for task in done:
+                    index, stream = streams.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
                         continue
-        logger.debug(f"Completed stream processing, total length: {len(''.join(full_response))}")
-        return ''.join(full_response) 
\ No newline at end of file
+                    winner, leading = (index, stream), task.result()
+                    break
+            if winner is None:
+                raise error
+        finally:
+            # Cancel the losing request, releasing its connection and admission slot
+            for task in streams:
+                task.cancel()
+            await asyncio.gather(*streams, return_exceptions=True)
+            for _, stream in streams.values():
+                await stream.aclose()
+
+        index, stream = winner
+        policy.observe(loop.time() - started, hedge_won=index > 0)
+        try:
+            for event in leading:
+                yield event
+            async for event in stream:
+                yield event
+        finally:
+            await stream.aclose()
+
+    @staticmethod
+    def _is_backend_failure(error: Exception) -> bool:
+        """Whether an error indicates the backend itself is failing (not a bad request)"""
+        if isinstance(error, LLMServiceError):
+            return error.status is None or error.status >= 500
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    def _record_usage(self, usage: Dict[str, int], model: str) -> None:
+        """Add a completed request's token usage to the service totals"""
+        for name in USAGE_FIELDS:
+            self.usage[name] += usage.get(name) or 0
+        if self.usage_tracker is not None:
+            self.usage_tracker.record(model, usage, agent=self.agent)
+        if usage.get('cache_creation_input_tokens') or usage.get('cache_read_input_tokens'):
+            logger.debug(
+                f"Prompt cache: {usage.get('cache_read_input_tokens') or 0} tokens read, "
+                f"{usage.get('cache_creation_input_tokens') or 0} written"
+            )
+
+    @asynccontextmanager
+    async def _slot(self, model: str, priority: int) -> AsyncIterator[None]:
+        """Hold an admission slot for model, if admission control is enabled"""
+        if self.admission is None:
+            yield
+            return
+        async with self.admission.slot(model, priority):
+            yield
+
+    def _headers(self) -> Dict[str, str]:
+        """Build request headers"""
+        beta = ['max-tokens-3-5-sonnet-2024-07-15']
+        if self.prompt_cache:
+            beta.append('prompt-caching-2024-07-31')
+        return {
+            'anthropic-version': self.api_version,
+            'anthropic-beta': ','.join(beta),
+            'x-api-key': self.api_key,
+            'content-type': 'application/json'
+        }
+
+    def _build_payload(
+        self,
+        system_msg: str,
+        messages: List[Union[Message, Dict]],
+        temperature: float,
+        max_tokens: int
+    ) -> Dict:
+        """Build the Messages API request body.
+
+        Leading system-role messages (protocol and momentum prompts) are moved
+        into the system prompt ahead of system_msg. With prompt caching on, the
+        end of that stable prefix is marked as a cache breakpoint.
+        """
+        # Convert Message objects (or plain dicts) to Anthropic format
+        anthropic_messages = [
+            {'role': msg['role'], 'content': msg['content']} if isinstance(msg, dict)
+            else {'role': msg.role, 'content': msg.content}
+            for msg in messages
+        ]
+        prefix = []
+        while anthropic_messages and anthropic_messages[0]['role'] == 'system':
+            prefix.append(anthropic_messages.pop(0)['content'])
+
+        system = system_msg
+        if prefix or self.prompt_cache:
+            blocks = [{'type': 'text', 'text': text} for text in prefix if text]
+            stable = len(blocks)
+            if system_msg:
+                blocks.append({'type': 'text', 'text': system_msg})
+            if self.prompt_cache and blocks:
+                # Without a hoisted prefix the caller's system prompt is the stable part
+                blocks[max(stable, 1) - 1]['cache_control'] = {'type': 'ephemeral'}
+            system = blocks or system_msg
+        return {
+            'model': self.model,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'system': system,
+            'messages': anthropic_messages,
+            'stream': True
+        }
+
+    async def _iter_stream(self, response) -> AsyncIterator[StreamEvent]:
+        """Decode a streaming response body into StreamEvents"""
+        logger.debug("Starting to process streaming response")
+        decoder = SSEDecoder(event_types=STREAM_EVENT_TYPES)
+        stop_reason = None
+        chunks = response.content.iter_any()
+        while True:
+            try:
+                sse_events = decoder.feed(await chunks.__anext__())
+            except StopAsyncIteration:
+                sse_events = decoder.flush()
+                chunks = None
+            for sse_event in sse_events:
+                event = self._parse_event(sse_event)
+                if event is None:
+                    continue
+                if event.stop_reason:
+                    stop_reason = event.stop_reason
+                elif event.type == 'stop':
+                    event.stop_reason = stop_reason
+                yield event
+            if chunks is None:
+                break
+        logger.debug("Completed stream processing")
+
+    def _parse_event(self, sse_event: SSEEvent) -> Optional[StreamEvent]:
+        """Map a raw SSE event onto a StreamEvent"""
+        try:
+            data = sse_event.json()
+        except json.JSONDecodeError:
+            logger.warning("Failed to parse streaming response chunk")
+            return None
+
+        event_type = data.get('type')
+        if event_type == 'content_block_delta':
+            text = data.get('delta', {}).get('text', '')
+            return StreamEvent('text', text=text) if text else None
+        if event_type == 'message_start':
+            usage = data.get('message', {}).get('usage')
+            return StreamEvent('usage', usage=usage) if usage else None
+        if event_type == 'message_delta':
+            return StreamEvent(
+                'usage',
+                usage=data.get('usage', {}),
+                stop_reason=data.get('delta', {}).get('stop_reason')
+            )
+        if event_type == 'message_stop':
+            return StreamEvent('stop')
+        if event_type == 'error':
+            error = data.get('error', {})
+            raise LLMServiceError(
+                f"Claude API stream error: {error.get('type')}: {error.get('message')}",
+                status=STREAM_ERROR_STATUSES.get(error.get('type'), 500)
+            )
+        return None
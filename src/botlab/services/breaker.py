@@ -0,0 +1,132 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Stops calling a degraded backend until it recovers.
+
+    Outcomes are kept in a sliding time window. Once at least ``min_calls``
+    have been seen, the breaker opens if the failure rate or the share of
+    slow calls (latency above ``slow_call_latency``) reaches its threshold.
+    After ``open_duration`` seconds it goes half-open and lets
+    ``half_open_max_calls`` probe calls through: a successful probe closes
+    it, a failed one opens it again.
+    """
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_latency: Optional[float] = None,
+        slow_call_rate: float = 0.8,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock=time.monotonic
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_latency = slow_call_latency
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (timestamp, failed, slow)
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cooldown has passed"""
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_duration:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; every allowed call must be followed by record() or abandon()"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, latency: Optional[float] = None) -> None:
+        """Record the outcome of an allowed call"""
+        now = self.clock()
+        slow = (
+            success and latency is not None and self.slow_call_latency is not None
+            and latency >= self.slow_call_latency
+        )
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if success and not slow:
+                self._transition(CLOSED)
+            else:
+                self._transition(OPEN)
+            return
+        if self._state == OPEN:
+            return
+
+        self._outcomes.append((now, not success, slow))
+        self._prune(now)
+        calls, failures, slow_calls = self._counts()
+        if calls < self.min_calls:
+            return
+        if failures / calls >= self.failure_rate or (
+            self.slow_call_latency is not None and slow_calls / calls >= self.slow_call_rate
+        ):
+            self._transition(OPEN)
+
+    def abandon(self) -> None:
+        """Release an allowed call whose outcome is unknown (e.g. cancelled)"""
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def metrics(self) -> Dict:
+        """Snapshot of breaker state and the current window"""
+        self._prune(self.clock())
+        calls, failures, slow_calls = self._counts()
+        return {
+            'state': self.state,
+            'calls': calls,
+            'failure_rate': failures / calls if calls else 0.0,
+            'slow_call_rate': slow_calls / calls if calls else 0.0,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+        }
+
+    def _counts(self) -> Tuple[int, int, int]:
+        failures = sum(1 for _, failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, _, slow in self._outcomes if slow)
+        return len(self._outcomes), failures, slow_calls
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker {self._state} -> {state}")
+        self._state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = self.clock()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self._outcomes.clear()
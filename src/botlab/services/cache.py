@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """LRU cache of LLM responses with per-entry TTL and an optional SQLite tier.
+
+    The in-memory tier holds at most ``max_entries`` responses. When ``path``
+    is given, responses are also written to a SQLite database so they survive
+    restarts; disk lookups and writes run in the default executor.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        path: Optional[str] = None,
+        clock=time.time
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.clock = clock
+        # key -> (expires_at, response)
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock:
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS responses '
+                    '(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+                )
+                self._db.commit()
+            logger.info(f"Response cache persisted to {path}")
+
+    async def get(self, key: str) -> Optional[str]:
+        """Cached response for key, or None"""
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        if self._db is not None:
+            entry = await self._run(self._db_get, key, now)
+            if entry is not None:
+                self._remember(key, entry[1], entry[0])
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: str, ttl: Optional[float] = None) -> None:
+        """Cache response for key for ttl seconds (the cache default if None)"""
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        self._remember(key, response, expires_at)
+        if self._db is not None:
+            await self._run(self._db_set, key, response, expires_at)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def metrics(self) -> Dict:
+        """Hit/miss counters and in-memory size"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        """Close the SQLite tier"""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _run(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache disk error: {str(e)}")
+            return None
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT expires_at, response FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and row[0] <= now:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._db.commit()
+                return None
+        return row
+
+    def _db_set(self, key: str, response: str, expires_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)',
+                (key, response, expires_at)
+            )
+            self._db.commit()
@@ -0,0 +1,77 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class HedgePolicy:
+    """Decides when to fire a backup request for a slow stream.
+
+    A hedge is sent when no first token has arrived after ``delay`` seconds,
+    or, without a fixed delay, after the rolling ``percentile`` of recent
+    time-to-first-token samples (once ``min_samples`` have been seen).
+    Hedges are capped at ``budget`` (a fraction) of requests: each request
+    earns ``budget`` credit and each hedge spends one, with at most
+    ``max_burst`` credits banked.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        budget: float = 0.05,
+        max_burst: float = 5.0,
+        min_delay: float = 0.05
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.max_burst = max_burst
+        self.min_delay = min_delay
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._credit = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def start(self) -> Optional[float]:
+        """Register a request and return how long to wait before hedging it (None: don't)"""
+        self.requests += 1
+        self._credit = min(self.max_burst, self._credit + self.budget)
+        if self.delay is not None:
+            return self.delay
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def try_hedge(self) -> bool:
+        """Spend budget on a hedge, if any is left"""
+        if self._credit < 1.0 - 1e-9:  # tolerate float drift from summing budget
+            self.denied += 1
+            return False
+        self._credit -= 1.0
+        self.hedges += 1
+        return True
+
+    def observe(self, ttft: float, hedge_won: bool = False) -> None:
+        """Record the time to first token of a finished race"""
+        self._samples.append(ttft)
+        if hedge_won:
+            self.hedge_wins += 1
+
+    def metrics(self) -> Dict:
+        """Hedge counts and the current hedge delay"""
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'denied': self.denied,
+            'hedge_rate': self.hedges / self.requests if self.requests else 0.0,
+            'samples': len(self._samples),
+        }
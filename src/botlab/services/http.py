@@ -0,0 +1,78 @@
+from typing import Optional
+import asyncio
+import logging
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class HTTPPool:
+    """Long-lived aiohttp session shared by services that talk to the same backends.
+
+    The session is created lazily on first use so it binds to the running event
+    loop, and reuses TCP/TLS connections across calls instead of handshaking on
+    every request.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        ttl_dns_cache: Optional[int] = 300,
+        connect_timeout: Optional[float] = 10.0,
+        total_timeout: Optional[float] = None
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.connect_timeout = connect_timeout
+        self.total_timeout = total_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        logger.info(f"Initialized HTTP pool (limit={limit}, per_host={limit_per_host})")
+
+    @property
+    def closed(self) -> bool:
+        """Whether there is currently no open session"""
+        return self._session is None or self._session.closed
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is not loop:
+            # Sessions are bound to the loop they were created on
+            logger.warning("HTTP pool used from a different event loop, recreating session")
+            await self.close()
+        if self.closed:
+            logger.debug("Creating pooled HTTP session")
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+                use_dns_cache=self.ttl_dns_cache is not None
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.total_timeout,
+                sock_connect=self.connect_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._loop = loop
+        return self._session
+
+    async def close(self) -> None:
+        """Close the session and release all pooled connections"""
+        session, loop = self._session, self._loop
+        self._session = None
+        self._loop = None
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_closed():
+            logger.debug("Event loop already closed, dropping HTTP session")
+            return
+        logger.info("Closing pooled HTTP session")
+        try:
+            await session.close()
+        except Exception as e:
+            logger.error(f"Error closing HTTP session: {str(e)}")
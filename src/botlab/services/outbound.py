@@ -0,0 +1,286 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from telegram.error import RetryAfter
+from .progressive import retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Lower values are sent first
+PRIORITY_REPLY = 0        # direct replies to a user's message and their edits
+PRIORITY_BACKGROUND = 10  # unsolicited messages
+
+SEND = 'send_message'
+EDIT = 'edit_message_text'
+
+# How often drain checks whether everything has gone out
+DRAIN_POLL_INTERVAL = 0.05
+
+class TokenBucket:
+    """Allows ``rate`` operations per second with bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available"""
+        self._refill()
+        if self.tokens >= 1.0 - 1e-9:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1.0
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    method: str = field(compare=False)
+    chat_id: int = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+class OutboundScheduler:
+    """Paces messages to Telegram within its flood limits.
+
+    Sends and edits share a global token bucket (``global_rate`` per second)
+    and a bucket per chat: ``group_rate`` for groups and channels (negative
+    chat ids), ``private_rate`` for private chats. Queued calls go out by
+    priority, then in submission order, one at a time per chat so a chat's
+    messages arrive in the order they were sent. A RetryAfter blocks the chat for
+    the time Telegram asks and the call is retried, up to ``max_retries``
+    times. An edit to a message that already has an edit waiting replaces
+    it, and both callers get the result of the newer one.
+
+    Exposes send_message/edit_message_text like a Bot, so it can be passed
+    wherever a bot is used to send replies.
+    """
+
+    def __init__(
+        self,
+        bot=None,
+        global_rate: float = 30.0,
+        group_rate: float = 20 / 60,
+        private_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        clock=time.monotonic
+    ):
+        self.bot = bot
+        self.group_rate = group_rate
+        self.private_rate = private_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._blocked_until: Dict[int, float] = {}
+        self._queue: List[_Job] = []
+        self._seq = itertools.count()
+        self._pending_edits: Dict[Tuple[int, Hashable], _Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        self._sending: set = set()  # chats with a call in flight
+        self.sent = 0
+        self.edited = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_REPLY, **kwargs):
+        """Queue a message and return the sent Message"""
+        return await self._submit(SEND, chat_id, priority, dict(kwargs, chat_id=chat_id, text=text)).future
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int, priority: int = PRIORITY_REPLY, **kwargs):
+        """Queue an edit, replacing one still waiting for the same message"""
+        pending = self._pending_edits.get((chat_id, message_id))
+        if pending is not None and not pending.future.done():
+            pending.kwargs.update(kwargs, text=text)
+            if priority < pending.priority:
+                pending.priority = priority
+                heapq.heapify(self._queue)
+            self.coalesced += 1
+            return await asyncio.shield(pending.future)
+        kwargs = dict(kwargs, chat_id=chat_id, message_id=message_id, text=text)
+        # Shielded: later edits coalesced into this one wait on the same future
+        return await asyncio.shield(self._submit(EDIT, chat_id, priority, kwargs).future)
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to timeout for queued and in-flight calls to go out; True if they all did"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while self._busy():
+            if deadline is not None and loop.time() >= deadline:
+                logger.warning(f"Gave up draining with {len(self._queue)} calls queued and {len(self._in_flight)} in flight")
+                return False
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        return True
+
+    async def close(self) -> None:
+        """Stop sending; queued calls are cancelled"""
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for job in self._queue:
+            job.future.cancel()
+        self._queue.clear()
+        self._pending_edits.clear()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def metrics(self) -> Dict:
+        """Queue depth and delivery counts"""
+        return {
+            'queued': len(self._queue),
+            'in_flight': len(self._in_flight),
+            'sent': self.sent,
+            'edited': self.edited,
+            'coalesced': self.coalesced,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+        }
+
+    def _busy(self) -> bool:
+        return bool(self._in_flight) or any(not job.future.done() for job in self._queue)
+
+    def _submit(self, method: str, chat_id: int, priority: int, kwargs: Dict) -> _Job:
+        job = _Job(priority, next(self._seq), method, chat_id, kwargs, asyncio.get_running_loop().create_future())
+        if method == EDIT:
+            self._pending_edits[(chat_id, kwargs['message_id'])] = job
+        heapq.heappush(self._queue, job)
+        self._ensure_runner()
+        self._wakeup.set()
+        return job
+
+    def _ensure_runner(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst, self.clock)
+        return bucket
+
+    def _chat_wait(self, chat_id: int) -> float:
+        blocked = self._blocked_until.get(chat_id, 0.0) - self.clock()
+        return max(blocked, self._chat_bucket(chat_id).wait_time())
+
+    def _next_job(self) -> Tuple[Optional[_Job], float]:
+        """Highest priority job that can go now, or how long until one might"""
+        wait = self.global_bucket.wait_time()
+        if wait > 0:
+            return None, wait
+        wait = None
+        for job in sorted(self._queue):
+            if job.future.done() or job.chat_id in self._sending:
+                continue
+            chat_wait = self._chat_wait(job.chat_id)
+            if chat_wait <= 0:
+                return job, 0.0
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, wait
+
+    async def _run(self) -> None:
+        while True:
+            self._queue = [job for job in self._queue if not job.future.done()]
+            heapq.heapify(self._queue)
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job, wait = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._queue.remove(job)
+            if job.method == EDIT and self._pending_edits.get((job.chat_id, job.kwargs['message_id'])) is job:
+                del self._pending_edits[(job.chat_id, job.kwargs['message_id'])]
+            self.global_bucket.take()
+            self._chat_bucket(job.chat_id).take()
+            self._sending.add(job.chat_id)
+            task = asyncio.create_task(self._deliver(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, job: _Job) -> None:
+        try:
+            await self._attempt(job)
+        finally:
+            self._sending.discard(job.chat_id)
+            self._wakeup.set()
+
+    async def _attempt(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = await getattr(self.bot, job.method)(**job.kwargs)
+        except RetryAfter as e:
+            retry_after = retry_after_seconds(e)
+            self.rate_limited += 1
+            self._blocked_until[job.chat_id] = self.clock() + retry_after
+            if job.future.done():
+                return
+            if job.attempts > self.max_retries:
+                logger.error(f"Giving up on {job.method} to chat {job.chat_id} after {job.attempts} rate-limited attempts")
+                self.failed += 1
+                job.future.set_exception(e)
+                return
+            logger.warning(f"Rate limited in chat {job.chat_id}, retrying {job.method} after {retry_after}s")
+            if job.method == EDIT:
+                key = (job.chat_id, job.kwargs['message_id'])
+                newer = self._pending_edits.get(key)
+                if newer is not None:
+                    # A newer edit is already waiting; this one resolves with it
+                    newer.future.add_done_callback(lambda f: self._follow(job.future, f))
+                    return
+                self._pending_edits[key] = job
+            heapq.heappush(self._queue, job)
+            return
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        if job.method == SEND:
+            self.sent += 1
+        else:
+            self.edited += 1
+        if not job.future.done():
+            job.future.set_result(result)
+
+    @staticmethod
+    def _follow(future: asyncio.Future, source: asyncio.Future) -> None:
+        """Resolve future the way source was resolved"""
+        if future.done():
+            return
+        if source.cancelled():
+            future.cancel()
+        elif source.exception() is not None:
+            future.set_exception(source.exception())
+        else:
+            future.set_result(source.result())
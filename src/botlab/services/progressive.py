@@ -0,0 +1,192 @@
+from typing import AsyncIterator, Callable, List, Optional
+import asyncio
+import logging
+import re
+import time
+from telegram.error import BadRequest, RetryAfter
+from ..splitter import MAX_MESSAGE_LENGTH, StreamSplitter
+
+logger = logging.getLogger(__name__)
+
+# End of the first sentence: terminal punctuation followed by whitespace, or a line break
+SENTENCE_END = re.compile(r'[.!?…][\)\]"\']*\s|\n')
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Seconds to wait from a RetryAfter error (an int or timedelta depending on PTB version)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class ProgressiveReply:
+    """Delivers a streamed reply as one Telegram message that is edited as text arrives.
+
+    The message is sent as soon as the first sentence is complete (or after
+    ``edit_interval`` seconds without one), then edited at most once every
+    ``edit_interval`` seconds until the stream ends, when a final edit writes
+    the complete text. Unchanged text is never re-sent and RetryAfter responses
+    push the next edit back, keeping within Telegram's edit limits. The stream
+    doesn't wait for edits in between, so when the bot is an OutboundScheduler
+    that still has an edit queued, the newer text replaces it.
+
+    Replies longer than one message are split (see botlab.splitter): once a
+    part is full its message is finalized and the rest continues in a new
+    message, so earlier parts go out while the completion is still streaming.
+    """
+
+    def __init__(
+        self,
+        bot,
+        chat_id: int,
+        message_thread_id: Optional[int] = None,
+        reply_to_message_id: Optional[int] = None,
+        edit_interval: float = 1.5,
+        final_edit_attempts: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+        on_send: Optional[Callable[[], None]] = None
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_thread_id = message_thread_id
+        self.reply_to_message_id = reply_to_message_id
+        self.edit_interval = edit_interval
+        self.final_edit_attempts = final_edit_attempts
+        self.clock = clock
+        self.on_send = on_send  # called once the first message is out
+        self.message = None
+        self.messages: List = []  # every message sent, in order
+        self.text = ''
+        self._parts = []
+        self._splitter = StreamSplitter(MAX_MESSAGE_LENGTH)
+        self._sent_text = ''
+        self._requested_text = ''
+        self._edits: List[asyncio.Task] = []  # edits in flight
+        self._edit_seq = 0
+        self._shown_seq = 0  # latest edit known to have been applied
+        self._started_at: Optional[float] = None
+        self._next_edit_at = 0.0
+
+    async def run(self, deltas: AsyncIterator[str]) -> str:
+        """Consume a stream of text deltas, updating the message as it grows"""
+        try:
+            async for delta in deltas:
+                await self.feed(delta)
+            await self.finish()
+        finally:
+            for task in self._edits:
+                task.cancel()
+        return self.text
+
+    async def feed(self, delta: str) -> None:
+        """Add a text delta and send or edit the message if due"""
+        if not delta:
+            return
+        self._parts.append(delta)
+        self.text = ''.join(self._parts)
+        for part in self._splitter.feed(delta):
+            await self._complete(part)
+        now = self.clock()
+        if self._started_at is None:
+            self._started_at = now
+        if not self._visible_text().strip():
+            return
+
+        if self.message is None:
+            if SENTENCE_END.search(self._visible_text()) or now - self._started_at >= self.edit_interval:
+                await self._send()
+        elif now >= self._next_edit_at:
+            self._start_edit()
+            # Let the edit reach the bot before the next one, so they're queued in order
+            await asyncio.sleep(0)
+
+    async def finish(self) -> None:
+        """Write the complete text once the stream has ended"""
+        if self._visible_text().strip():
+            await self._settle(self._visible_text())
+
+    async def _complete(self, part: str) -> None:
+        """Finalize the current message with a full part and start a new one"""
+        await self._settle(part)
+        self.message = None
+        self._sent_text = ''
+        self._started_at = self.clock()
+
+    async def _settle(self, text: str) -> None:
+        """Make the current message show text, waiting out the edit interval"""
+        if self._edits:
+            edits, self._edits = self._edits, []
+            await asyncio.gather(*edits)
+        if self.message is None:
+            await self._send(text)
+            return
+        for _ in range(self.final_edit_attempts):
+            delay = self._next_edit_at - self.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._edit(text)
+            if self._sent_text == text:
+                return
+        logger.warning(f"Gave up on final edit of progressive reply in chat {self.chat_id}")
+
+    def _visible_text(self) -> str:
+        """Text of the message currently being written"""
+        return self._splitter.pending
+
+    async def _send(self, text: Optional[str] = None) -> None:
+        """Send a new message; only the first replies to the user's message"""
+        text = self._visible_text() if text is None else text
+        first = not self.messages
+        logger.debug(f"Sending part {len(self.messages) + 1} of progressive reply to chat {self.chat_id}")
+        self.message = await self.bot.send_message(
+            chat_id=self.chat_id,
+            text=text,
+            message_thread_id=self.message_thread_id,
+            reply_to_message_id=self.reply_to_message_id if first else None
+        )
+        self.messages.append(self.message)
+        self._sent_text = self._requested_text = text
+        self._next_edit_at = self.clock() + self.edit_interval
+        if first and self.on_send is not None:
+            self.on_send()
+
+    def _start_edit(self) -> None:
+        """Edit the message to the latest text without waiting for it"""
+        for task in [task for task in self._edits if task.done()]:
+            self._edits.remove(task)
+            task.result()
+        text = self._visible_text()
+        if text == self._requested_text:
+            return
+        self._requested_text = text
+        self._next_edit_at = self.clock() + self.edit_interval
+        self._edits.append(asyncio.ensure_future(self._edit(text)))
+
+    async def _edit(self, text: Optional[str] = None) -> None:
+        """Edit the message to the latest text, if it changed"""
+        text = self._visible_text() if text is None else text
+        if text == self._sent_text:
+            return
+        self._edit_seq += 1
+        seq = self._edit_seq
+        try:
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=self.chat_id,
+                message_id=self.message.message_id
+            )
+            self._shown(seq, text)
+            self._next_edit_at = self.clock() + self.edit_interval
+        except RetryAfter as e:
+            retry_after = retry_after_seconds(e)
+            logger.warning(f"Edit rate limited in chat {self.chat_id}, retrying after {retry_after}s")
+            self._next_edit_at = self.clock() + retry_after
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+            self._shown(seq, text)
+
+    def _shown(self, seq: int, text: str) -> None:
+        """Note that an edit went through, unless a newer one already did"""
+        if seq > self._shown_seq:
+            self._shown_seq = seq
+            self._sent_text = text
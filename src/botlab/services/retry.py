@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Optional
+import asyncio
+import logging
+import random
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 408 timeout, 409 conflict, 429 rate limited, 5xx server errors, 529 overloaded
+RETRYABLE_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given as delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Unparseable retry-after header: {value}")
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+@dataclass
+class RetryPolicy:
+    """Retry settings for LLM calls: exponential backoff with full jitter.
+
+    A request is attempted at most ``max_attempts`` times and never retried
+    past ``deadline`` seconds from the first attempt. Server-provided
+    retry-after hints are honoured as a lower bound on the wait.
+    """
+    max_attempts: int = 4
+    deadline: Optional[float] = 60.0
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    retryable_statuses: FrozenSet[int] = RETRYABLE_STATUSES
+
+    def __post_init__(self):
+        self.max_attempts = max(1, int(self.max_attempts))
+        self.deadline = float(self.deadline) if self.deadline is not None else None
+        self.base_delay = float(self.base_delay)
+        self.max_delay = float(self.max_delay)
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether an error is transient and worth another attempt"""
+        status = getattr(error, 'status', None)
+        if status is not None:
+            return status in self.retryable_statuses
+        if getattr(error, 'retryable', False):
+            return True
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before the retry following the given zero-based attempt"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def next_delay(self, error: Exception, attempt: int, elapsed: float) -> Optional[float]:
+        """Delay before retrying after error, or None if the request should fail"""
+        if attempt + 1 >= self.max_attempts or not self.is_retryable(error):
+            return None
+        delay = self.backoff(attempt, getattr(error, 'retry_after', None))
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
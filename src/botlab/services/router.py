@@ -0,0 +1,97 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class ModelRouter:
+    """Routes requests to the first model in a fallback list that meets its SLO.
+
+    Each model's recent calls are kept in a sliding time window. Once a model
+    has at least ``min_calls`` there and its ``percentile`` latency exceeds
+    ``latency_slo`` seconds or its error rate exceeds ``error_rate_slo``, it is
+    demoted for ``cooldown`` seconds and requests go to the next model. After
+    the cooldown it is tried again with a fresh window.
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        latency_slo: Optional[float] = None,
+        error_rate_slo: Optional[float] = 0.25,
+        percentile: float = 0.95,
+        window: float = 120.0,
+        min_calls: int = 5,
+        cooldown: float = 60.0,
+        clock=time.monotonic
+    ):
+        if not models:
+            raise ValueError("ModelRouter requires at least one model")
+        self.models = list(models)
+        self.latency_slo = latency_slo
+        self.error_rate_slo = error_rate_slo
+        self.percentile = percentile
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.clock = clock
+        # model -> (timestamp, latency, failed)
+        self._calls: Dict[str, Deque[Tuple[float, Optional[float], bool]]] = {m: deque() for m in self.models}
+        self._demoted_until: Dict[str, float] = {}
+        self.routed: Dict[str, int] = dict.fromkeys(self.models, 0)
+        self.demotions: Dict[str, int] = dict.fromkeys(self.models, 0)
+        logger.info(f"Initialized model router: {' -> '.join(self.models)}")
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def select(self) -> str:
+        """Model the next request should use"""
+        now = self.clock()
+        model = next((m for m in self.models if self._demoted_until.get(m, 0.0) <= now), self.models[-1])
+        self.routed[model] += 1
+        return model
+
+    def record(self, model: str, success: bool, latency: Optional[float] = None) -> None:
+        """Record a call outcome; latency is the time to first token"""
+        calls = self._calls.get(model)
+        if calls is None:
+            return
+        now = self.clock()
+        calls.append((now, latency, not success))
+        while calls and now - calls[0][0] > self.window:
+            calls.popleft()
+        breach = self._breach(calls)
+        if breach and model != self.models[-1]:
+            self._demoted_until[model] = now + self.cooldown
+            self.demotions[model] += 1
+            calls.clear()
+            logger.warning(f"Model {model} breached its SLO ({breach}), falling back for {self.cooldown:.0f}s")
+
+    def metrics(self) -> Dict:
+        """Routing decisions and the model currently preferred"""
+        now = self.clock()
+        return {
+            'active': next((m for m in self.models if self._demoted_until.get(m, 0.0) <= now), self.models[-1]),
+            'demoted': [m for m in self.models if self._demoted_until.get(m, 0.0) > now],
+            'routed': dict(self.routed),
+            'fallbacks': sum(n for m, n in self.routed.items() if m != self.primary),
+            'demotions': dict(self.demotions),
+        }
+
+    def _breach(self, calls) -> Optional[str]:
+        """Description of the SLO the window breaches, if any"""
+        if len(calls) < self.min_calls:
+            return None
+        failures = sum(1 for _, _, failed in calls if failed)
+        if self.error_rate_slo is not None and failures / len(calls) > self.error_rate_slo:
+            return f"error rate {failures / len(calls):.0%}"
+        if self.latency_slo is not None:
+            latencies = sorted(latency for _, latency, failed in calls if not failed and latency is not None)
+            if len(latencies) >= self.min_calls:
+                value = latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+                if value > self.latency_slo:
+                    return f"p{self.percentile * 100:.0f} latency {value:.2f}s"
+        return None
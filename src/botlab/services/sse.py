@@ -0,0 +1,116 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+import codecs
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SSEEvent:
+    """A single dispatched server-sent event"""
+    event: str
+    data: str
+    _json: Optional[Dict[str, Any]] = field(default=None, repr=False, compare=False)
+
+    def json(self) -> Dict[str, Any]:
+        """Decode the event payload as JSON, caching the result"""
+        if self._json is None:
+            self._json = json.loads(self.data)
+        return self._json
+
+class SSEDecoder:
+    """Incremental decoder for text/event-stream bodies.
+
+    Works on raw byte chunks as they arrive off the socket: UTF-8 sequences and
+    line terminators split across chunk boundaries are carried over to the next
+    feed, and multi-line ``data:`` fields are joined per the SSE spec. Events
+    whose ``event:`` name is not in ``event_types`` are skipped without their
+    data being buffered, so ignored events like ``ping`` cost almost nothing.
+    """
+
+    def __init__(self, event_types: Optional[Iterable[str]] = None):
+        self.event_types = frozenset(event_types) if event_types is not None else None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buffer = ''
+        self._event = ''
+        self._data: List[str] = []
+        self._skip = False
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Feed a chunk of bytes and return any events it completes"""
+        text = self._buffer + self._decoder.decode(chunk)
+        # A trailing CR may be the first half of a CRLF pair
+        held = ''
+        if text.endswith('\r'):
+            held = '\r'
+            text = text[:-1]
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+        # Only whole events (terminated by a blank line) are parsed; the tail waits for more data
+        end = text.rfind('\n\n')
+        if end == -1:
+            self._buffer = text + held
+            return []
+        self._buffer = text[end + 2:] + held
+
+        events = []
+        for block in text[:end].split('\n\n'):
+            event = self._process_block(block)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """Process any buffered partial event at end of stream"""
+        text = self._buffer + self._decoder.decode(b'', final=True)
+        self._buffer = ''
+        # Per spec an unterminated event is discarded, but the final blank line is often omitted
+        event = self._process_block(text.replace('\r\n', '\n').replace('\r', '\n'))
+        return [event] if event is not None else []
+
+    def _process_block(self, block: str) -> Optional[SSEEvent]:
+        """Parse the lines of one blank-line-delimited event"""
+        # Fast path for the common "event: name\ndata: {...}" shape
+        if block.startswith('event: '):
+            name, _, rest = block[7:].partition('\n')
+            wanted = self.event_types is None or name in self.event_types
+            if not wanted and 'event:' not in rest:
+                return None
+            if wanted and rest.startswith('data: ') and '\n' not in rest:
+                return SSEEvent(event=name, data=rest[6:])
+
+        event = None
+        for line in block.split('\n'):
+            event = self._process_line(line) or event
+        return self._dispatch() or event
+
+    def _process_line(self, line: str) -> Optional[SSEEvent]:
+        """Apply a single line to the pending event, returning it on dispatch"""
+        if not line:
+            return self._dispatch()
+        if line[0] == ':':
+            return None
+
+        name, _, value = line.partition(':')
+        if value[:1] == ' ':
+            value = value[1:]
+
+        if name == 'data':
+            if not self._skip:
+                self._data.append(value)
+        elif name == 'event':
+            self._event = value
+            self._skip = self.event_types is not None and value not in self.event_types
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        """Emit the pending event and reset state"""
+        event_name, data, skip = self._event, self._data, self._skip
+        self._event = ''
+        self._data = []
+        self._skip = False
+        if skip or not data:
+            return None
+        return SSEEvent(event=event_name or 'message', data='\n'.join(data))
@@ -1,8 +1,18 @@
+import asyncio
 import logging
-from typing import Optional, Callable, Awaitable
+import signal
+from typing import AsyncIterator, Optional, Callable, Awaitable, Union
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import (
+    Application, ApplicationHandlerStop, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
+)
 from ..message import Message
+from ..generations import GenerationRegistry
+from ..splitter import split_message
+from .progressive import ProgressiveReply
+from .outbound import OutboundScheduler, PRIORITY_BACKGROUND, PRIORITY_REPLY
+from .webhook import WebhookConfig, WebhookServer
+from .updates import UpdateStore
 
 logger = logging.getLogger(__name__)
 
@@ -10,24 +20,68 @@ class TelegramService:
     def __init__(
         self, 
         token: str, 
-        message_handler: Callable[[Message], Awaitable[Optional[str]]], 
-        start_handler: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+        message_handler: Optional[Callable[[Message], Awaitable[Optional[Union[str, AsyncIterator[str]]]]]], 
+        start_handler: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]],
+        edit_interval: float = 1.5,
+        generations: Optional[GenerationRegistry] = None,
+        webhook: Optional[WebhookConfig] = None,
+        outbound: Optional[OutboundScheduler] = None,
+        updates: Optional[UpdateStore] = None,
+        drain_timeout: float = 30.0,
+        base_url: Optional[str] = None,
+        update_handler: Optional[Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]] = None
     ):
-        """Initialize Telegram service"""
+        """Initialize Telegram service.
+
+        message_handler may return a complete reply or an async iterator of
+        text deltas; streamed replies are sent progressively, editing the
+        message at most once every edit_interval seconds. A newer message in
+        the same thread cancels a reply that hasn't started being sent.
+
+        Updates are received by webhook when a WebhookConfig is given,
+        otherwise by long polling. Everything sent goes through the outbound
+        scheduler so it stays within Telegram's flood limits. Updates already
+        handled before a restart are dropped before any handler sees them.
+
+        On stop, no new updates are taken and replies already being handled or
+        sent get up to drain_timeout seconds to finish.
+
+        base_url points the bot at another Bot API server, such as a local one
+        or botlab.fakes.telegram for load tests.
+
+        update_handler, when given, takes text messages in place of
+        message_handler and sends its own replies through this service.
+        """
         self.token = token
         self.message_handler = message_handler
         self.start_handler = start_handler
+        self.update_handler = update_handler
+        self.edit_interval = edit_interval
+        self.generations = generations or GenerationRegistry()
+        self.webhook = webhook
+        self.webhook_server: Optional[WebhookServer] = None
+        self.outbound = outbound or OutboundScheduler()
+        self.updates = updates or UpdateStore()
+        self.drain_timeout = drain_timeout
+        self.base_url = base_url
         self.app = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
         logger.info("Initialized Telegram service")
 
+    async def drop_replayed(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Stop handling of updates that were already handled"""
+        if not await self.updates.record(update):
+            raise ApplicationHandlerStop
+
     async def handle_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         await self.start_handler(update, context)
 
-    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle incoming messages"""
-        # Convert Telegram Update to our Message model
-        msg = Message(
+    @staticmethod
+    def to_message(update: Update) -> Message:
+        """Convert a Telegram update to our Message model"""
+        return Message(
             content=update.message.text,
             role="user",
             agent=update.message.from_user.username,
@@ -37,32 +91,187 @@ class TelegramService:
             reply_to_thread_id=update.message.reply_to_message.message_thread_id if update.message.reply_to_message else None,
             reply_to_message_id=update.message.reply_to_message.message_id if update.message.reply_to_message else None
         )
-        
-        # Process message and get response
-        response = await self.message_handler(msg)
-        
-        if response:
-            # Send response back to Telegram
-            await update.message.reply_text(response)
+
+    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle incoming messages"""
+        msg = self.to_message(update)
+
+        async with self.generations.track(msg.chat_id, msg.thread_id) as generation:
+            # Process message and get response
+            response = await self.message_handler(msg)
+            
+            if response is None or generation.stale:
+                return
+            if hasattr(response, '__aiter__'):
+                # Stream response into a progressively edited reply
+                await self.send_progressive(
+                    chat_id=msg.chat_id,
+                    deltas=response,
+                    message_thread_id=msg.thread_id,
+                    reply_to_message_id=msg.message_id,
+                    on_send=generation.commit
+                )
+            elif response:
+                # Send response back to Telegram
+                generation.commit()
+                await self.send_message(
+                    chat_id=msg.chat_id,
+                    text=response,
+                    message_thread_id=msg.thread_id,
+                    reply_to_message_id=msg.message_id
+                )
+
+    async def send_message(
+        self,
+        chat_id: int,
+        text: str,
+        message_thread_id: Optional[int] = None,
+        reply_to_message_id: Optional[int] = None,
+        priority: Optional[int] = None
+    ):
+        """Send a message to a chat, split into parts if it's too long for one.
+
+        Parts are queued together and go out in order; only the first replies to
+        reply_to_message_id. Replies go ahead of other messages. Returns the
+        first message sent.
+        """
+        if priority is None:
+            priority = PRIORITY_REPLY if reply_to_message_id else PRIORITY_BACKGROUND
+        messages = await asyncio.gather(*(
+            self.outbound.send_message(
+                chat_id=chat_id,
+                text=part,
+                message_thread_id=message_thread_id,
+                reply_to_message_id=reply_to_message_id if i == 0 else None,
+                priority=priority
+            )
+            for i, part in enumerate(split_message(text))
+        ))
+        return messages[0] if messages else None
+
+    async def send_progressive(
+        self,
+        chat_id: int,
+        deltas: AsyncIterator[str],
+        message_thread_id: Optional[int] = None,
+        reply_to_message_id: Optional[int] = None,
+        bot=None,
+        on_send: Optional[Callable[[], None]] = None
+    ) -> str:
+        """Send a streamed reply as soon as its first sentence exists, editing it as it grows"""
+        reply = ProgressiveReply(
+            bot=bot or self.outbound,
+            chat_id=chat_id,
+            message_thread_id=message_thread_id,
+            reply_to_message_id=reply_to_message_id,
+            edit_interval=self.edit_interval,
+            on_send=on_send
+        )
+        return await reply.run(deltas)
+
+    def build_app(self, polling: bool = True) -> Application:
+        """Build the telegram Application with this service's handlers"""
+        builder = Application.builder().token(self.token)
+        if self.base_url:
+            builder = builder.base_url(self.base_url)
+        if not polling:
+            # Updates arrive through the webhook server instead of getUpdates
+            builder = builder.updater(None)
+        # Updates are handled concurrently so a newer message can supersede an older reply
+        app = builder.concurrent_updates(True).build()
+        if self.outbound.bot is None:
+            self.outbound.bot = app.bot
+        # Group -1 runs before every other handler
+        app.add_handler(TypeHandler(Update, self.drop_replayed), group=-1)
+        app.add_handler(CommandHandler("start", self.handle_start))
+        app.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND, 
+            self.update_handler or self.handle_message
+        ))
+        return app
+
+    @property
+    def running(self) -> bool:
+        """Whether run() is receiving updates"""
+        return self._loop is not None
 
     def start(self):
         """Start the Telegram bot"""
         logger.info("Starting Telegram service")
-        self.app = Application.builder().token(self.token).build()
-        
-        # Add handlers
-        self.app.add_handler(CommandHandler("start", self.handle_start))
-        self.app.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND, 
-            self.handle_message
-        ))
-        
-        # Start polling
-        logger.info("Starting message polling")
-        self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+        asyncio.run(self.run())
+
+    async def run(self):
+        """Receive updates by webhook or long polling until stopped or signalled, then drain"""
+        polling = self.webhook is None
+        self.app = self.build_app(polling=polling)
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, self._stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        try:
+            async with self.app:
+                await self.app.start()
+                try:
+                    if polling:
+                        logger.info("Starting message polling")
+                        await self.app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                    else:
+                        self.webhook_server = WebhookServer(self.app, self.webhook)
+                        await self.webhook_server.start()
+                        if self.webhook.url:
+                            await self.app.bot.set_webhook(
+                                url=self.webhook.url,
+                                secret_token=self.webhook.secret_token,
+                                allowed_updates=Update.ALL_TYPES
+                            )
+                            logger.info(f"Registered webhook {self.webhook.url}")
+                    await self._stop_event.wait()
+                finally:
+                    await self.drain(self.drain_timeout)
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    self._loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            self._loop = None
+            self._stop_event = None
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Stop taking updates, then wait up to timeout for in-flight replies and queued sends.
+
+        Returns True if everything finished in time. Whatever is left is
+        cancelled when the application shuts down.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        logger.info(f"Draining Telegram service (up to {timeout}s)")
+        if self.webhook_server is not None:
+            await self.webhook_server.stop()
+        if self.app.updater is not None and self.app.updater.running:
+            await self.app.updater.stop()
+        drained = True
+        if self.app.running:
+            # Handles updates already taken and waits for their handlers
+            try:
+                await asyncio.wait_for(self.app.stop(), remaining())
+            except asyncio.TimeoutError:
+                logger.warning("Gave up waiting for in-flight updates")
+                drained = False
+        drained = await self.outbound.drain(remaining()) and drained
+        await self.outbound.close()
+        logger.info("Telegram service drained" if drained else "Telegram service stopped before draining")
+        return drained
 
     def stop(self):
-        """Stop the Telegram bot"""
-        if self.app:
+        """Stop the Telegram bot, draining in-flight replies; safe to call from any thread"""
+        if self._loop is not None:
             logger.info("Stopping Telegram service")
-            self.app.stop() 
\ No newline at end of file
+            self._loop.call_soon_threadsafe(self._stop_event.set)
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+MessageKey = Tuple[int, int]
+
+# Telegram picks the next update_id at random after a week without updates
+UPDATE_ID_RESET_AFTER = 6 * 24 * 3600
+
+class UpdateStore:
+    """Remembers handled Telegram updates so replays after a restart are dropped.
+
+    Keeps the highest update_id handled and the last ``max_seen``
+    (chat_id, message_id) pairs. When ``path`` is given both are kept in a
+    SQLite database (writes run in the default executor) and reloaded on
+    start. An update is a replay if its id is no newer than the highest one
+    handled before this start, or if its message was already seen. Updates
+    are recorded as they arrive, so each is handled at most once. Update ids
+    only count as a floor for ``floor_ttl`` seconds after the last update, since
+    Telegram may restart the sequence lower after a long quiet period.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_seen: int = 10000,
+        floor_ttl: float = UPDATE_ID_RESET_AFTER,
+        clock=time.time
+    ):
+        self.path = path
+        self.max_seen = max_seen
+        self.floor_ttl = floor_ttl
+        self.clock = clock
+        self.last_update_id = 0
+        self.last_update_at: Optional[float] = None
+        self._seen: 'OrderedDict[MessageKey, None]' = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.duplicates = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock:
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS seen '
+                    '(chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, PRIMARY KEY (chat_id, message_id))'
+                )
+                self._db.commit()
+                state = dict(self._db.execute('SELECT key, value FROM state').fetchall())
+                rows = self._db.execute(
+                    'SELECT chat_id, message_id FROM seen ORDER BY rowid DESC LIMIT ?', (max_seen,)
+                ).fetchall()
+            self.last_update_id = state.get('last_update_id', 0)
+            self.last_update_at = state.get('last_update_at')
+            for key in reversed(rows):
+                self._seen[tuple(key)] = None
+            logger.info(f"Loaded update store from {path}: last update {self.last_update_id}, {len(self._seen)} messages seen")
+        # Updates handled before this start; ids arrive out of order under concurrent handling
+        self.replay_floor = 0 if self._floor_expired() else self.last_update_id
+
+    def _floor_expired(self) -> bool:
+        """Whether it's been long enough since the last update that ids may have restarted"""
+        return self.last_update_at is not None and self.clock() - self.last_update_at > self.floor_ttl
+
+    @staticmethod
+    def message_key(update: Update) -> Optional[MessageKey]:
+        """(chat_id, message_id) of a new message update"""
+        message = update.message
+        if message is None:
+            return None
+        return (message.chat_id, message.message_id)
+
+    def check(self, update: Update) -> bool:
+        """Record an arriving update; False if it was already handled"""
+        key = self.message_key(update)
+        if self.replay_floor and self._floor_expired():
+            logger.info(f"No updates for over {self.floor_ttl:.0f}s, update ids may have restarted")
+            self.replay_floor = 0
+        if update.update_id <= self.replay_floor or (key is not None and key in self._seen):
+            self.duplicates += 1
+            logger.info(f"Dropping replayed update {update.update_id}")
+            return False
+        if self._floor_expired():
+            self.last_update_id = update.update_id
+        else:
+            self.last_update_id = max(self.last_update_id, update.update_id)
+        self.last_update_at = self.clock()
+        if key is not None:
+            self._seen[key] = None
+            while len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+        return True
+
+    async def record(self, update: Update) -> bool:
+        """Check an update and persist it; False if it was already handled"""
+        restarted = self._floor_expired()
+        if not self.check(update):
+            return False
+        if self._db is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._db_record, self.last_update_id, self.last_update_at, restarted, self.message_key(update)
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Update store disk error: {str(e)}")
+        return True
+
+    def metrics(self) -> Dict:
+        """Dedupe counters"""
+        return {
+            'last_update_id': self.last_update_id,
+            'seen': len(self._seen),
+            'duplicates': self.duplicates,
+        }
+
+    def close(self) -> None:
+        """Close the SQLite database"""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _db_record(
+        self,
+        last_update_id: int,
+        last_update_at: float,
+        restarted: bool,
+        key: Optional[MessageKey]
+    ) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            # Writes may land out of order, so only a restarted id sequence may go down
+            self._db.executemany(
+                "INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "value = CASE WHEN ? THEN excluded.value ELSE max(value, excluded.value) END",
+                [('last_update_id', last_update_id, restarted), ('last_update_at', int(last_update_at), False)]
+            )
+            if key is not None:
+                self._db.execute('INSERT OR IGNORE INTO seen (chat_id, message_id) VALUES (?, ?)', key)
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._db.execute(
+                        'DELETE FROM seen WHERE rowid <= (SELECT max(rowid) FROM seen) - ?', (self.max_seen,)
+                    )
+            self._db.commit()
@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = (
+    'input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'
+)
+
+# (chat_id, thread_id) of the conversation an LLM call is made for
+_conversation: ContextVar[Tuple[Optional[int], Optional[int]]] = ContextVar(
+    'usage_conversation', default=(None, None)
+)
+
+@contextmanager
+def usage_context(chat_id: Optional[int], thread_id: Optional[int] = None) -> Iterator[None]:
+    """Attribute LLM usage inside the block to a chat and thread"""
+    token = _conversation.set((chat_id, thread_id))
+    try:
+        yield
+    finally:
+        _conversation.reset(token)
+
+def current_conversation() -> Tuple[Optional[int], Optional[int]]:
+    """(chat_id, thread_id) usage is currently attributed to"""
+    return _conversation.get()
+
+UsageKey = Tuple[Optional[int], Optional[int], Optional[str], str]
+
+class UsageTracker:
+    """Aggregates token usage per chat, thread, agent and model.
+
+    Counters accumulate in memory; ``flush()`` hands the usage recorded since
+    the previous flush to ``sink`` (by default a log line per key, or JSON
+    lines appended to ``path``). With ``flush_interval`` set, flushing runs
+    periodically once the first usage is recorded inside an event loop.
+    ``prices`` maps model names to (input, output) USD per million tokens
+    for cost estimates.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = 300.0,
+        path: Optional[str] = None,
+        sink: Optional[Callable[[List[Dict]], None]] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        clock=time.time
+    ):
+        self.flush_interval = flush_interval
+        self.path = path
+        self.sink = sink
+        self.prices = dict(prices or {})
+        self.clock = clock
+        self._totals: Dict[UsageKey, Dict[str, int]] = {}
+        self._pending: Dict[UsageKey, Dict[str, int]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def record(self, model: str, usage: Dict[str, int], agent: Optional[str] = None) -> None:
+        """Add one request's usage, attributed to the current conversation"""
+        chat_id, thread_id = current_conversation()
+        key = (chat_id, thread_id, agent, model)
+        for counters in (self._totals, self._pending):
+            entry = counters.get(key)
+            if entry is None:
+                entry = counters[key] = dict.fromkeys(('requests',) + USAGE_FIELDS, 0)
+            entry['requests'] += 1
+            for name in USAGE_FIELDS:
+                entry[name] += usage.get(name) or 0
+        self._ensure_flusher()
+
+    def totals(
+        self,
+        chat_id: Optional[int] = None,
+        thread_id: Optional[int] = None,
+        agent: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, float]:
+        """Usage since startup summed over keys matching the given filters"""
+        result = dict.fromkeys(('requests',) + USAGE_FIELDS, 0)
+        result['cost'] = 0.0
+        for key, counters in self._totals.items():
+            if any(want is not None and want != have for want, have in zip((chat_id, thread_id, agent, model), key)):
+                continue
+            for name, value in counters.items():
+                result[name] += value
+            result['cost'] += self.cost(key[3], counters)
+        return result
+
+    def cost(self, model: str, counters: Dict[str, int]) -> float:
+        """Estimated USD cost of counters for model (0 if the model has no price)"""
+        price = self.prices.get(model)
+        if price is None:
+            return 0.0
+        input_price, output_price = price
+        # Cache writes cost 25% more than input tokens, cache reads 90% less
+        input_cost = (
+            counters.get('input_tokens', 0)
+            + 1.25 * counters.get('cache_creation_input_tokens', 0)
+            + 0.1 * counters.get('cache_read_input_tokens', 0)
+        ) * input_price
+        return (input_cost + counters.get('output_tokens', 0) * output_price) / 1_000_000
+
+    async def flush(self) -> List[Dict]:
+        """Emit and reset usage recorded since the last flush"""
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, {}
+        now = self.clock()
+        records = [
+            dict(
+                timestamp=now, chat_id=chat_id, thread_id=thread_id, agent=agent, model=model,
+                cost=self.cost(model, counters), **counters
+            )
+            for (chat_id, thread_id, agent, model), counters in pending.items()
+        ]
+        try:
+            if self.sink is not None:
+                self.sink(records)
+            elif self.path:
+                await asyncio.get_running_loop().run_in_executor(None, self._append, records)
+            else:
+                for record in records:
+                    logger.info(f"LLM usage: {json.dumps(record)}")
+        except Exception as e:
+            logger.error(f"Failed to flush usage: {str(e)}")
+        return records
+
+    async def close(self) -> None:
+        """Stop periodic flushing and flush what's left"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def _append(self, records: List[Dict]) -> None:
+        with open(self.path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    def _ensure_flusher(self) -> None:
+        if not self.flush_interval or (self._flusher is not None and not self._flusher.done()):
+            return
+        try:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        except RuntimeError:
+            pass  # no running loop; flushed on close()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
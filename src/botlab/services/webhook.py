@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+import hmac
+import json
+import logging
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+@dataclass
+class WebhookConfig:
+    """Where to receive Telegram updates pushed by webhook"""
+    secret_token: str
+    url: Optional[str] = None    # public URL registered with Telegram; None skips set_webhook (local testing)
+    host: str = '0.0.0.0'
+    port: int = 8443
+    path: str = '/telegram'
+    max_body_size: int = 1024 ** 2
+
+class WebhookServer:
+    """aiohttp endpoint feeding Telegram webhook updates into an Application.
+
+    Requests must carry the secret token registered with set_webhook. Each
+    update is decoded and put on the application's update queue, and the
+    request is answered immediately; handlers run off the queue.
+    """
+
+    def __init__(self, application, config: WebhookConfig):
+        self.application = application
+        self.config = config
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        """Application serving the webhook path and a health check"""
+        app = web.Application(client_max_size=self.config.max_body_size)
+        app.router.add_post(self.config.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def start(self) -> None:
+        """Start listening"""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.config.host, self.config.port).start()
+        logger.info(f"Webhook listening on {self.config.host}:{self.config.port}{self.config.path}")
+
+    async def stop(self) -> None:
+        """Stop listening"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Verify, decode and enqueue one update"""
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.config.secret_token.encode()):
+            self.rejected += 1
+            logger.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+        try:
+            data = json.loads(await request.read())
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            # Telegram redelivers on errors; a malformed body never becomes valid
+            self.invalid += 1
+            logger.error(f"Discarding malformed webhook update: {str(e)}")
+            return web.Response(status=200)
+        self.application.update_queue.put_nowait(update)
+        self.received += 1
+        return web.Response(status=200)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.metrics())
+
+    def metrics(self) -> Dict:
+        """Counts of updates accepted, rejected and discarded"""
+        return {
+            'received': self.received,
+            'rejected': self.rejected,
+            'invalid': self.invalid,
+            'queued': self.application.update_queue.qsize(),
+        }
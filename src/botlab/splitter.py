@@ -0,0 +1,104 @@
+"""Splitting long replies into Telegram-sized messages.
+
+Telegram rejects messages longer than 4096 UTF-16 code units. Replies are cut
+at the last paragraph break that fits, falling back to a line break, sentence
+end, space and finally a hard cut. A cut inside a ``` code block closes the
+fence at the end of that part and reopens it, with its language, at the start
+of the next, so every part renders on its own.
+"""
+from typing import List, Optional, Tuple
+import re
+
+# Telegram rejects message text longer than this (in UTF-16 code units)
+MAX_MESSAGE_LENGTH = 4096
+
+FENCE = re.compile(r'^```(\S*)', re.MULTILINE)
+SENTENCE_BREAK = re.compile(r'[.!?…][\)\]"\']*\s')
+FENCE_CLOSE = '\n```'
+
+# Don't break earlier than this fraction of the limit just to land on a nicer boundary
+MIN_FILL = 0.5
+
+def text_length(text: str) -> int:
+    """Length as Telegram counts it, in UTF-16 code units"""
+    return len(text) + sum(1 for c in text if ord(c) > 0xFFFF)
+
+def _fit(text: str, limit: int) -> int:
+    """Number of leading characters of text that fit in limit UTF-16 units"""
+    if text_length(text) <= limit:
+        return len(text)
+    used = 0
+    for i, c in enumerate(text):
+        used += 2 if ord(c) > 0xFFFF else 1
+        if used > limit:
+            return i
+    return len(text)
+
+def _open_fence(text: str) -> Optional[str]:
+    """Language of the code fence left open at the end of text ('' if none given), or None"""
+    language = None
+    for match in FENCE.finditer(text):
+        language = match.group(1) if language is None else None
+    return language
+
+def _break_at(window: str) -> int:
+    """Best position to cut window at"""
+    floor = int(len(window) * MIN_FILL)
+    for separator in ('\n\n', '\n'):
+        index = window.rfind(separator, floor)
+        if index > 0:
+            return index
+    sentence_ends = [m.end() for m in SENTENCE_BREAK.finditer(window, floor)]
+    if sentence_ends:
+        return sentence_ends[-1]
+    index = window.rfind(' ', floor)
+    if index > 0:
+        return index
+    return len(window)
+
+def take_part(text: str, limit: int = MAX_MESSAGE_LENGTH) -> Tuple[str, str]:
+    """Split the first message-sized part off text, returning (part, rest)"""
+    if text_length(text) <= limit:
+        return text, ''
+    for reserve in (0, len(FENCE_CLOSE)):
+        window = text[:_fit(text, limit - reserve)]
+        cut = _break_at(window)
+        part, rest = text[:cut].rstrip(), text[cut:].lstrip(' \n')
+        language = _open_fence(part)
+        if language is None:
+            return part, rest
+        if reserve:
+            # Close the fence here and reopen it in the next part
+            return part + FENCE_CLOSE, f"```{language}\n" + rest
+    return part, rest
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Split text into parts that each fit in one message"""
+    parts = []
+    while text:
+        part, text = take_part(text, limit)
+        if part.strip():
+            parts.append(part.rstrip())
+    return parts
+
+class StreamSplitter:
+    """Incrementally splits streamed text, releasing each part as soon as it is full"""
+
+    def __init__(self, limit: int = MAX_MESSAGE_LENGTH):
+        self.limit = limit
+        self.pending = ''
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a delta and return the parts it completed"""
+        self.pending += delta
+        parts = []
+        while text_length(self.pending) > self.limit:
+            part, self.pending = take_part(self.pending, self.limit)
+            if part.strip():
+                parts.append(part)
+        return parts
+
+    def finish(self) -> List[str]:
+        """Return whatever is left"""
+        rest, self.pending = self.pending, ''
+        return [rest] if rest.strip() else []
@@ -27,6 +27,19 @@ class MomentumSequence:
         """Allow dict-like access for backward compatibility"""
         return getattr(self, key)
 
+@dataclass
+class ServiceConfig:
+    """LLM service settings from the agent's <service> element"""
+    provider: str = 'anthropic'
+    model: Optional[str] = None
+    api_version: Optional[str] = None
+    retry: Dict[str, float] = field(default_factory=dict)  # RetryPolicy overrides
+    cache: Optional[bool] = None  # None caches temperature 0 calls only
+    cache_ttl: Optional[float] = None
+    context_tokens: Optional[int] = None  # token budget per call, history is trimmed to fit
+    fallback: List[str] = field(default_factory=list)  # models to route to when the primary breaches its SLO
+    slo: Dict[str, float] = field(default_factory=dict)  # ModelRouter SLO overrides
+
 @dataclass
 class AgentConfig:
     name: str
@@ -37,6 +50,7 @@ class AgentConfig:
     response_interval_unit: Optional[str] = None
     protocols: List[Dict] = field(default_factory=list)
     momentum_sequences: List[MomentumSequence] = field(default_factory=list)
+    service: Optional[ServiceConfig] = None
 
 @dataclass
 class Protocol:
@@ -167,6 +181,59 @@ def parse_protocol(protocol_elem) -> Protocol:
         agent_definition=agent_definition.__dict__
     )
 
+def parse_service(service_elem) -> ServiceConfig:
+    """Parse LLM service settings from XML"""
+    def text(tag: str) -> Optional[str]:
+        elem = service_elem.find(tag)
+        return elem.text.strip() if elem is not None and elem.text else None
+    
+    retry = {}
+    retry_elem = service_elem.find('retry')
+    if retry_elem is not None:
+        for attr in ('max_attempts', 'deadline', 'base_delay', 'max_delay'):
+            value = retry_elem.get(attr)
+            if value is not None:
+                retry[attr] = float(value)
+    
+    cache = None
+    cache_ttl = None
+    cache_elem = service_elem.find('cache')
+    if cache_elem is not None:
+        cache = cache_elem.get('enabled', 'true').lower() == 'true'
+        if cache_elem.get('ttl') is not None:
+            cache_ttl = float(cache_elem.get('ttl'))
+    
+    context_tokens = None
+    budget_elem = service_elem.find('budget')
+    if budget_elem is not None and budget_elem.get('context_tokens') is not None:
+        context_tokens = int(budget_elem.get('context_tokens'))
+    
+    fallback = []
+    fallback_elem = service_elem.find('fallback')
+    if fallback_elem is not None:
+        fallback = [m.text.strip() for m in fallback_elem.findall('model') if m.text and m.text.strip()]
+    
+    slo = {}
+    slo_elem = service_elem.find('slo')
+    if slo_elem is not None:
+        for attr, key in (('latency', 'latency_slo'), ('error_rate', 'error_rate_slo'),
+                          ('window', 'window'), ('cooldown', 'cooldown')):
+            value = slo_elem.get(attr)
+            if value is not None:
+                slo[key] = float(value)
+    
+    return ServiceConfig(
+        provider=text('provider') or 'anthropic',
+        model=text('model'),
+        api_version=text('api_version'),
+        retry=retry,
+        cache=cache,
+        cache_ttl=cache_ttl,
+        context_tokens=context_tokens,
+        fallback=fallback,
+        slo=slo
+    )
+
 def validate_xml_dtd(xml_path: str) -> tuple[bool, list[str]]:
     """Validate XML against its DTD."""
     errors = []
@@ -243,6 +310,12 @@ def load_agent_config(config_path: str) -> AgentConfig:
             response_interval = int(interval_elem.text)
             response_interval_unit = interval_elem.get('unit')
         
+        # Get LLM service settings
+        service = None
+        service_elem = metadata.find('service')
+        if service_elem is not None:
+            service = parse_service(service_elem)
+        
         # Get protocols
         protocols = []
         for protocol in root.findall('.//protocols/protocol'):
@@ -261,7 +334,8 @@ def load_agent_config(config_path: str) -> AgentConfig:
             response_interval=response_interval,
             response_interval_unit=response_interval_unit,
             protocols=protocols,
-            momentum_sequences=sequences
+            momentum_sequences=sequences,
+            service=service
         )
         
     except ET.ParseError as e:
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from botlab.services.admission import AdmissionController, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+@pytest.mark.asyncio
+async def test_global_cap():
+    """Test that no more than max_concurrency calls run at once"""
+    controller = AdmissionController(max_concurrency=2)
+    running = []
+    peak = 0
+    release = asyncio.Event()
+
+    async def call():
+        nonlocal peak
+        async with controller.slot("model"):
+            running.append(1)
+            peak = max(peak, len(running))
+            await release.wait()
+            running.pop()
+
+    tasks = [asyncio.create_task(call()) for _ in range(5)]
+    await settle()
+    assert controller.metrics()['in_flight'] == 2
+    assert controller.queue_depth == 3
+    release.set()
+    await asyncio.gather(*tasks)
+    assert peak == 2
+    assert controller.metrics()['admitted'] == 5
+
+@pytest.mark.asyncio
+async def test_priority_order():
+    """Test that interactive calls are admitted before queued background calls"""
+    controller = AdmissionController(max_concurrency=1)
+    order = []
+    await controller.acquire("model")
+
+    async def call(name, priority):
+        async with controller.slot("model", priority):
+            order.append(name)
+
+    tasks = [
+        asyncio.create_task(call("background-1", PRIORITY_BACKGROUND)),
+        asyncio.create_task(call("background-2", PRIORITY_BACKGROUND)),
+    ]
+    await settle()
+    tasks.append(asyncio.create_task(call("speaker", PRIORITY_INTERACTIVE)))
+    await settle()
+    assert controller.metrics()['queue_depth_by_priority'] == {PRIORITY_INTERACTIVE: 1, PRIORITY_BACKGROUND: 2}
+
+    controller.release("model")
+    await asyncio.gather(*tasks)
+    assert order == ["speaker", "background-1", "background-2"]
+
+@pytest.mark.asyncio
+async def test_model_limit_does_not_block_other_models():
+    """Test that a saturated model doesn't hold up other models"""
+    controller = AdmissionController(max_concurrency=4, model_limits={"opus": 1})
+    await controller.acquire("opus")
+
+    opus = asyncio.create_task(controller.acquire("opus"))
+    haiku = asyncio.create_task(controller.acquire("haiku"))
+    await settle()
+    assert haiku.done()
+    assert not opus.done()
+
+    controller.release("opus")
+    await settle()
+    assert opus.done()
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped():
+    """Test that cancelling a queued call doesn't leak or block slots"""
+    controller = AdmissionController(max_concurrency=1)
+    await controller.acquire("model")
+    waiter = asyncio.create_task(controller.acquire("model"))
+    await settle()
+    waiter.cancel()
+    await settle()
+    controller.release("model")
+
+    await asyncio.wait_for(controller.acquire("model"), timeout=1)
+    assert controller.metrics()['in_flight'] == 1
+
+@pytest.mark.asyncio
+async def test_wait_time_metrics():
+    """Test that wait times are recorded for queued calls"""
+    now = [0.0]
+    controller = AdmissionController(max_concurrency=1, clock=lambda: now[0])
+    await controller.acquire("model")
+    waiter = asyncio.create_task(controller.acquire("model"))
+    await settle()
+    now[0] = 2.5
+    controller.release("model")
+    await waiter
+    metrics = controller.metrics()
+    assert metrics['max_wait'] == 2.5
+    assert metrics['avg_wait'] == 1.25
@@ -0,0 +1,347 @@
+import asyncio
+import json
+import re
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from botlab.services.anthropic import (
+    AnthropicService, LLMServiceError, ServiceUnavailableError, CACHE_ALWAYS, stop_matcher
+)
+from botlab.services.cache import ResponseCache
+from botlab.services.hedging import HedgePolicy
+from botlab.services.router import ModelRouter
+from botlab.services.usage import UsageTracker, usage_context
+from botlab.services.breaker import CircuitBreaker, OPEN
+from botlab.services.retry import RetryPolicy
+from botlab.message import Message
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+STREAM = [
+    sse('message_start', {'type': 'message_start', 'message': {'usage': {
+        'input_tokens': 12, 'output_tokens': 1, 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 900
+    }}}),
+    sse('content_block_start', {'type': 'content_block_start', 'index': 0}),
+    sse('ping', {'type': 'ping'}),
+    sse('content_block_delta', {'type': 'content_block_delta', 'delta': {'text': 'Hello'}}),
+    sse('content_block_delta', {'type': 'content_block_delta', 'delta': {'text': ' world'}}),
+    sse('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'}, 'usage': {'output_tokens': 2}}),
+    sse('message_stop', {'type': 'message_stop'}),
+]
+
+async def collect(events):
+    return [event async for event in events]
+
+OVERLOADED_STREAM = STREAM[:3] + [
+    sse('error', {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}}),
+]
+
+@pytest_asyncio.fixture
+async def api_server():
+    """Serve a canned Messages API stream"""
+    state = {'status': 200, 'failures': [], 'delays': [], 'streams': [], 'token_delays': [], 'requests': []}
+
+    async def messages(request):
+        state['requests'].append(await request.json())
+        if state['delays']:
+            await asyncio.sleep(state['delays'].pop(0))
+        if state['failures']:
+            return web.Response(status=state['failures'].pop(0), headers={'retry-after': '0'}, text='{"error": "overloaded"}')
+        if state['status'] != 200:
+            return web.Response(status=state['status'], text='{"error": "overloaded"}')
+        response = web.StreamResponse(headers={'content-type': 'text/event-stream'})
+        await response.prepare(request)
+        chunks = state['streams'].pop(0) if state['streams'] else STREAM
+        # Delay before the first text delta, after message_start has gone out
+        token_delay = state['token_delays'].pop(0) if state['token_delays'] else 0
+        for chunk in chunks:
+            if token_delay and b'content_block_delta' in chunk:
+                await asyncio.sleep(token_delay)
+                token_delay = 0
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post('/v1/messages', messages)
+    server = TestServer(app)
+    await server.start_server()
+    state['url'] = str(server.make_url('/v1/messages'))
+    yield state
+    await server.close()
+
+@pytest_asyncio.fixture
+async def service(api_server):
+    service = AnthropicService("key", "2023-06-01", "test-model", retry_policy=RetryPolicy(base_delay=0.01))
+    service.api_base = api_server['url']
+    yield service
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_stream_yields_deltas_usage_and_stop(service):
+    """Test that stream() yields events as they arrive"""
+    events = [e async for e in service.stream("system", [Message("Hi", "user", "u", 1)])]
+    assert [e.type for e in events] == ['usage', 'text', 'text', 'usage', 'stop']
+    assert events[0].usage['input_tokens'] == 12
+    assert events[1].text == 'Hello'
+    assert events[-1].stop_reason == 'end_turn'
+
+@pytest.mark.asyncio
+async def test_call_api_wraps_stream(service, api_server):
+    """Test that call_api returns the assembled text"""
+    response = await service.call_api("system", [{'role': 'user', 'content': 'Hi'}])
+    assert response == 'Hello world'
+    assert api_server['requests'][0]['messages'] == [{'role': 'user', 'content': 'Hi'}]
+
+@pytest.mark.asyncio
+async def test_error_status(service, api_server):
+    """Test that API errors raise from stream() and return None from call_api"""
+    api_server['status'] = 400
+    with pytest.raises(LLMServiceError) as exc_info:
+        async for _ in service.stream("system", [{'role': 'user', 'content': 'Hi'}]):
+            pass
+    assert exc_info.value.status == 400
+    assert await service.call_api("system", [{'role': 'user', 'content': 'Hi'}]) is None
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried(service, api_server):
+    """Test that 429/529 responses are retried until success"""
+    api_server['failures'] = [529, 429]
+    response = await service.call_api("system", [{'role': 'user', 'content': 'Hi'}])
+    assert response == 'Hello world'
+    assert len(api_server['requests']) == 3
+
+@pytest.mark.asyncio
+async def test_overload_after_message_start_is_retried(service, api_server):
+    """Test that an in-stream error before the first token is retried without repeating events"""
+    api_server['streams'] = [OVERLOADED_STREAM]
+    events = [e async for e in service.stream("system", [{'role': 'user', 'content': 'Hi'}])]
+    assert [e.type for e in events] == ['usage', 'text', 'text', 'usage', 'stop']
+    assert len(api_server['requests']) == 2
+
+@pytest.mark.asyncio
+async def test_error_after_first_token_is_not_retried(service, api_server):
+    """Test that a stream is committed once text has reached the consumer"""
+    api_server['streams'] = [STREAM[:4] + OVERLOADED_STREAM[3:]]
+    with pytest.raises(LLMServiceError):
+        async for _ in service.stream("system", [{'role': 'user', 'content': 'Hi'}]):
+            pass
+    assert len(api_server['requests']) == 1
+
+@pytest.mark.asyncio
+async def test_retries_exhausted(service, api_server):
+    """Test that retries stop after max_attempts"""
+    service.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.01)
+    api_server['failures'] = [529, 529, 529]
+    assert await service.call_api("system", [{'role': 'user', 'content': 'Hi'}]) is None
+    assert len(api_server['requests']) == 2
+
+@pytest.mark.asyncio
+async def test_fatal_errors_not_retried(service, api_server):
+    """Test that client errors fail immediately"""
+    api_server['status'] = 401
+    assert await service.call_api("system", [{'role': 'user', 'content': 'Hi'}]) is None
+    assert len(api_server['requests']) == 1
+
+@pytest.mark.asyncio
+async def test_open_breaker_short_circuits(service, api_server):
+    """Test that an open breaker fails calls without hitting the API"""
+    service.breaker = CircuitBreaker(min_calls=1, open_duration=60)
+    service.retry_policy = RetryPolicy(max_attempts=1)
+    api_server['status'] = 500
+    assert await service.call_api("system", [{'role': 'user', 'content': 'Hi'}]) is None
+    assert service.breaker.state == OPEN
+    requests = len(api_server['requests'])
+
+    with pytest.raises(ServiceUnavailableError):
+        await service.complete("system", [{'role': 'user', 'content': 'Hi'}])
+    assert len(api_server['requests']) == requests
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced(service, api_server):
+    """Test that concurrent identical completions make one request"""
+    messages = [{'role': 'user', 'content': 'Hi'}]
+    results = await asyncio.gather(
+        service.complete("system", messages),
+        service.complete("system", messages),
+        service.complete("system", [{'role': 'user', 'content': 'Hello'}])
+    )
+    assert results == ["Hello world"] * 3
+    assert len(api_server['requests']) == 2
+
+@pytest.mark.asyncio
+async def test_deterministic_calls_are_cached(service, api_server):
+    """Test that temperature 0 calls are served from the cache"""
+    service.cache = ResponseCache()
+    messages = [{'role': 'user', 'content': 'Hi'}]
+    assert await service.complete("system", messages, temperature=0) == "Hello world"
+    assert await service.complete("system", messages, temperature=0) == "Hello world"
+    assert len(api_server['requests']) == 1
+
+    # Sampled calls aren't cached unless the service opts in
+    await service.complete("system", messages)
+    await service.complete("system", messages)
+    assert len(api_server['requests']) == 3
+    always = service.derive(cache_mode=CACHE_ALWAYS)
+    await always.complete("system", messages)
+    await always.complete("system", messages)
+    assert len(api_server['requests']) == 4
+    assert service.cache.metrics()['hits'] == 2
+
+@pytest.mark.asyncio
+async def test_callable_stop_is_not_cached(service, api_server):
+    """Test that calls with a callable stop condition always go upstream"""
+    service.cache = ResponseCache()
+    messages = [{'role': 'user', 'content': 'Hi'}]
+
+    def stop(text):
+        return len(text) >= 4
+
+    results = await asyncio.gather(*(service.complete("system", messages, temperature=0, stop=stop) for _ in range(2)))
+    assert results == ["Hello"] * 2
+    assert await service.complete("system", messages, temperature=0, stop=stop) == "Hello"
+    assert len(api_server['requests']) == 3
+    assert service.cache.metrics()['entries'] == 0
+
+def test_payload_hoists_system_prefix_for_caching():
+    """Test that leading system messages become a cached system prefix"""
+    service = AnthropicService("key", "2023-06-01", "test-model")
+    payload = service._build_payload("Analyze this", [
+        Message("Protocol", "system", "system", 0),
+        {'role': 'system', 'content': 'Momentum'},
+        {'role': 'user', 'content': 'Hi'},
+    ], 0.7, 100)
+    assert payload['messages'] == [{'role': 'user', 'content': 'Hi'}]
+    assert [b['text'] for b in payload['system']] == ['Protocol', 'Momentum', 'Analyze this']
+    assert [('cache_control' in b) for b in payload['system']] == [False, True, False]
+    assert 'prompt-caching' in service._headers()['anthropic-beta']
+
+    service.prompt_cache = False
+    assert service._build_payload("Analyze this", [{'role': 'user', 'content': 'Hi'}], 0.7, 100)['system'] == "Analyze this"
+
+@pytest.mark.asyncio
+async def test_usage_records_cache_tokens(service):
+    """Test that token usage including prompt cache reads is accumulated"""
+    await service.complete("system", [{'role': 'user', 'content': 'Hi'}])
+    await service.complete("system", [{'role': 'user', 'content': 'Hello'}])
+    assert service.usage == {
+        'input_tokens': 24, 'output_tokens': 4,
+        'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 1800
+    }
+
+@pytest.mark.asyncio
+async def test_usage_tracked_per_conversation(service):
+    """Test that stream usage is reported to the tracker with agent and chat"""
+    tracker = UsageTracker(flush_interval=None)
+    agent_service = service.derive(usage_tracker=tracker, agent="Observer")
+    with usage_context(5, 9):
+        await agent_service.complete("system", [{'role': 'user', 'content': 'Hi'}])
+    totals = tracker.totals(chat_id=5, thread_id=9, agent="Observer", model="test-model")
+    assert (totals['requests'], totals['input_tokens'], totals['output_tokens']) == (1, 12, 2)
+
+@pytest.mark.asyncio
+async def test_slow_first_token_is_hedged(service, api_server):
+    """Test that a backup request wins when the first one stalls"""
+    service.hedging = HedgePolicy(delay=0.05, budget=1.0)
+    api_server['delays'] = [5, 0]
+    response = await asyncio.wait_for(service.complete("system", [{'role': 'user', 'content': 'Hi'}]), timeout=2)
+    assert response == "Hello world"
+    assert len(api_server['requests']) == 2
+    assert service.hedging.metrics()['hedge_wins'] == 1
+
+@pytest.mark.asyncio
+async def test_slow_token_after_message_start_is_hedged(service, api_server):
+    """Test that hedging races the first text delta, not message_start"""
+    service.hedging = HedgePolicy(delay=0.05, budget=1.0)
+    api_server['token_delays'] = [5, 0]
+    events = await asyncio.wait_for(
+        collect(service.stream("system", [{'role': 'user', 'content': 'Hi'}])), timeout=2
+    )
+    assert [e.type for e in events] == ['usage', 'text', 'text', 'usage', 'stop']
+    assert len(api_server['requests']) == 2
+    assert service.hedging.metrics()['hedge_wins'] == 1
+
+@pytest.mark.asyncio
+async def test_hedge_survives_failed_original(service, api_server):
+    """Test that an error in one copy only loses the race"""
+    service.hedging = HedgePolicy(delay=0.05, budget=1.0)
+    service.retry_policy = RetryPolicy(max_attempts=1)
+    api_server['delays'] = [0.2]
+    api_server['failures'] = [500]
+    response = await asyncio.wait_for(service.complete("system", [{'role': 'user', 'content': 'Hi'}]), timeout=2)
+    assert response == "Hello world"
+
+@pytest.mark.asyncio
+async def test_hedging_budget_exhausted(service, api_server):
+    """Test that requests aren't hedged once the budget is spent"""
+    service.hedging = HedgePolicy(delay=0.01, budget=0.5, max_burst=1.0)
+    api_server['delays'] = [0.05, 0.05, 0.05, 0.05]
+    for content in ("a", "b"):
+        await service.complete("system", [{'role': 'user', 'content': content}])
+    assert len(api_server['requests']) == 3
+    assert service.hedging.metrics()['denied'] == 1
+
+@pytest.mark.asyncio
+async def test_router_falls_back_on_errors(service, api_server):
+    """Test that requests move to the fallback model after the primary fails"""
+    service.router = ModelRouter(["test-model", "fallback-model"], error_rate_slo=0.5, min_calls=1)
+    service.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.01)
+    api_server['failures'] = [529]
+    assert await service.complete("system", [{'role': 'user', 'content': 'Hi'}]) == "Hello world"
+    assert [r['model'] for r in api_server['requests']] == ["test-model", "fallback-model"]
+    assert service.router.metrics()['routed'] == {"test-model": 1, "fallback-model": 1}
+
+@pytest.mark.asyncio
+async def test_router_latency_is_time_to_first_token(service, api_server):
+    """Test that a slow first token after a prompt message_start breaches the latency SLO"""
+    service.router = ModelRouter(["test-model", "fallback-model"], latency_slo=0.1, min_calls=1)
+    api_server['token_delays'] = [0.3]
+    assert await service.complete("system", [{'role': 'user', 'content': 'Hi'}]) == "Hello world"
+    assert service.router.metrics()['demoted'] == ["test-model"]
+    await service.complete("system", [{'role': 'user', 'content': 'Again'}])
+    assert [r['model'] for r in api_server['requests']] == ["test-model", "fallback-model"]
+
+@pytest.mark.asyncio
+async def test_breaker_slow_calls_use_time_to_first_token(service, api_server):
+    """Test that the breaker counts a call with a late first token as slow"""
+    service.breaker = CircuitBreaker(failure_rate=0.5, slow_call_latency=0.1, slow_call_rate=0.5, min_calls=1)
+    api_server['token_delays'] = [0.3]
+    await service.complete("system", [{'role': 'user', 'content': 'Hi'}])
+    assert service.breaker.metrics()['slow_call_rate'] == 1.0
+
+@pytest.mark.asyncio
+async def test_stop_terminated_calls_are_recorded(service, api_server):
+    """Test that a stream closed on a stop condition counts as a successful call"""
+    service.breaker = CircuitBreaker(min_calls=1)
+    service.router = ModelRouter(["test-model", "fallback-model"], min_calls=10)
+    for _ in range(2):
+        assert await service.complete("system", [{'role': 'user', 'content': 'Hi'}], stop='Hel') == "Hel"
+    assert service.breaker.metrics()['calls'] == 2
+    assert service.breaker.metrics()['failure_rate'] == 0.0
+    assert [failed for _, _, failed in service.router._calls["test-model"]] == [False, False]
+
+def test_stop_matcher():
+    """Test closing-string, regex and callable stop conditions"""
+    assert stop_matcher('</context>')('<context>x</context> trailing') == 20
+    assert stop_matcher('</context>')('<context>x</con') is None
+    assert stop_matcher(re.compile(r'code="\d+"'))('<message code="301"/>') == 19
+    assert stop_matcher(lambda text: len(text) > 3)('abcd') == 4
+
+@pytest.mark.asyncio
+async def test_stream_stops_at_condition(service):
+    """Test that the stream ends as soon as the stop condition is met"""
+    events = [e async for e in service.stream("system", [{'role': 'user', 'content': 'Hi'}], stop='lo w')]
+    assert [(e.type, e.text) for e in events if e.type == 'text'] == [('text', 'Hello'), ('text', ' w')]
+    assert events[-1].type == 'stop'
+    assert events[-1].stop_reason == 'stop_condition'
+    # Usage seen before stopping is still accounted
+    assert service.usage['input_tokens'] == 12
+
+@pytest.mark.asyncio
+async def test_complete_with_stop(service):
+    """Test that complete() returns text up to the stop condition"""
+    messages = [{'role': 'user', 'content': 'Hi'}]
+    assert await service.complete("system", messages, stop=re.compile(r'Hel+')) == "Hell"
+    assert await service.complete("system", messages) == "Hello world"
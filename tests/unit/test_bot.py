@@ -1,7 +1,9 @@
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from botlab.bot import Bot
-from botlab.xml_handler import AgentConfig, MomentumSequence
+from botlab.services.breaker import OPEN
+from botlab.xml_handler import AgentConfig, MomentumSequence, ServiceConfig
 from botlab.message import Message
 
 @pytest.fixture
@@ -112,4 +114,136 @@ def test_env_fallback_values(monkeypatch):
         
         # Should use environment values
         assert bot.username == 'env_bot'
-        assert bot.allowed_topic == 'env_topic' 
\ No newline at end of file
+        assert bot.allowed_topic == 'env_topic'
+
+def test_model_limits_from_env(mock_config, monkeypatch):
+    """Test that per-model concurrency limits are read from the environment"""
+    monkeypatch.setenv('LLM_MODEL_LIMITS', 'claude-3-opus-latest=2, claude-3-haiku-20240307=10')
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml")
+    assert bot.admission.model_limits == {'claude-3-opus-latest': 2, 'claude-3-haiku-20240307': 10}
+
+def test_slow_calls_open_breaker(mock_config, monkeypatch):
+    """Test that the bot's breaker trips on slow calls by default"""
+    monkeypatch.delenv('LLM_BREAKER_SLOW_SECONDS', raising=False)
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml")
+    for _ in range(bot.breaker.min_calls):
+        bot.breaker.record(True, latency=30.0)
+    assert bot.breaker.state == OPEN
+
+def test_telegram_service_is_built(mock_config, monkeypatch):
+    """Test that the bot builds its Telegram service with its own handlers"""
+    monkeypatch.setenv('TELEGRAM_TOKEN', '123:abc')
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml", username="test_bot")
+    assert bot.telegram is not None
+    assert bot.telegram.token == '123:abc'
+    assert bot.telegram.generations is bot.generations
+    callbacks = [handler.callback for handler in bot.telegram.build_app().handlers[0]]
+    assert bot.handle_telegram_message in callbacks
+    assert bot.telegram.handle_start in callbacks
+
+def test_no_telegram_service_without_token(mock_config, monkeypatch):
+    """Test that a missing token leaves Telegram disabled instead of failing"""
+    monkeypatch.delenv('TELEGRAM_TOKEN', raising=False)
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml")
+    assert bot.telegram is None
+
+@pytest.mark.asyncio
+async def test_telegram_message_gets_reply(mock_config, monkeypatch):
+    """Test that a mention arriving from Telegram passes the filters and is answered"""
+    monkeypatch.setenv('TELEGRAM_TOKEN', '123:abc')
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml", username="test_bot")
+    bot.telegram.send_message = AsyncMock()
+    update = Mock()
+    update.message.text = "@test_bot hello"
+    update.message.chat_id = 123
+    update.message.message_thread_id = None
+    update.message.message_id = 1
+    update.message.from_user.username = "testuser"
+    update.message.reply_to_message = None
+    await bot.handle_telegram_message(update, Mock())
+    assert bot.telegram.send_message.call_args.kwargs['text'] == "Response placeholder"
+    await bot.shutdown()
+
+@pytest.mark.asyncio
+async def test_rapid_telegram_messages_answered_once(mock_config, monkeypatch):
+    """Test that a sender's burst of messages gets one reply to the last of them"""
+    monkeypatch.setenv('TELEGRAM_TOKEN', '123:abc')
+    monkeypatch.setenv('CHAT_BURST_WINDOW', '0.05')
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml", username="test_bot")
+    bot.telegram.send_message = AsyncMock()
+    bot.inhibitor.process = Mock(return_value="Merged reply")
+
+    def update(message_id, text):
+        update = Mock()
+        update.message.text = text
+        update.message.chat_id = 123
+        update.message.message_thread_id = None
+        update.message.message_id = message_id
+        update.message.from_user.username = "testuser"
+        update.message.reply_to_message = None
+        return update
+
+    async def send(message_id, text, delay):
+        await asyncio.sleep(delay)
+        await bot.handle_telegram_message(update(message_id, text), Mock())
+
+    await asyncio.gather(send(1, "@test_bot hey", 0), send(2, "@test_bot quick question", 0.01))
+    bot.telegram.send_message.assert_called_once()
+    message = bot.inhibitor.process.call_args[0][0]
+    assert message['content'] == "@test_bot hey\n@test_bot quick question"
+    assert message['burst'] == {'code': '502', 'messages': 2}
+    assert bot.coalescer.metrics()['merged'] == 1
+    await bot.shutdown()
+
+def test_burst_coalescing_off_by_default(mock_config, monkeypatch):
+    """Test that a zero window leaves messages uncoalesced"""
+    monkeypatch.delenv('CHAT_BURST_WINDOW', raising=False)
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml")
+    assert bot.coalescer is None
+
+@pytest.mark.asyncio
+async def test_history_trimmed_to_agent_budget(mock_config):
+    """Test that the reply's history fits the agent's <budget context_tokens>"""
+    mock_config.service = ServiceConfig(context_tokens=1200)
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml")
+    for i in range(200):
+        bot.history.add_message(Message(content=f"message {i} " * 20, role="user", agent="user", chat_id=123))
+    bot.history.get_thread_history = Mock(wraps=bot.history.get_thread_history)
+    update = Mock()
+    update.message.chat_id = 123
+    update.message.message_thread_id = None
+    await bot._reply(update, Mock(stale=True))
+    assert bot.history.get_thread_history.call_args.kwargs['max_tokens'] == 200
+    assert '<omitted messages=' in bot.history.get_thread_history(123, max_tokens=200)
+
+@pytest.mark.asyncio
+async def test_serve_shuts_down_after_telegram_drains(mock_config, monkeypatch):
+    """Test that serve() closes everything once Telegram has stopped and drained"""
+    monkeypatch.setenv('TELEGRAM_TOKEN', '123:abc')
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml", username="test_bot")
+    order = []
+    bot.telegram.run = AsyncMock(side_effect=lambda: order.append('telegram'))
+    bot.usage.close = AsyncMock(side_effect=lambda: order.append('usage'))
+    await bot.serve()
+    assert order == ['telegram', 'usage']
+    assert bot.http_pool.closed
+    assert not bot.dispatcher.accepting
+
+@pytest.mark.asyncio
+async def test_stop_from_event_loop_keeps_shutdown_task(mock_config):
+    """Test that stopping inside a running loop holds on to the shutdown task"""
+    with patch('botlab.bot.load_agent_config', return_value=mock_config):
+        bot = Bot(config_path="test_config.xml", username="test_bot")
+    bot.stop()
+    assert bot.shutdown_task is not None
+    assert await bot.shutdown_task
+    assert bot.http_pool.closed
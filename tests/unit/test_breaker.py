@@ -0,0 +1,86 @@
+import pytest
+from botlab.services.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(window=60, min_calls=4, failure_rate=0.5, open_duration=30, clock=clock)
+
+def test_opens_on_failure_rate(breaker):
+    """Test that the breaker opens once enough calls fail"""
+    for success in (True, False, True):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.metrics()['rejected'] == 1
+
+def test_needs_min_calls(breaker):
+    """Test that a few early failures don't open the breaker"""
+    for _ in range(3):
+        breaker.record(False)
+    assert breaker.state == CLOSED
+
+def test_old_outcomes_expire(breaker, clock):
+    """Test that failures outside the window are forgotten"""
+    for _ in range(3):
+        breaker.record(False)
+    clock.now = 61
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    assert breaker.metrics()['calls'] == 1
+
+def test_half_open_probe_closes(breaker, clock):
+    """Test that a successful probe after the cooldown closes the breaker"""
+    for _ in range(4):
+        breaker.record(False)
+    clock.now = 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+def test_half_open_probe_failure_reopens(breaker, clock):
+    """Test that a failed probe opens the breaker for another cooldown"""
+    for _ in range(4):
+        breaker.record(False)
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    clock.now = 45
+    assert not breaker.allow()
+    assert breaker.metrics()['times_opened'] == 2
+
+def test_abandoned_probe_is_released(breaker, clock):
+    """Test that a cancelled probe doesn't keep the breaker half-open forever"""
+    for _ in range(4):
+        breaker.record(False)
+    clock.now = 30
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+def test_opens_on_slow_calls(clock):
+    """Test that mostly-slow successful calls also open the breaker"""
+    breaker = CircuitBreaker(min_calls=4, slow_call_latency=5.0, slow_call_rate=0.75, clock=clock)
+    breaker.record(True, latency=1.0)
+    for _ in range(3):
+        breaker.record(True, latency=8.0)
+    metrics = breaker.metrics()
+    assert metrics['state'] == OPEN
+    assert metrics['slow_call_rate'] == 0.75
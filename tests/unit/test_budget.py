@@ -0,0 +1,50 @@
+from botlab.budget import estimate_tokens, message_tokens, available_tokens, trim_history
+from botlab.history import MessageHistory
+from botlab.message import Message
+
+def make_messages(count, content="word " * 20):
+    return [Message(content=f"{i}: {content}", role="user", agent="user", chat_id=1) for i in range(count)]
+
+def test_estimate_tokens():
+    """Test the local estimate for ASCII and non-ASCII text"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("abcd" * 10) == 10
+    assert estimate_tokens("abcde") == 2
+    # Multi-byte text counts more tokens per character
+    assert estimate_tokens("日本語" * 10) == 30
+    # Characters are weighted one by one, so mixed text costs the sum of its parts
+    assert estimate_tokens("abcd" * 10 + "日本語" * 10) == 40
+
+def test_available_tokens():
+    """Test that fixed parts and the reserve come out of the budget"""
+    assert available_tokens(1000, "x" * 400, reserve=200) == 700
+    assert available_tokens(100, "x" * 4000) == 0
+
+def test_trim_keeps_newest_within_budget():
+    """Test that the oldest messages are dropped first"""
+    messages = make_messages(100)
+    per_message = message_tokens(messages[50])
+    kept, dropped = trim_history(messages, per_message * 10 + 1)
+    assert len(kept) == 10
+    assert dropped == 90
+    assert kept[-1] is messages[-1]
+    assert sum(message_tokens(m) for m in kept) <= per_message * 10 + 1
+
+def test_trim_within_budget_keeps_everything():
+    """Test that a history under budget is left intact"""
+    messages = make_messages(5)
+    kept, dropped = trim_history(messages, 10_000)
+    assert kept == messages
+    assert dropped == 0
+
+def test_trimmed_history_fits_budget():
+    """Test that the rendered, escaped history stays within the budget it was trimmed to"""
+    history = MessageHistory()
+    for i in range(500):
+        content = f"{i}: a <b> & c → naïve 日本語 🙂 " * (i % 7 + 1)
+        history.add_message(Message(content=content, role="user", agent=f"user{i % 3}", chat_id=1))
+    for budget in (50, 1000, 20_000):
+        xml = history.get_thread_history(1, max_tokens=budget)
+        assert '<omitted messages=' in xml
+        assert estimate_tokens(xml) <= budget
@@ -0,0 +1,67 @@
+import pytest
+from botlab.services.cache import ResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.mark.asyncio
+async def test_hit_and_miss(clock):
+    """Test that cached responses are returned and counted"""
+    cache = ResponseCache(clock=clock)
+    assert await cache.get("key") is None
+    await cache.set("key", "response")
+    assert await cache.get("key") == "response"
+    metrics = cache.metrics()
+    assert (metrics['hits'], metrics['misses'], metrics['hit_rate']) == (1, 1, 0.5)
+
+@pytest.mark.asyncio
+async def test_entries_expire(clock):
+    """Test that entries are dropped after their TTL"""
+    cache = ResponseCache(ttl=60, clock=clock)
+    await cache.set("default", "a")
+    await cache.set("short", "b", ttl=10)
+    clock.now += 30
+    assert await cache.get("short") is None
+    assert await cache.get("default") == "a"
+    clock.now += 31
+    assert await cache.get("default") is None
+    assert len(cache) == 0
+
+@pytest.mark.asyncio
+async def test_least_recently_used_evicted(clock):
+    """Test that the memory tier is bounded"""
+    cache = ResponseCache(max_entries=2, clock=clock)
+    await cache.set("a", "1")
+    await cache.set("b", "2")
+    await cache.get("a")
+    await cache.set("c", "3")
+    assert await cache.get("b") is None
+    assert await cache.get("a") == "1"
+    assert await cache.get("c") == "3"
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path, clock):
+    """Test that responses persisted to SQLite are found by a new cache"""
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path, clock=clock)
+    await cache.set("key", "response")
+    await cache.set("stale", "old", ttl=1)
+    cache.close()
+
+    clock.now += 5
+    cache = ResponseCache(path=path, clock=clock)
+    assert await cache.get("key") == "response"
+    assert await cache.get("stale") is None
+    assert cache.metrics()['disk_hits'] == 1
+    # Promoted into memory
+    assert await cache.get("key") == "response"
+    assert cache.metrics()['disk_hits'] == 1
+    cache.close()
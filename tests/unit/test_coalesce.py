@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from botlab.coalesce import BurstCoalescer
+
+async def arrive(coalescer, key, item, delay):
+    await asyncio.sleep(delay)
+    return await coalescer.add(key, item)
+
+@pytest.mark.asyncio
+async def test_burst_is_answered_once():
+    """Test that messages within the window merge into the last one's turn"""
+    coalescer = BurstCoalescer(window=0.05)
+    results = await asyncio.gather(
+        arrive(coalescer, 'k', 'a', 0),
+        arrive(coalescer, 'k', 'b', 0.02),
+        arrive(coalescer, 'k', 'c', 0.04),
+    )
+    assert results == [None, None, ['a', 'b', 'c']]
+    assert coalescer.metrics() == {'waiting': 0, 'turns': 1, 'merged': 2}
+
+@pytest.mark.asyncio
+async def test_messages_apart_are_separate_turns():
+    """Test that a pause longer than the window starts a new turn"""
+    coalescer = BurstCoalescer(window=0.02)
+    results = await asyncio.gather(arrive(coalescer, 'k', 'a', 0), arrive(coalescer, 'k', 'b', 0.05))
+    assert results == [['a'], ['b']]
+
+@pytest.mark.asyncio
+async def test_keys_are_independent():
+    """Test that different senders aren't merged"""
+    coalescer = BurstCoalescer(window=0.03)
+    results = await asyncio.gather(arrive(coalescer, 'alice', 'a', 0), arrive(coalescer, 'bob', 'b', 0.01))
+    assert results == [['a'], ['b']]
+
+@pytest.mark.asyncio
+async def test_max_messages_flushes_immediately():
+    """Test that a full burst is answered without waiting"""
+    coalescer = BurstCoalescer(window=10, max_messages=3)
+    results = await asyncio.wait_for(asyncio.gather(*(arrive(coalescer, 'k', i, 0) for i in range(3))), 1)
+    assert results == [None, None, [0, 1, 2]]
+
+@pytest.mark.asyncio
+async def test_max_wait_bounds_a_long_burst():
+    """Test that a steady stream of messages is cut off after max_wait"""
+    coalescer = BurstCoalescer(window=0.04, max_wait=0.07)
+    results = await asyncio.gather(*(arrive(coalescer, 'k', i, i * 0.03) for i in range(5)))
+    turns = [r for r in results if r is not None]
+    assert len(turns) == 2
+    assert sum(turns, []) == [0, 1, 2, 3, 4]
+
+@pytest.mark.asyncio
+async def test_abandoned_burst_is_forgotten():
+    """Test that cancelling the last waiter doesn't leave the burst behind"""
+    coalescer = BurstCoalescer(window=1)
+    task = asyncio.create_task(coalescer.add('k', 'a'))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert coalescer.metrics()['waiting'] == 0
@@ -1,6 +1,6 @@
 import pytest
 from xml.etree.ElementTree import Element, SubElement
-from botlab.xml_handler import parse_momentum_sequence, MomentumSequence
+from botlab.xml_handler import parse_momentum_sequence, MomentumSequence, load_agent_config
 from botlab.message import Message
 from pathlib import Path
 import xml.etree.ElementTree as ET
@@ -103,3 +103,28 @@ def test_parse_momentum_sequence_with_multiple_messages():
     for msg in result.messages:
         assert msg.agent == "system"  # System agent for momentum sequences
         assert msg.chat_id == 0  # Special chat_id for system messages
+
+def test_parse_service_config():
+    """Test parsing LLM service settings from agent config"""
+    config_path = Path(__file__).parent.parent.parent / "config" / "agents" / "inhibitor.xml"
+    config = load_agent_config(str(config_path))
+    
+    assert config.service.provider == "anthropic"
+    assert config.service.model == "claude-3-haiku-20240307"
+    assert config.service.api_version == "2023-06-01"
+    assert config.service.retry == {'max_attempts': 2.0, 'deadline': 10.0}
+    assert config.service.cache is True
+    assert config.service.cache_ttl == 600.0
+
+def test_parse_service_budget():
+    """Test parsing the context token budget"""
+    config_path = Path(__file__).parent.parent.parent / "config" / "agents" / "claude.xml"
+    config = load_agent_config(str(config_path))
+    assert config.service.context_tokens == 100000
+
+def test_parse_service_fallback():
+    """Test parsing fallback models and SLO settings"""
+    config_path = Path(__file__).parent.parent.parent / "config" / "agents" / "odv.xml"
+    config = load_agent_config(str(config_path))
+    assert config.service.fallback == ["claude-3-5-sonnet-latest"]
+    assert config.service.slo == {'latency_slo': 8.0, 'error_rate_slo': 0.25}
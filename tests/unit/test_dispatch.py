@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import pytest
+import pytest_asyncio
+from botlab.dispatch import ChatDispatcher, DispatcherClosedError, QueueFullError
+
+@pytest_asyncio.fixture
+async def dispatcher():
+    dispatcher = ChatDispatcher(workers=4, max_queue=8)
+    yield dispatcher
+    await dispatcher.close()
+
+def job(log, name, delay=0.0, result=None):
+    async def run():
+        log.append(('start', name))
+        await asyncio.sleep(delay)
+        log.append(('end', name))
+        return result if result is not None else name
+    return run
+
+@pytest.mark.asyncio
+async def test_same_key_runs_in_order(dispatcher):
+    """Test that work for one key never overlaps and keeps submission order"""
+    log = []
+    results = await asyncio.gather(
+        dispatcher.submit('a', job(log, 1, 0.03)),
+        dispatcher.submit('a', job(log, 2, 0.0)),
+        dispatcher.submit('a', job(log, 3, 0.01)),
+    )
+    assert results == [1, 2, 3]
+    assert log == [('start', 1), ('end', 1), ('start', 2), ('end', 2), ('start', 3), ('end', 3)]
+
+@pytest.mark.asyncio
+async def test_different_keys_run_concurrently(dispatcher):
+    """Test that a slow chat doesn't hold up others"""
+    log = []
+    slow = asyncio.create_task(dispatcher.submit('a', job(log, 'slow', 0.2)))
+    await dispatcher.submit('b', job(log, 'fast'))
+    assert ('end', 'slow') not in log
+    await slow
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded():
+    """Test that a key's waiting work is capped"""
+    dispatcher = ChatDispatcher(workers=1, max_queue=2)
+    gate = asyncio.Event()
+    futures = [dispatcher.submit_nowait('a', gate.wait) for _ in range(2)]
+    await asyncio.sleep(0)  # first item starts running, freeing a slot
+    futures.append(dispatcher.submit_nowait('a', gate.wait))
+    with pytest.raises(QueueFullError):
+        dispatcher.submit_nowait('a', gate.wait)
+    dispatcher.submit_nowait('b', gate.wait)
+    assert dispatcher.metrics()['rejected'] == 1
+    gate.set()
+    await asyncio.gather(*futures)
+    await dispatcher.close()
+
+@pytest.mark.asyncio
+async def test_errors_reach_submitter(dispatcher):
+    """Test that exceptions propagate and the key keeps working"""
+    async def fail():
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        await dispatcher.submit('a', fail)
+    assert await dispatcher.submit('a', job([], 'next')) == 'next'
+    assert dispatcher.metrics()['failed'] == 1
+
+@pytest.mark.asyncio
+async def test_cancelled_submitter_drops_or_cancels_work(dispatcher):
+    """Test that cancelling a submitter cancels its running work and skips its queued work"""
+    log = []
+    running = asyncio.create_task(dispatcher.submit('a', job(log, 1, 1.0)))
+    queued = asyncio.create_task(dispatcher.submit('a', job(log, 2)))
+    await asyncio.sleep(0.01)
+    running.cancel()
+    queued.cancel()
+    assert await dispatcher.submit('a', job(log, 3)) == 3
+    assert log == [('start', 1), ('start', 3), ('end', 3)]
+    assert dispatcher.metrics()['dropped'] == 1
+
+@pytest.mark.asyncio
+async def test_work_sees_submitter_context(dispatcher):
+    """Test that context variables set by the submitter are visible to its work"""
+    var = contextvars.ContextVar('var', default=None)
+
+    async def read():
+        return var.get()
+
+    var.set('chat-1')
+    assert await dispatcher.submit('a', read) == 'chat-1'
+
+@pytest.mark.asyncio
+async def test_drain_finishes_queued_work(dispatcher):
+    """Test that draining waits for queued work and then refuses new work"""
+    log = []
+    futures = [dispatcher.submit_nowait('a', job(log, i, 0.01)) for i in range(3)]
+    assert await dispatcher.drain(timeout=1)
+    assert [f.result() for f in futures] == [0, 1, 2]
+    with pytest.raises(DispatcherClosedError):
+        dispatcher.submit_nowait('a', job(log, 4))
+
+@pytest.mark.asyncio
+async def test_drain_gives_up_at_deadline(dispatcher):
+    """Test that draining reports work that didn't finish in time"""
+    future = dispatcher.submit_nowait('a', asyncio.Event().wait)
+    assert not await dispatcher.drain(timeout=0.02)
+    assert not future.done()
+    await dispatcher.close()
+    assert future.cancelled()
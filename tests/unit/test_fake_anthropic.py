@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from botlab.fakes.anthropic import FakeAnthropicConfig, FakeAnthropicServer
+from botlab.services.anthropic import AnthropicService, LLMServiceError
+from botlab.services.retry import RetryPolicy
+
+@pytest_asyncio.fixture
+async def fake():
+    server = FakeAnthropicServer(FakeAnthropicConfig(ttft=0, tokens_per_second=0, seed=1))
+    await server.start()
+    yield server
+    await server.stop()
+
+@pytest_asyncio.fixture
+async def service(fake):
+    service = AnthropicService("key", "2023-06-01", "test-model", retry_policy=RetryPolicy(base_delay=0.01),
+                               api_base=fake.url)
+    yield service
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_echoes_last_user_message(service, fake):
+    """Test that the fake streams back the last user message"""
+    events = [e async for e in service.stream("system", [{'role': 'user', 'content': 'Hello there world'}])]
+    assert ''.join(e.text for e in events if e.type == 'text') == 'Hello there world'
+    assert [e.text for e in events if e.type == 'text'] == ['Hello', ' there', ' world']
+    assert events[-1].stop_reason == 'end_turn'
+    assert service.usage['output_tokens'] == 3
+    assert service.usage['input_tokens'] > 0
+    assert fake.requests[0]['model'] == 'test-model'
+
+@pytest.mark.asyncio
+async def test_canned_reply_truncated_to_max_tokens(service, fake):
+    """Test canned responses and the max_tokens stop reason"""
+    fake.config.mode = 'canned'
+    fake.config.canned_text = 'one two three four'
+    events = [e async for e in service.stream("system", [{'role': 'user', 'content': 'Hi'}], max_tokens=2)]
+    assert ''.join(e.text for e in events if e.type == 'text') == 'one two'
+    assert events[-1].stop_reason == 'max_tokens'
+
+@pytest.mark.asyncio
+async def test_rate_limits_are_retried(service, fake):
+    """Test that injected 429s carry retry-after and are retried"""
+    fake.config.rate_limit_rate = 1.0
+    fake.config.retry_after = 0
+    service.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.01)
+    with pytest.raises(LLMServiceError) as exc_info:
+        async for _ in service.stream("system", [{'role': 'user', 'content': 'Hi'}]):
+            pass
+    assert exc_info.value.status == 429
+    assert fake.stats['rate_limited'] == 2
+
+@pytest.mark.asyncio
+async def test_stream_errors_surface(service, fake):
+    """Test that a midway stream error is raised as a service error"""
+    fake.config.stream_error_rate = 1.0
+    service.retry_policy = RetryPolicy(max_attempts=1)
+    assert await service.call_api("system", [{'role': 'user', 'content': 'a b c d'}]) is None
+    assert fake.stats['stream_errors'] == 1
+
+@pytest.mark.asyncio
+async def test_pacing(service, fake):
+    """Test time to first token and streaming rate"""
+    fake.config.ttft = 0.05
+    fake.config.tokens_per_second = 100
+    start = time.monotonic()
+    response = await service.call_api("system", [{'role': 'user', 'content': 'a b c d e f'}])
+    assert response == 'a b c d e f'
+    assert time.monotonic() - start >= 0.05 + 5 / 100 - 0.01
+
+@pytest.mark.asyncio
+async def test_tracks_concurrency(service, fake):
+    """Test that concurrent requests are counted"""
+    fake.config.ttft = 0.05
+    await asyncio.gather(*(
+        service.call_api("system", [{'role': 'user', 'content': f"message {i}"}]) for i in range(5)
+    ))
+    assert fake.stats['requests'] == 5
+    assert fake.stats['max_in_flight'] == 5
+    assert fake.stats['in_flight'] == 0
+
+def test_derived_services_keep_api_base():
+    """Test that derived services talk to the same endpoint"""
+    service = AnthropicService("key", "2023-06-01", "m", api_base='http://127.0.0.1:1/v1/messages')
+    assert service.derive(model='other').api_base == 'http://127.0.0.1:1/v1/messages'
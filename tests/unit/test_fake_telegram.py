@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock
+from telegram import Bot
+from telegram.error import BadRequest, RetryAfter
+from botlab.fakes.telegram import FakeTelegramConfig, FakeTelegramServer
+from botlab.services.outbound import OutboundScheduler
+from botlab.services.progressive import retry_after_seconds
+from botlab.services.telegram import TelegramService
+from botlab.services.updates import UpdateStore
+
+TOKEN = "123:abc"
+
+@pytest_asyncio.fixture
+async def fake():
+    server = FakeTelegramServer(FakeTelegramConfig(seed=1))
+    await server.start()
+    yield server
+    await server.stop()
+
+@pytest_asyncio.fixture
+async def bot(fake):
+    bot = Bot(TOKEN, base_url=fake.base_url)
+    async with bot:
+        yield bot
+
+@pytest.mark.asyncio
+async def test_get_updates_delivers_pushed_messages(bot, fake):
+    """Test that pushed messages come back from getUpdates until confirmed"""
+    fake.push_message(-100, "Hello", message_thread_id=5, user_id=7)
+    fake.push_message(-100, "World")
+    updates = await bot.get_updates()
+    assert [u.message.text for u in updates] == ["Hello", "World"]
+    assert updates[0].message.message_thread_id == 5
+    assert updates[0].message.from_user.username == "user7"
+    assert await bot.get_updates(offset=updates[-1].update_id + 1) == ()
+    assert fake.stats['updates'] == 2
+
+@pytest.mark.asyncio
+async def test_get_updates_long_polls(bot, fake):
+    """Test that getUpdates waits for the next message"""
+    poll = asyncio.create_task(bot.get_updates(timeout=5))
+    await asyncio.sleep(0.05)
+    assert not poll.done()
+    fake.push_message(-100, "Late")
+    updates = await asyncio.wait_for(poll, 1)
+    assert updates[0].message.text == "Late"
+
+@pytest.mark.asyncio
+async def test_replies_and_edits(bot, fake):
+    """Test that replies are matched to messages and unchanged edits are refused"""
+    update = fake.push_message(-100, "Question?")
+    sent = await bot.send_message(-100, "Answer", reply_to_message_id=update['message']['message_id'])
+    assert sent.message_id == 2
+    edited = await bot.edit_message_text("Longer answer", chat_id=-100, message_id=sent.message_id)
+    assert edited.text == "Longer answer"
+    with pytest.raises(BadRequest, match="not modified"):
+        await bot.edit_message_text("Longer answer", chat_id=-100, message_id=sent.message_id)
+    assert fake.stats['replied'] == 1
+    assert len(fake.reply_latencies) == 1
+
+@pytest.mark.asyncio
+async def test_flood_limits_answer_429(bot, fake):
+    """Test that going over a group chat's limit gets RetryAfter"""
+    for i in range(3):
+        await bot.send_message(-100, f"burst {i}")
+    with pytest.raises(RetryAfter) as exc_info:
+        await bot.send_message(-100, "one too many")
+    assert retry_after_seconds(exc_info.value) >= 1
+    await bot.send_message(5, "other chats are unaffected")
+    assert fake.stats['rate_limited'] == 1
+
+@pytest.mark.asyncio
+async def test_random_workload_is_reproducible():
+    """Test that the generated workload depends only on the seed"""
+    texts = []
+    for _ in range(2):
+        fake = FakeTelegramServer(FakeTelegramConfig(messages=20, message_rate=0, seed=3))
+        await fake.start()
+        await asyncio.sleep(0.01)
+        texts.append([(u['message']['chat']['id'], u['message']['text']) for u in fake._pending])
+        await fake.stop()
+    assert len(texts[0]) == 20
+    assert texts[0] == texts[1]
+
+@pytest.mark.asyncio
+async def test_telegram_service_end_to_end(fake):
+    """Test that TelegramService polls the fake, replies to every message and drains on stop"""
+    async def echo(message):
+        return f"You said: {message.content}"
+
+    service = TelegramService(TOKEN, echo, AsyncMock(), base_url=fake.base_url, drain_timeout=5,
+                              outbound=OutboundScheduler(group_rate=100), updates=UpdateStore())
+    for i in range(6):
+        fake.push_message(-100 - i % 2, f"message {i}", message_thread_id=1)
+    run = asyncio.create_task(service.run())
+    assert await fake.wait_for_replies(6, timeout=5)
+    service.stop()
+    await asyncio.wait_for(run, 5)
+    assert not service.running
+    texts = sorted(params['text'] for method, params in fake.calls if method == 'sendMessage')
+    assert texts == [f"You said: message {i}" for i in range(6)]
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from botlab.generations import GenerationRegistry
+
+@pytest.mark.asyncio
+async def test_newer_message_cancels_older_generation():
+    """Test that only the newest generation in a thread completes"""
+    registry = GenerationRegistry()
+    started = asyncio.Event()
+    delivered = []
+
+    async def handle(text, wait):
+        async with registry.track(1, 7) as generation:
+            started.set()
+            await asyncio.sleep(wait)
+            if not generation.stale:
+                delivered.append(text)
+
+    older = asyncio.create_task(handle("first", 10))
+    await started.wait()
+    newer = asyncio.create_task(handle("second", 0))
+    await asyncio.wait_for(asyncio.gather(older, newer), timeout=1)
+    assert delivered == ["second"]
+    assert not older.cancelled()
+    assert registry.metrics() == {'in_flight': 0, 'superseded': 1, 'cancelled': 1}
+
+@pytest.mark.asyncio
+async def test_other_threads_unaffected():
+    """Test that generations in different threads don't supersede each other"""
+    registry = GenerationRegistry()
+    first = registry.begin(1, 7)
+    second = registry.begin(1, 8)
+    third = registry.begin(2, 7)
+    assert not any(g.stale for g in (first, second, third))
+
+@pytest.mark.asyncio
+async def test_committed_generation_is_only_marked_stale():
+    """Test that a reply already being delivered isn't cancelled"""
+    registry = GenerationRegistry()
+    committed = asyncio.Event()
+
+    async def deliver():
+        async with registry.track(1) as generation:
+            generation.commit()
+            committed.set()
+            await asyncio.sleep(0.01)
+            return generation.stale
+
+    task = asyncio.create_task(deliver())
+    await committed.wait()
+    registry.begin(1)
+    assert await task is True
+    assert registry.metrics()['cancelled'] == 0
+
+@pytest.mark.asyncio
+async def test_external_cancellation_propagates():
+    """Test that cancellations not caused by a newer message aren't swallowed"""
+    registry = GenerationRegistry()
+
+    async def handle():
+        async with registry.track(1):
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(handle())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
 from telegram import Update, Message as TelegramMessage, User, Chat
@@ -5,6 +6,10 @@ from botlab.handlers import MessageHandler
 from botlab.history import MessageHistory
 from botlab.momentum import MomentumManager
 from botlab.message import Message
+from botlab.dispatch import ChatDispatcher
+from botlab.coalesce import BurstCoalescer
+from botlab.services.anthropic import AnthropicService, ServiceUnavailableError, StreamEvent
+from botlab.services.breaker import CircuitBreaker
 
 @pytest.fixture
 def mock_update():
@@ -224,4 +229,175 @@ async def test_allowed_topic_empty(topic_handler, mock_update):
     # Let the LLM service succeed to avoid error handling
     topic_handler.llm_service.call_api = AsyncMock(return_value="Test response")
     response = await topic_handler.process_message(mock_update, [])
-    assert response == "Test response"  # Topic checking isn't implemented yet 
\ No newline at end of file
+    assert response == "Test response"  # Topic checking isn't implemented yet 
+
+@pytest.mark.asyncio
+async def test_process_message_streaming(handler, mock_update):
+    """Test that streaming returns deltas and records the full response"""
+    async def stream(**kwargs):
+        for text in ("Hello", " there"):
+            yield StreamEvent('text', text=text)
+        yield StreamEvent('stop', stop_reason='end_turn')
+
+    handler.llm_service.stream = stream
+    deltas = await handler.process_message(mock_update, [], stream=True)
+    assert [text async for text in deltas] == ["Hello", " there"]
+
+    recorded = handler.history.add_message.call_args[0][0]
+    assert recorded.role == "assistant"
+    assert recorded.content == "Hello there"
+
+@pytest.mark.asyncio
+async def test_service_unavailable_skips_response(handler, mock_update, mock_pipeline_agent):
+    """Test that a 503 from the pipeline drops the message without recovery"""
+    mock_pipeline_agent.process_message.return_value = {'code': '503', 'content': 'LLM service unavailable'}
+    response = await handler.process_message(mock_update, [mock_pipeline_agent])
+    assert response is None
+    handler.llm_service.call_api.assert_not_called()
+    handler.momentum.recover.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_open_breaker_skips_recovery(handler, mock_update):
+    """Test that an open breaker drops the message instead of recovering momentum"""
+    breaker = CircuitBreaker(min_calls=1, open_duration=60)
+    breaker.record(False)
+    handler.llm_service = AnthropicService("key", "2023-06-01", "test-model", breaker=breaker)
+    assert await handler.process_message(mock_update, []) is None
+
+    deltas = await handler.process_message(mock_update, [], stream=True)
+    with pytest.raises(ServiceUnavailableError):
+        [text async for text in deltas]
+    handler.momentum.recover.assert_not_called()
+    await handler.llm_service.close()
+
+@pytest.mark.asyncio
+async def test_history_fetched_within_budget(mock_history, mock_momentum, mock_llm_service, mock_update):
+    """Test that the context budget limits the history passed to the pipeline"""
+    handler = MessageHandler(
+        history=mock_history,
+        momentum=mock_momentum,
+        llm_service=mock_llm_service,
+        agent_username="testbot",
+        context_budget=5000,
+        response_tokens=1000
+    )
+    await handler.process_message(mock_update, [])
+    max_tokens = mock_history.get_thread_history.call_args.kwargs['max_tokens']
+    assert 3900 < max_tokens < 4000
+
+@pytest.mark.asyncio
+async def test_dispatcher_orders_messages_per_chat(mock_momentum, mock_llm_service):
+    """Test that a chat's messages are processed one at a time, each seeing history up to itself"""
+    dispatcher = ChatDispatcher(workers=4)
+    history = MessageHistory()
+    handler = MessageHandler(
+        history=history,
+        momentum=mock_momentum,
+        llm_service=mock_llm_service,
+        agent_username="testbot",
+        dispatcher=dispatcher
+    )
+    active, overlaps, seen = [], [], []
+
+    async def call_api(**kwargs):
+        overlaps.append(len(active))
+        active.append(1)
+        prompt = kwargs['messages'][-1]['content']
+        seen.append([text for text in ("question 0", "question 1", "question 2") if text in prompt])
+        await asyncio.sleep(0.01)
+        active.pop()
+        return f"answer {len(seen) - 1}"
+
+    def update(message_id):
+        update = Mock(spec=Update)
+        update.message = Mock(spec=TelegramMessage)
+        update.message.message_id = message_id
+        update.message.text = f"question {message_id}"
+        update.message.from_user = Mock(username="testuser")
+        update.message.chat_id = 123
+        update.message.message_thread_id = None
+        update.message.reply_to_message = None
+        return update
+
+    mock_llm_service.call_api = call_api
+    responses = await asyncio.gather(*(handler.process_message(update(i), []) for i in range(3)))
+    await dispatcher.close()
+
+    assert responses == ["answer 0", "answer 1", "answer 2"]
+    assert overlaps == [0, 0, 0]
+    assert seen == [["question 0"], ["question 0", "question 1"], ["question 0", "question 1", "question 2"]]
+    assert [m.content for m in history.messages[123][None]] == [
+        "question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"
+    ]
+
+@pytest.mark.asyncio
+async def test_streamed_reply_holds_the_thread(mock_history, mock_momentum, mock_llm_service, mock_update):
+    """Test that a thread's next message waits until the streamed reply before it is consumed or closed"""
+    dispatcher = ChatDispatcher(workers=4)
+    handler = MessageHandler(
+        history=mock_history,
+        momentum=mock_momentum,
+        llm_service=mock_llm_service,
+        agent_username="testbot",
+        dispatcher=dispatcher
+    )
+    started = []
+
+    async def stream(**kwargs):
+        started.append(len(started))
+        for text in ("Hello", " there"):
+            yield StreamEvent('text', text=text)
+
+    mock_llm_service.stream = stream
+    first = await handler.process_message(mock_update, [], stream=True)
+    second = asyncio.create_task(handler.process_message(mock_update, [], stream=True))
+    assert await first.__anext__() == "Hello"
+    await asyncio.sleep(0.02)
+    assert not second.done()
+    await first.aclose()
+    deltas = await asyncio.wait_for(second, 1)
+    assert [text async for text in deltas] == ["Hello", " there"]
+    assert started == [0, 1]
+
+    # A reply that is dropped without being read releases the thread too
+    third = await handler.process_message(mock_update, [], stream=True)
+    del third
+    assert await asyncio.wait_for(handler.process_message(mock_update, []), 1) == "Test response"
+    await dispatcher.close()
+
+@pytest.mark.asyncio
+async def test_rapid_messages_answered_once(mock_history, mock_momentum, mock_llm_service, mock_pipeline_agent):
+    """Test that a burst is recorded message by message but answered in one turn"""
+    handler = MessageHandler(
+        history=mock_history,
+        momentum=mock_momentum,
+        llm_service=mock_llm_service,
+        agent_username="testbot",
+        coalescer=BurstCoalescer(window=0.05)
+    )
+
+    def update(message_id, text):
+        update = Mock(spec=Update)
+        update.message = Mock(spec=TelegramMessage)
+        update.message.message_id = message_id
+        update.message.text = text
+        update.message.from_user = Mock(username="testuser")
+        update.message.chat_id = 123
+        update.message.message_thread_id = None
+        update.message.reply_to_message = None
+        return update
+
+    async def send(message_id, text, delay):
+        await asyncio.sleep(delay)
+        return await handler.process_message(update(message_id, text), [mock_pipeline_agent])
+
+    responses = await asyncio.gather(send(1, "hey", 0), send(2, "quick question", 0.01), send(3, "about X", 0.02))
+    assert responses == [None, None, "Test response"]
+    recorded = [c[0][0] for c in mock_history.add_message.call_args_list]
+    assert [m.content for m in recorded] == ["hey", "quick question", "about X", "Test response"]
+    assert recorded[-1].reply_to_message_id == 3
+    pipeline_input = mock_pipeline_agent.process_message.call_args[0][0]
+    assert pipeline_input['text'] == "hey\nquick question\nabout X"
+    assert pipeline_input['burst'] == {'code': '502', 'messages': 3}
+    mock_llm_service.call_api.assert_called_once()
+    assert "latest 3 messages" in mock_llm_service.call_api.call_args.kwargs['messages'][0]['content']
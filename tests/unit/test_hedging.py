@@ -0,0 +1,28 @@
+import pytest
+from botlab.services.hedging import HedgePolicy
+
+def test_fixed_delay():
+    """Test that a configured delay is used as is"""
+    policy = HedgePolicy(delay=0.5)
+    assert policy.start() == 0.5
+
+def test_rolling_percentile_delay():
+    """Test that without a fixed delay the rolling p95 TTFT is used"""
+    policy = HedgePolicy(min_samples=20)
+    for i in range(19):
+        policy.observe(0.1)
+    assert policy.start() is None
+    for i in range(81):
+        policy.observe(0.1 + i / 100)
+    assert policy.start() == pytest.approx(0.86)
+
+def test_budget_limits_hedges():
+    """Test that hedges are capped at the budgeted share of requests"""
+    policy = HedgePolicy(delay=0.1, budget=0.1, max_burst=1.0)
+    hedged = 0
+    for _ in range(100):
+        policy.start()
+        hedged += policy.try_hedge()
+    assert hedged == 10
+    assert policy.metrics()['hedge_rate'] == 0.1
+    assert policy.metrics()['denied'] == 90
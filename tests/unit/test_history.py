@@ -144,4 +144,21 @@ def test_thread_isolation(message_history):
     # Check thread 2
     history2 = message_history.get_thread_history(123, 2)
     assert "Thread 2 Message" in history2
-    assert "Thread 1 Message" not in history2 
\ No newline at end of file
+    assert "Thread 1 Message" not in history2 
+
+def test_thread_history_token_budget(message_history):
+    """Test that a token budget keeps the newest messages and notes the rest"""
+    for i in range(200):
+        message_history.add_message(Message(
+            content=f"Message number {i} " + "filler " * 30,
+            role="user",
+            agent="testuser",
+            chat_id=123
+        ))
+    full = message_history.get_thread_history(123)
+    trimmed = message_history.get_thread_history(123, max_tokens=1000)
+    assert len(trimmed) < len(full)
+    assert "Message number 199 " in trimmed
+    assert "Message number 0 " not in trimmed
+    assert '<omitted messages="' in trimmed
+    assert message_history.get_thread_history(123, max_tokens=10**6) == full
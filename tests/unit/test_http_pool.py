@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+from botlab.services.http import HTTPPool
+from botlab.services.anthropic import AnthropicService
+from botlab.bot import Bot
+from botlab.xml_handler import AgentConfig
+
+@pytest.mark.asyncio
+async def test_session_created_lazily():
+    """Test that no session exists until first use"""
+    pool = HTTPPool()
+    assert pool.closed
+    session = await pool.get_session()
+    assert not pool.closed
+    assert await pool.get_session() is session
+    await pool.close()
+    assert pool.closed
+
+@pytest.mark.asyncio
+async def test_connector_limits():
+    """Test that pool settings are applied to the connector"""
+    pool = HTTPPool(limit=10, limit_per_host=3, keepalive_timeout=5.0)
+    session = await pool.get_session()
+    assert session.connector.limit == 10
+    assert session.connector.limit_per_host == 3
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_services_share_pool():
+    """Test that services given the same pool share one session"""
+    pool = HTTPPool()
+    speaker = AnthropicService("key", "2023-06-01", "speaker-model", pool=pool)
+    inhibitor = AnthropicService("key", "2023-06-01", "inhibitor-model", pool=pool)
+    assert await speaker.pool.get_session() is await inhibitor.pool.get_session()
+
+    # Closing a service that doesn't own the pool leaves it open
+    await speaker.close()
+    assert not pool.closed
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_service_owns_default_pool():
+    """Test that a service without a shared pool closes its own"""
+    service = AnthropicService("key", "2023-06-01", "model")
+    await service.pool.get_session()
+    await service.close()
+    assert service.pool.closed
+
+def test_bot_stop_closes_pool():
+    """Test that stopping the bot closes the shared pool"""
+    config = AgentConfig(name="test_bot", type="filter", category="foundation", version="1.0")
+    with patch('botlab.bot.load_agent_config', return_value=config):
+        bot = Bot(config_path="test_config.xml", username="test_bot")
+    assert bot.llm_service.pool is bot.http_pool
+    bot.stop()
+    assert bot.http_pool.closed
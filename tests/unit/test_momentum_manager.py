@@ -305,4 +305,18 @@ async def test_temperature_validation(momentum_manager):
         messages=[Message(role="system", content="Test", agent="system", chat_id=0, message_id=1)]
     )
     assert sequence.temperature == 0.7  # Default temperature
- 
\ No newline at end of file
+ 
+@pytest.mark.asyncio
+async def test_protocol_prefix_comes_first(momentum_manager, mock_llm_service):
+    """Test that protocol content leads the prompt and sequences aren't modified"""
+    history_xml = "<history><message>test</message></history>"
+    await momentum_manager.get_response(history_xml)
+    await momentum_manager.get_response(history_xml)
+
+    first = mock_llm_service.call_api.call_args_list[0].kwargs['messages']
+    second = mock_llm_service.call_api.call_args_list[1].kwargs['messages']
+    assert first[0].role == "system"
+    assert first[0].content.startswith("\n".join(momentum_manager.protocols["test_proto"].get_content()))
+    assert first[0].content.endswith("Test message")
+    assert [m.content for m in first] == [m.content for m in second]
+    assert momentum_manager._get_sequence("init")[0].content == "Test message"
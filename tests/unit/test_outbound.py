@@ -0,0 +1,191 @@
+import asyncio
+import time
+from datetime import timedelta
+import pytest
+from unittest.mock import AsyncMock, Mock
+from telegram.error import RetryAfter
+from botlab.services.outbound import OutboundScheduler, TokenBucket, PRIORITY_BACKGROUND, PRIORITY_REPLY
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def bot():
+    bot = Mock()
+    bot.sent = []
+
+    async def send_message(**kwargs):
+        bot.sent.append(kwargs['text'])
+        return Mock(message_id=len(bot.sent))
+
+    bot.send_message = AsyncMock(side_effect=send_message)
+    bot.edit_message_text = AsyncMock(return_value=True)
+    return bot
+
+def test_token_bucket_refills():
+    """Test that the bucket allows bursts and then its rate"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=2, clock=clock)
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.now = 0.5
+    assert bucket.wait_time() == 0.0
+
+@pytest.mark.asyncio
+async def test_replies_jump_the_queue(bot):
+    """Test that direct replies go before background messages"""
+    scheduler = OutboundScheduler(bot)
+    await asyncio.gather(
+        scheduler.send_message(chat_id=1, text='background', priority=PRIORITY_BACKGROUND),
+        scheduler.send_message(chat_id=1, text='reply', priority=PRIORITY_REPLY),
+    )
+    assert bot.sent == ['reply', 'background']
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_chat_rate_is_respected(bot):
+    """Test that a chat's bucket paces it without slowing other chats"""
+    scheduler = OutboundScheduler(bot, group_rate=20.0, chat_burst=1)
+    start = time.monotonic()
+    group = asyncio.gather(*(scheduler.send_message(chat_id=-100, text=f'g{i}') for i in range(3)))
+    await scheduler.send_message(chat_id=5, text='private')
+    assert time.monotonic() - start < 0.04
+    await group
+    assert time.monotonic() - start >= 0.09
+    assert bot.sent.index('private') < bot.sent.index('g2')
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honoured(bot):
+    """Test that a 429 blocks the chat and the call is retried"""
+    bot.send_message = AsyncMock(side_effect=[RetryAfter(timedelta(milliseconds=50)), Mock(message_id=9)])
+    scheduler = OutboundScheduler(bot)
+    start = time.monotonic()
+    message = await scheduler.send_message(chat_id=1, text='hi')
+    assert message.message_id == 9
+    assert time.monotonic() - start >= 0.05
+    assert scheduler.metrics()['rate_limited'] == 1
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(bot):
+    """Test that persistent rate limiting fails the call"""
+    bot.send_message = AsyncMock(side_effect=RetryAfter(timedelta(milliseconds=1)))
+    scheduler = OutboundScheduler(bot, max_retries=2)
+    with pytest.raises(RetryAfter):
+        await scheduler.send_message(chat_id=1, text='hi')
+    assert bot.send_message.call_count == 3
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_pending_edits_are_coalesced(bot):
+    """Test that queued edits to one message collapse into the latest text"""
+    scheduler = OutboundScheduler(bot, private_rate=20.0, chat_burst=1)
+    await scheduler.send_message(chat_id=1, text='v0')
+    results = await asyncio.gather(*(
+        scheduler.edit_message_text(text=f'v{i}', chat_id=1, message_id=1) for i in range(1, 4)
+    ))
+    assert results == [True, True, True]
+    assert bot.edit_message_text.call_count == 1
+    assert bot.edit_message_text.call_args.kwargs['text'] == 'v3'
+    assert scheduler.metrics()['coalesced'] == 2
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_cancelled_send_is_dropped(bot):
+    """Test that a send whose caller gave up is never delivered"""
+    scheduler = OutboundScheduler(bot, private_rate=20.0, chat_burst=1)
+    await scheduler.send_message(chat_id=1, text='first')
+    pending = asyncio.create_task(scheduler.send_message(chat_id=1, text='stale'))
+    await asyncio.sleep(0)
+    pending.cancel()
+    await scheduler.send_message(chat_id=1, text='next')
+    assert bot.sent == ['first', 'next']
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_telegram_replies_go_through_scheduler(bot):
+    """Test that TelegramService sends replies through its scheduler"""
+    from botlab.services.telegram import TelegramService
+
+    scheduler = OutboundScheduler(bot)
+    service = TelegramService("123:abc", AsyncMock(return_value="hello"), AsyncMock(), outbound=scheduler)
+    update = Mock()
+    update.message.text = "hi"
+    update.message.chat_id = -100
+    update.message.message_thread_id = 3
+    update.message.message_id = 7
+    update.message.reply_to_message = None
+    await service.handle_message(update, Mock())
+    assert bot.sent == ['hello']
+    assert bot.send_message.call_args.kwargs['reply_to_message_id'] == 7
+    assert bot.send_message.call_args.kwargs['message_thread_id'] == 3
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_long_messages_are_sent_in_parts(bot):
+    """Test that an oversized message goes out as ordered parts, replying with the first"""
+    from botlab.services.telegram import TelegramService
+    from botlab.splitter import MAX_MESSAGE_LENGTH
+
+    scheduler = OutboundScheduler(bot)
+    service = TelegramService("123:abc", AsyncMock(), AsyncMock(), outbound=scheduler)
+    text = "\n\n".join(f"Paragraph {i}. " + "text " * 300 for i in range(5))
+    first = await service.send_message(chat_id=1, text=text, reply_to_message_id=7)
+    assert first.message_id == 1
+    assert [part[:12] for part in bot.sent] == ["Paragraph 0.", "Paragraph 2.", "Paragraph 4."]
+    assert all(len(part) <= MAX_MESSAGE_LENGTH for part in bot.sent)
+    replies = [c.kwargs['reply_to_message_id'] for c in bot.send_message.call_args_list]
+    assert replies == [7, None, None]
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_queued_sends(bot):
+    """Test that draining lets paced sends go out before closing"""
+    scheduler = OutboundScheduler(bot, group_rate=20.0, chat_burst=1)
+    sends = [asyncio.ensure_future(scheduler.send_message(chat_id=-100, text=f'g{i}')) for i in range(3)]
+    await asyncio.sleep(0)
+    assert await scheduler.drain(timeout=1)
+    assert bot.sent == ['g0', 'g1', 'g2']
+    assert all(send.done() for send in sends)
+    await scheduler.close()
+
+@pytest.mark.asyncio
+async def test_drain_gives_up_at_deadline(bot):
+    """Test that draining reports sends still waiting at the deadline"""
+    scheduler = OutboundScheduler(bot, group_rate=0.1, chat_burst=1)
+    sends = [asyncio.ensure_future(scheduler.send_message(chat_id=-100, text=f'g{i}')) for i in range(2)]
+    await asyncio.sleep(0)
+    assert not await scheduler.drain(timeout=0.1)
+    assert bot.sent == ['g0']
+    await scheduler.close()
+    await asyncio.gather(*sends, return_exceptions=True)
+    assert sends[1].cancelled()
+
+@pytest.mark.asyncio
+async def test_telegram_drain_lets_replies_finish(bot):
+    """Test that TelegramService stops ingestion before waiting for handlers and sends"""
+    from botlab.services.telegram import TelegramService
+
+    scheduler = OutboundScheduler(bot)
+    service = TelegramService("123:abc", AsyncMock(), AsyncMock(), outbound=scheduler)
+    order = []
+    service.app = Mock(running=True)
+    service.app.updater = Mock(running=True)
+    service.app.updater.stop = AsyncMock(side_effect=lambda: order.append('updater'))
+
+    async def stop():
+        # An in-flight handler sends its reply while the application stops
+        order.append('app')
+        await scheduler.send_message(chat_id=1, text='reply')
+
+    service.app.stop = stop
+    assert await service.drain(timeout=1)
+    assert order == ['updater', 'app']
+    assert bot.sent == ['reply']
+    assert scheduler.metrics()['queued'] == 0
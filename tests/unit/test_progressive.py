@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+from telegram.error import RetryAfter
+from botlab.services.progressive import ProgressiveReply, MAX_MESSAGE_LENGTH
+from botlab.services.outbound import OutboundScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def bot():
+    bot = Mock()
+    bot.send_message = AsyncMock(return_value=Mock(message_id=42))
+    bot.edit_message_text = AsyncMock()
+    return bot
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def reply(bot, clock):
+    return ProgressiveReply(bot, chat_id=1, message_thread_id=7, edit_interval=1.5, clock=clock)
+
+@pytest.mark.asyncio
+async def test_sends_after_first_sentence(reply, bot):
+    """Test that nothing is sent until the first sentence is complete"""
+    await reply.feed("Hello")
+    bot.send_message.assert_not_called()
+    await reply.feed(" there. More")
+    bot.send_message.assert_called_once()
+    assert bot.send_message.call_args.kwargs['text'] == "Hello there. More"
+    assert bot.send_message.call_args.kwargs['message_thread_id'] == 7
+
+@pytest.mark.asyncio
+async def test_sends_after_interval_without_sentence(reply, bot, clock):
+    """Test that a long first sentence is still sent after the interval"""
+    await reply.feed("a long opening clause")
+    clock.now = 2.0
+    await reply.feed(" keeps going")
+    bot.send_message.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_edits_are_throttled(reply, bot, clock):
+    """Test that edits happen at most once per interval"""
+    await reply.feed("First. ")
+    for i in range(10):
+        clock.now += 0.1
+        await reply.feed(f"word{i} ")
+    bot.edit_message_text.assert_not_called()
+
+    clock.now = 1.6
+    await reply.feed("more ")
+    assert bot.edit_message_text.call_count == 1
+    assert bot.edit_message_text.call_args.kwargs['message_id'] == 42
+
+@pytest.mark.asyncio
+async def test_finish_writes_complete_text(reply, bot, clock, monkeypatch):
+    """Test that the final text is always written, waiting out the interval"""
+    sleep = AsyncMock()
+    monkeypatch.setattr('botlab.services.progressive.asyncio.sleep', sleep)
+    async def deltas():
+        for text in ("One. ", "Two. ", "Three."):
+            yield text
+
+    clock.now = 10.0
+    text = await reply.run(deltas())
+    assert text == "One. Two. Three."
+    assert bot.edit_message_text.call_args.kwargs['text'] == "One. Two. Three."
+    sleep.assert_awaited_once_with(1.5)
+
+@pytest.mark.asyncio
+async def test_short_reply_sent_once(reply, bot):
+    """Test that a reply without sentence end is sent once at finish"""
+    await reply.feed("ok")
+    await reply.finish()
+    bot.send_message.assert_called_once()
+    bot.edit_message_text.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_retry_after_defers_edit(reply, bot, clock):
+    """Test that a flood-control response pushes back the next edit"""
+    await reply.feed("First. ")
+    clock.now = 2.0
+    bot.edit_message_text.side_effect = RetryAfter(5)
+    await reply.feed("second")
+    bot.edit_message_text.side_effect = None
+    clock.now = 4.0
+    await reply.feed(" third")
+    assert bot.edit_message_text.call_count == 1
+    clock.now = 7.5
+    await reply.feed(" fourth")
+    assert bot.edit_message_text.call_count == 2
+
+@pytest.mark.asyncio
+async def test_text_limited_to_message_length(reply, bot):
+    """Test that the visible text never exceeds Telegram's limit"""
+    await reply.feed("x" * (MAX_MESSAGE_LENGTH + 100) + ". ")
+    first, second = bot.send_message.call_args_list
+    assert len(first.kwargs['text']) == MAX_MESSAGE_LENGTH
+    assert second.kwargs['text'] == "x" * 100 + ". "
+
+@pytest.mark.asyncio
+async def test_long_reply_continues_in_new_messages(bot, clock, monkeypatch):
+    """Test that each full part is finalized and the stream continues in a new message"""
+    monkeypatch.setattr('botlab.services.progressive.asyncio.sleep', AsyncMock())
+    reply = ProgressiveReply(bot, chat_id=1, reply_to_message_id=5, clock=clock)
+    paragraph = "word " * 399 + "end.\n\n"
+    await reply.feed("Start. ")
+    clock.now = 2.0
+    for _ in range(3):
+        await reply.feed(paragraph)
+    await reply.finish()
+    first, second = bot.send_message.call_args_list
+    assert first.kwargs['reply_to_message_id'] == 5
+    assert second.kwargs['reply_to_message_id'] is None
+    finalized = bot.edit_message_text.call_args.kwargs['text']
+    assert finalized == "Start. " + (paragraph * 2).strip()
+    assert second.kwargs['text'] == paragraph
+    assert len(reply.messages) == 2
+
+@pytest.mark.asyncio
+async def test_on_send_called_once(bot, clock):
+    """Test that the send hook fires when the first message goes out"""
+    sent = Mock()
+    reply = ProgressiveReply(bot, chat_id=1, clock=clock, on_send=sent)
+    await reply.feed("First. ")
+    clock.now = 2.0
+    await reply.feed("Second.")
+    sent.assert_called_once_with()
+
+@pytest.mark.asyncio
+async def test_slow_edits_are_merged_by_the_scheduler(bot, clock):
+    """Test that the stream doesn't wait on edits and queued ones take the newest text"""
+    release = asyncio.Event()
+
+    async def edit_message_text(**kwargs):
+        await release.wait()
+
+    bot.edit_message_text = AsyncMock(side_effect=edit_message_text)
+    outbound = OutboundScheduler(bot, private_rate=100, chat_burst=100)
+    reply = ProgressiveReply(outbound, chat_id=1, edit_interval=1.5, clock=clock)
+    await reply.feed("First. ")
+    for i in range(3):
+        clock.now += 2.0
+        await asyncio.wait_for(reply.feed(f"part{i} "), 1)
+    await asyncio.sleep(0.01)
+    # One edit in flight, the next two merged while queued
+    assert bot.edit_message_text.call_count == 1
+    assert outbound.metrics()['coalesced'] == 1
+
+    release.set()
+    await reply.finish()
+    texts = [c.kwargs['text'] for c in bot.edit_message_text.call_args_list]
+    assert texts == ["First. part0 ", "First. part0 part1 part2 "]
+    await outbound.close()
@@ -0,0 +1,46 @@
+import asyncio
+import aiohttp
+from botlab.services.retry import RetryPolicy, parse_retry_after
+from botlab.services.anthropic import LLMServiceError
+
+def test_parse_retry_after_seconds():
+    """Test delta-seconds retry-after values"""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("0.5") == 0.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+
+def test_parse_retry_after_http_date():
+    """Test HTTP-date retry-after values in the past clamp to zero"""
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_backoff_full_jitter():
+    """Test that backoff is uniformly drawn below the exponential cap"""
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    for attempt in range(6):
+        cap = min(5.0, 2 ** attempt)
+        assert all(0 <= policy.backoff(attempt) <= cap for _ in range(50))
+
+def test_backoff_honours_retry_after():
+    """Test that retry-after is a lower bound on the delay"""
+    policy = RetryPolicy(base_delay=0.1)
+    assert policy.backoff(0, retry_after=7.0) >= 7.0
+
+def test_retryable_classification():
+    """Test retryable versus fatal errors"""
+    policy = RetryPolicy()
+    assert policy.is_retryable(LLMServiceError("overloaded", status=529))
+    assert policy.is_retryable(LLMServiceError("rate limited", status=429))
+    assert policy.is_retryable(aiohttp.ClientConnectionError())
+    assert policy.is_retryable(asyncio.TimeoutError())
+    assert not policy.is_retryable(LLMServiceError("bad request", status=400))
+    assert not policy.is_retryable(LLMServiceError("unauthorized", status=401))
+    assert not policy.is_retryable(ValueError())
+
+def test_next_delay_limits():
+    """Test that attempts and deadline bound retries"""
+    policy = RetryPolicy(max_attempts=3, deadline=10.0, base_delay=0.1)
+    error = LLMServiceError("overloaded", status=529)
+    assert policy.next_delay(error, attempt=0, elapsed=0) is not None
+    assert policy.next_delay(error, attempt=2, elapsed=0) is None
+    assert policy.next_delay(LLMServiceError("late", status=529, retry_after=5.0), attempt=0, elapsed=8.0) is None
@@ -0,0 +1,58 @@
+import pytest
+from botlab.services.router import ModelRouter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def router(clock):
+    return ModelRouter(["opus", "sonnet", "haiku"], latency_slo=5.0, error_rate_slo=0.5,
+                       min_calls=4, cooldown=60, clock=clock)
+
+def test_routes_to_primary_while_healthy(router):
+    """Test that a healthy primary gets all traffic"""
+    for _ in range(10):
+        model = router.select()
+        router.record(model, True, 1.0)
+    assert model == "opus"
+    assert router.metrics()['fallbacks'] == 0
+
+def test_latency_breach_falls_back(router):
+    """Test that slow first tokens move traffic to the fallback"""
+    for _ in range(4):
+        router.record("opus", True, 9.0)
+    assert router.select() == "sonnet"
+    metrics = router.metrics()
+    assert metrics['active'] == "sonnet"
+    assert metrics['demoted'] == ["opus"]
+    assert metrics['demotions']['opus'] == 1
+    assert metrics['fallbacks'] == 1
+
+def test_error_rate_breach_falls_back(router):
+    """Test that failing calls move traffic to the fallback"""
+    for success in (True, False, False, False):
+        router.record("opus", success, 1.0)
+    assert router.select() == "sonnet"
+
+def test_primary_recovers_after_cooldown(router, clock):
+    """Test that the primary is retried once its cooldown has passed"""
+    for _ in range(4):
+        router.record("opus", False)
+    assert router.select() == "sonnet"
+    clock.now = 61
+    assert router.select() == "opus"
+
+def test_last_model_is_never_demoted(router):
+    """Test that requests still go somewhere when every model breaches"""
+    for model in ("opus", "sonnet", "haiku"):
+        for _ in range(4):
+            router.record(model, False)
+    assert router.select() == "haiku"
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from botlab.services.singleflight import SingleFlight, request_key
+
+def test_request_key_is_canonical():
+    """Test that key order doesn't change the key but content does"""
+    assert request_key({'a': 1, 'b': [1, 2]}) == request_key({'b': [1, 2], 'a': 1})
+    assert request_key({'a': 1}) != request_key({'a': 2})
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_call():
+    """Test that callers with the same key share one call"""
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    tasks = [asyncio.create_task(flight.do("key", fn)) for _ in range(3)]
+    other = asyncio.create_task(flight.do("other", fn))
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks, other) == ["result"] * 4
+    assert calls == 2
+    assert flight.metrics() == {'in_flight': 0, 'calls': 2, 'coalesced': 2}
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    """Test that a failure reaches every waiter and the next call starts fresh"""
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def succeed():
+        return "ok"
+
+    assert await flight.do("key", succeed) == "ok"
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_call():
+    """Test that the shared call survives while someone is still waiting"""
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fn():
+        await release.wait()
+        return "result"
+
+    first = asyncio.create_task(flight.do("key", fn))
+    second = asyncio.create_task(flight.do("key", fn))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "result"
+
+@pytest.mark.asyncio
+async def test_last_waiter_cancels_call():
+    """Test that the call is cancelled once nobody waits for it"""
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def fn():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    task = asyncio.create_task(flight.do("key", fn))
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert flight.in_flight == 0
@@ -0,0 +1,56 @@
+from botlab.splitter import StreamSplitter, split_message, text_length, MAX_MESSAGE_LENGTH
+
+def test_short_text_is_one_part():
+    """Test that text within the limit is left alone"""
+    assert split_message("Hello there.") == ["Hello there."]
+
+def test_prefers_paragraph_breaks():
+    """Test that parts end at the last paragraph break that fits"""
+    text = "a" * 60 + "\n\n" + "b" * 30 + ". " + "c" * 30
+    assert split_message(text, limit=100) == ["a" * 60, "b" * 30 + ". " + "c" * 30]
+
+def test_falls_back_to_sentences_then_words():
+    """Test sentence and word boundaries when there is no line break"""
+    sentences = "One sentence here. " * 10
+    parts = split_message(sentences, limit=100)
+    assert all(part.endswith("here.") for part in parts)
+    assert " ".join(parts) == sentences.strip()
+
+    words = "word " * 50
+    assert all(len(part) <= 40 and not part.endswith(" ") for part in split_message(words, limit=40))
+
+def test_hard_cut_without_boundaries():
+    """Test that unbroken text is cut at the limit"""
+    parts = split_message("x" * 250, limit=100)
+    assert [len(p) for p in parts] == [100, 100, 50]
+
+def test_code_fences_are_closed_and_reopened():
+    """Test that a part ending inside a code block stays valid markdown"""
+    code = "\n".join(f"line_{i} = {i}" for i in range(30))
+    text = "Here is code:\n```python\n" + code + "\n```\nDone."
+    parts = split_message(text, limit=120)
+    assert len(parts) > 2
+    for part in parts:
+        assert len(part) <= 120
+        assert part.count("```") % 2 == 0
+    assert parts[1].startswith("```python\n")
+    assert parts[-1].endswith("```\nDone.")
+
+def test_length_counts_utf16_units():
+    """Test that astral characters count double, as Telegram counts them"""
+    assert text_length("🙂a") == 3
+    parts = split_message("🙂" * 3000)
+    assert all(text_length(part) <= MAX_MESSAGE_LENGTH for part in parts)
+    assert "".join(parts) == "🙂" * 3000
+
+def test_stream_splitter_releases_full_parts():
+    """Test that streamed text is released part by part as it fills"""
+    splitter = StreamSplitter(limit=50)
+    released = []
+    for word in ["alpha "] * 30:
+        released += splitter.feed(word)
+        assert text_length(splitter.pending) <= 50
+    assert len(released) == 3
+    rest = splitter.finish()
+    assert " ".join(p.strip() for p in released + rest).split() == ["alpha"] * 30
+    assert splitter.finish() == []
@@ -0,0 +1,79 @@
+import pytest
+from botlab.services.sse import SSEDecoder
+from botlab.services.anthropic import AnthropicService
+
+STREAM = (
+    'event: message_start\ndata: {"type": "message_start"}\n\n'
+    'event: ping\ndata: {"type": "ping"}\n\n'
+    'event: content_block_delta\ndata: {"type": "content_block_delta", "delta": {"text": "Héllo "}}\n\n'
+    'event: content_block_delta\ndata: {"type": "content_block_delta", "delta": {"text": "日本 🙂"}}\n\n'
+    'event: message_stop\ndata: {"type": "message_stop"}\n\n'
+).encode('utf-8')
+
+def feed_all(decoder, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    return events
+
+def test_decode_whole_stream():
+    """Test decoding a stream delivered in one chunk"""
+    events = feed_all(SSEDecoder(), [STREAM])
+    assert [e.event for e in events] == [
+        'message_start', 'ping', 'content_block_delta', 'content_block_delta', 'message_stop'
+    ]
+    assert events[2].json()['delta']['text'] == "Héllo "
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_chunk_boundaries(size):
+    """Test that splitting at any byte offset, including mid-codepoint, is lossless"""
+    chunks = [STREAM[i:i + size] for i in range(0, len(STREAM), size)]
+    events = feed_all(SSEDecoder(), chunks)
+    texts = [e.json()['delta']['text'] for e in events if e.event == 'content_block_delta']
+    assert texts == ["Héllo ", "日本 🙂"]
+
+def test_event_type_filter():
+    """Test that unwanted event types are skipped"""
+    events = feed_all(SSEDecoder(event_types={'content_block_delta'}), [STREAM])
+    assert [e.event for e in events] == ['content_block_delta', 'content_block_delta']
+
+def test_multiline_data_and_comments():
+    """Test multi-line data fields, comments and unnamed events"""
+    body = b': keepalive\ndata: first\ndata:second\n\nevent: x\nid: 1\ndata: y\n\n'
+    events = feed_all(SSEDecoder(), [body])
+    assert events[0].event == 'message'
+    assert events[0].data == 'first\nsecond'
+    assert events[1].event == 'x'
+    assert events[1].data == 'y'
+
+def test_crlf_split_across_chunks():
+    """Test CRLF line endings split between chunks"""
+    events = feed_all(SSEDecoder(), [b'data: a\r', b'\ndata: b\r\n\r', b'\n'])
+    assert len(events) == 1
+    assert events[0].data == 'a\nb'
+
+def test_unterminated_final_event():
+    """Test that a final event without trailing blank line is still emitted"""
+    events = feed_all(SSEDecoder(), [b'event: e\ndata: tail'])
+    assert events[0].data == 'tail'
+
+class _Content:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+class _Response:
+    def __init__(self, chunks):
+        self.content = _Content(chunks)
+
+@pytest.mark.asyncio
+async def test_iter_stream_collects_text():
+    """Test that the service assembles text deltas from raw chunks"""
+    service = AnthropicService("key", "2023-06-01", "model")
+    chunks = [STREAM[i:i + 5] for i in range(0, len(STREAM), 5)]
+    events = [event async for event in service._iter_stream(_Response(chunks))]
+    assert ''.join(e.text for e in events if e.type == 'text') == "Héllo 日本 🙂"
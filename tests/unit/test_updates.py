@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from telegram.ext import ApplicationHandlerStop
+from botlab.services.updates import UpdateStore
+
+def make_update(update_id, chat_id=1, message_id=None):
+    update = Mock(update_id=update_id)
+    if message_id is None:
+        update.message = None
+    else:
+        update.message = Mock(chat_id=chat_id, message_id=message_id)
+    return update
+
+def test_duplicate_messages_are_rejected():
+    """Test that the same message is handled once"""
+    store = UpdateStore()
+    assert store.check(make_update(1, message_id=10))
+    assert not store.check(make_update(2, message_id=10))
+    assert store.check(make_update(3, chat_id=2, message_id=10))
+    assert store.metrics()['duplicates'] == 1
+
+def test_out_of_order_updates_within_a_run_are_kept():
+    """Test that concurrently handled updates aren't mistaken for replays"""
+    store = UpdateStore()
+    assert store.check(make_update(5, message_id=50))
+    assert store.check(make_update(4, message_id=40))
+    assert store.last_update_id == 5
+
+def test_seen_set_is_bounded():
+    """Test that only the most recent messages are remembered"""
+    store = UpdateStore(max_seen=2)
+    for i in range(3):
+        store.check(make_update(i + 1, message_id=i))
+    assert store.metrics()['seen'] == 2
+    assert store.check(make_update(10, message_id=0))
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(tmp_path):
+    """Test that replays after a restart are dropped"""
+    path = str(tmp_path / 'updates.db')
+    store = UpdateStore(path=path)
+    assert await store.record(make_update(7, message_id=70))
+    assert await store.record(make_update(8))
+    store.close()
+
+    restarted = UpdateStore(path=path)
+    assert restarted.last_update_id == 8
+    assert not await restarted.record(make_update(7, message_id=70))
+    assert not await restarted.record(make_update(8))
+    # Redelivered under a new update id, still the same message
+    assert not await restarted.record(make_update(9, message_id=70))
+    assert await restarted.record(make_update(10, message_id=71))
+    restarted.close()
+
+@pytest.mark.asyncio
+async def test_stale_floor_allows_restarted_update_ids(tmp_path):
+    """Test that lower update ids are accepted once Telegram may have restarted the sequence"""
+    path = str(tmp_path / 'updates.db')
+    now = [1000.0]
+    store = UpdateStore(path=path, floor_ttl=60, clock=lambda: now[0])
+    assert await store.record(make_update(500, message_id=70))
+    store.close()
+
+    now[0] += 30
+    restarted = UpdateStore(path=path, floor_ttl=60, clock=lambda: now[0])
+    assert not await restarted.record(make_update(400, message_id=71))
+    # After floor_ttl without updates ids may start over lower
+    now[0] += 61
+    assert await restarted.record(make_update(3, message_id=72))
+    assert restarted.last_update_id == 3
+    # Already seen messages are still dropped
+    assert not await restarted.record(make_update(4, message_id=70))
+    restarted.close()
+
+    now[0] += 10
+    again = UpdateStore(path=path, floor_ttl=60, clock=lambda: now[0])
+    assert again.replay_floor == 3
+    assert not await again.record(make_update(3, message_id=72))
+    assert await again.record(make_update(5, message_id=73))
+    again.close()
+
+@pytest.mark.asyncio
+async def test_replayed_updates_stop_handling():
+    """Test that TelegramService stops replayed updates before other handlers"""
+    from botlab.services.telegram import TelegramService
+
+    service = TelegramService("123:abc", AsyncMock(), AsyncMock(), updates=UpdateStore())
+    update = make_update(1, message_id=10)
+    await service.drop_replayed(update, Mock())
+    with pytest.raises(ApplicationHandlerStop):
+        await service.drop_replayed(update, Mock())
+    handlers = service.build_app().handlers
+    assert min(handlers) == -1
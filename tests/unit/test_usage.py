@@ -0,0 +1,60 @@
+import asyncio
+import json
+import pytest
+from botlab.services.usage import UsageTracker, usage_context, current_conversation
+
+def test_usage_context_attributes_calls():
+    """Test that usage is attributed to the enclosing conversation"""
+    tracker = UsageTracker(flush_interval=None)
+    with usage_context(1, 7):
+        assert current_conversation() == (1, 7)
+        tracker.record("sonnet", {'input_tokens': 100, 'output_tokens': 20}, agent="Speaker")
+        tracker.record("haiku", {'input_tokens': 50, 'output_tokens': 5}, agent="Observer")
+    with usage_context(2):
+        tracker.record("sonnet", {'input_tokens': 10, 'output_tokens': 2}, agent="Speaker")
+    assert current_conversation() == (None, None)
+
+    assert tracker.totals(chat_id=1)['input_tokens'] == 150
+    assert tracker.totals(agent="Speaker")['output_tokens'] == 22
+    assert tracker.totals(model="haiku", thread_id=7)['requests'] == 1
+    assert tracker.totals()['requests'] == 3
+
+def test_cost_estimate():
+    """Test cost estimates including prompt cache pricing"""
+    tracker = UsageTracker(flush_interval=None, prices={"sonnet": (3.0, 15.0)})
+    tracker.record("sonnet", {
+        'input_tokens': 1_000_000, 'output_tokens': 100_000,
+        'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 1_000_000
+    })
+    tracker.record("unpriced", {'input_tokens': 1_000_000})
+    assert tracker.totals()['cost'] == pytest.approx(3.0 + 1.5 + 0.3)
+
+@pytest.mark.asyncio
+async def test_flush_emits_and_resets_pending():
+    """Test that each flush reports only usage since the previous one"""
+    flushed = []
+    tracker = UsageTracker(flush_interval=None, sink=flushed.append)
+    with usage_context(1):
+        tracker.record("sonnet", {'input_tokens': 10})
+        tracker.record("sonnet", {'input_tokens': 5})
+    records = await tracker.flush()
+    assert len(records) == 1
+    assert (records[0]['chat_id'], records[0]['requests'], records[0]['input_tokens']) == (1, 2, 15)
+    assert await tracker.flush() == []
+    assert flushed == [records]
+    assert tracker.totals()['input_tokens'] == 15
+
+@pytest.mark.asyncio
+async def test_periodic_flush_to_file(tmp_path):
+    """Test that usage is appended to the usage file periodically"""
+    path = tmp_path / "usage.jsonl"
+    tracker = UsageTracker(flush_interval=0.01, path=str(path))
+    tracker.record("sonnet", {'output_tokens': 3}, agent="Speaker")
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        if path.exists():
+            break
+    await tracker.close()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines[0]['agent'] == "Speaker"
+    assert lines[0]['output_tokens'] == 3
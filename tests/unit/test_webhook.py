@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, Mock
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import Update
+from botlab.services.telegram import TelegramService
+from botlab.services.webhook import SECRET_HEADER, WebhookConfig, WebhookServer
+
+UPDATE = {
+    'update_id': 1001,
+    'message': {
+        'message_id': 5,
+        'date': 1700000000,
+        'chat': {'id': -100, 'type': 'supergroup'},
+        'from': {'id': 7, 'is_bot': False, 'first_name': 'Ann', 'username': 'ann'},
+        'message_thread_id': 3,
+        'text': 'hello bot',
+    },
+}
+
+@pytest.fixture
+def application():
+    return Mock(bot=None, update_queue=asyncio.Queue())
+
+@pytest_asyncio.fixture
+async def client(application):
+    server = WebhookServer(application, WebhookConfig(secret_token='s3cret'))
+    client = TestClient(TestServer(server.make_app()))
+    await client.start_server()
+    client.webhook = server
+    yield client
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_update_is_enqueued(client, application):
+    """Test that a verified update is decoded onto the update queue"""
+    response = await client.post('/telegram', json=UPDATE, headers={SECRET_HEADER: 's3cret'})
+    assert response.status == 200
+    update = application.update_queue.get_nowait()
+    assert isinstance(update, Update)
+    assert update.update_id == 1001
+    assert update.message.text == 'hello bot'
+    assert update.message.message_thread_id == 3
+    assert client.webhook.received == 1
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('headers', [{}, {SECRET_HEADER: 'wrong'}])
+async def test_bad_secret_is_rejected(client, application, headers):
+    """Test that requests without the secret token are refused"""
+    response = await client.post('/telegram', json=UPDATE, headers=headers)
+    assert response.status == 403
+    assert application.update_queue.empty()
+    assert client.webhook.rejected == 1
+
+@pytest.mark.asyncio
+async def test_malformed_update_is_discarded(client, application):
+    """Test that malformed bodies are acknowledged but not enqueued"""
+    response = await client.post('/telegram', data=b'{not json', headers={SECRET_HEADER: 's3cret'})
+    assert response.status == 200
+    assert application.update_queue.empty()
+    assert client.webhook.invalid == 1
+
+@pytest.mark.asyncio
+async def test_health_reports_metrics(client):
+    """Test the health endpoint"""
+    await client.post('/telegram', json=UPDATE, headers={SECRET_HEADER: 's3cret'})
+    response = await client.get('/healthz')
+    assert (await response.json()) == {'received': 1, 'rejected': 0, 'invalid': 0, 'queued': 1}
+
+def test_webhook_app_has_no_updater():
+    """Test that webhook mode builds an application without a polling updater"""
+    service = TelegramService("123:abc", AsyncMock(), AsyncMock(), webhook=WebhookConfig(secret_token='s'))
+    app = service.build_app(polling=False)
+    assert app.updater is None
+    assert service.build_app().updater is not None